@@ -0,0 +1,80 @@
+// Copyright (c) Jupyter Development Team.
+// Distributed under the terms of the Modified BSD License.
+
+import {
+  Message
+} from '@phosphor/messaging';
+
+import {
+  Widget
+} from '@phosphor/widgets';
+
+import {
+  RenderMime
+} from 'jupyterlab/lib/rendermime';
+
+import {
+  Context, decodeBase64Bundle
+} from 'jupytergl/lib';
+
+
+/**
+ * The MIME type of embedded session bundles (see `jupytergl.bundle`).
+ */
+export
+const BUNDLE_MIME_TYPE = 'application/vnd.jupytergl.bundle';
+
+const GLBUNDLE_CLASS = 'jpGL-bundle';
+
+
+/**
+ * A widget that replays a recorded session, without any kernel.
+ */
+export
+class JupyterGLBundle extends Widget {
+  /**
+   *
+   */
+  constructor(encoded: string) {
+    super();
+    this.addClass(GLBUNDLE_CLASS);
+    this.context = new Context(this.node);
+    this._encoded = encoded;
+  }
+
+  /**
+   * Replay the bundle once attached, so that the canvas has its size.
+   */
+  protected onAfterAttach(msg: Message): void {
+    if (this._encoded !== null) {
+      let encoded = this._encoded;
+      this._encoded = null;
+      this.context.replayBundle(decodeBase64Bundle(encoded));
+    }
+  }
+
+  readonly context: Context;
+
+  private _encoded: string | null;
+}
+
+
+/**
+ * A mime renderer for embedded session bundles.
+ */
+export
+class BundleRenderer implements RenderMime.IRenderer {
+  readonly mimetypes = [BUNDLE_MIME_TYPE];
+
+  canRender(options: RenderMime.IRenderOptions<string>): boolean {
+    return this.mimetypes.indexOf(options.mimetype) !== -1;
+  }
+
+  render(options: RenderMime.IRenderOptions<string>): Widget {
+    return new JupyterGLBundle(options.source);
+  }
+
+  wouldSanitize(options: RenderMime.IRenderOptions<string>): boolean {
+    return false;
+  }
+}
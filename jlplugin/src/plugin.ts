@@ -17,6 +17,10 @@ import {
   INotebookTracker, NotebookPanel
 } from 'jupyterlab/lib/notebook';
 
+import {
+  IRenderMime
+} from 'jupyterlab/lib/rendermime';
+
 import {
   JupyterLabPlugin, JupyterLab
 } from 'jupyterlab/lib/application';
@@ -33,6 +37,10 @@ import {
   JupyterGLWidget, IJupyterGLWidget
 } from './widget';
 
+import {
+  BundleRenderer, BUNDLE_MIME_TYPE
+} from './bundle';
+
 
 export
 namespace CommandIDs {
@@ -46,7 +54,7 @@ namespace CommandIDs {
  */
 const service: JupyterLabPlugin<void> = {
   id: 'jupyter.extensions.jupyterGL',
-  requires: [ICommandPalette, INotebookTracker],
+  requires: [ICommandPalette, INotebookTracker, IRenderMime],
   activate: activateWidgetExtension,
   autoStart: true
 };
@@ -57,8 +65,14 @@ export default service;
 /**
  * Activate the widget extension.
  */
-function activateWidgetExtension(app: JupyterLab, palette: ICommandPalette, notebooks: INotebookTracker): void {
+function activateWidgetExtension(app: JupyterLab, palette: ICommandPalette, notebooks: INotebookTracker, rendermime: IRenderMime): void {
   const { commands, shell } = app;
+
+  // Display session bundles embedded in outputs
+  rendermime.addRenderer({
+    mimetype: BUNDLE_MIME_TYPE,
+    renderer: new BundleRenderer()
+  }, 0);
   const category = 'JupyterGL';
   const command = CommandIDs.open;
   const label = 'Open JupyterGL';
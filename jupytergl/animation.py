@@ -0,0 +1,208 @@
+"""
+Keyframe animation of uniforms and camera parameters, played by the
+frontend.
+
+The keyframes of each track are sent once, as typed arrays, and the
+frontend interpolates them on its own animation frames. Playback is then
+independent of the latency of the kernel, which only sends small control
+messages to play, pause or seek::
+
+    spin = UniformTrack(program, angle_location, 'uniform1f',
+                        [0., 4.], [[0.], [2 * np.pi]])
+    orbit = CameraTrack('position', [0., 2., 4.],
+                        [[0, 0, 20], [20, 0, 0], [0, 0, 20]], 'cubic')
+    animation = Animation(gl, [spin, orbit])
+    ...
+    animation.seek(1.5)
+    animation.pause()
+
+Matrix uniforms (e.g. for `uniformMatrix4fv`) can only be animated with
+'step' interpolation, as interpolating them element-wise would distort
+rotations. Animate an angle or translation uniform instead, or use dense
+keyframes.
+"""
+
+from abc import ABC, abstractmethod
+import itertools
+
+import numpy as np
+
+from .gl import Instruction
+
+
+_animation_ids = itertools.count(1)
+
+INTERPOLATIONS = ('step', 'linear', 'cubic')
+
+CAMERA_PARAMETERS = {'position': 3, 'target': 3, 'fov': 1}
+
+
+class Track(ABC):
+    """The keyframes of a value, base class of the tracks below.
+
+    `times` are the increasing times of the keyframes in seconds, and
+    `values` a (K, size) array with the value at each keyframe. Between
+    keyframes, the value is interpolated according to `interpolation`:
+    'step' (hold the previous value), 'linear' or 'cubic' (a Catmull-Rom
+    like spline through the keyframes).
+    """
+
+    def __init__(self, times, values, interpolation='linear'):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError('Unknown interpolation: %s' % interpolation)
+        self.times = np.ascontiguousarray(times, dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
+        if values.ndim == 1:
+            values = values[:, None]
+        self.values = np.ascontiguousarray(values.reshape(len(values), -1))
+        if self.times.ndim != 1 or len(self.times) == 0:
+            raise ValueError('A track needs a 1D array of keyframe times')
+        if len(self.values) != len(self.times):
+            raise ValueError(
+                'Track has %d keyframe times, but %d values' %
+                (len(self.times), len(self.values)))
+        if np.any(np.diff(self.times) < 0):
+            raise ValueError('Keyframe times must be increasing')
+        self.interpolation = interpolation
+
+    @property
+    def size(self):
+        """The number of components of the value"""
+        return self.values.shape[1]
+
+    @property
+    def duration(self):
+        return float(self.times[-1])
+
+    def value_at(self, time):
+        """Interpolate the value at a time, as the frontend would"""
+        times, values = self.times, self.values
+        if time <= times[0]:
+            return values[0].copy()
+        if time >= times[-1]:
+            return values[-1].copy()
+        k = int(np.searchsorted(times, time, side='right')) - 1
+        if self.interpolation == 'step':
+            return values[k].copy()
+        t0, t1 = times[k], times[k + 1]
+        h = t1 - t0
+        s = (time - t0) / h if h > 0 else 0.
+        if self.interpolation == 'linear':
+            return values[k] + s * (values[k + 1] - values[k])
+        m0 = self._tangent(k)
+        m1 = self._tangent(k + 1)
+        s2, s3 = s * s, s * s * s
+        return ((2 * s3 - 3 * s2 + 1) * values[k] +
+                (s3 - 2 * s2 + s) * h * m0 +
+                (-2 * s3 + 3 * s2) * values[k + 1] +
+                (s3 - s2) * h * m1)
+
+    def _tangent(self, k):
+        """Finite difference tangent at keyframe k, for cubic interpolation"""
+        times, values = self.times, self.values
+        before = max(k - 1, 0)
+        after = min(k + 1, len(times) - 1)
+        dt = times[after] - times[before]
+        if dt <= 0:
+            return np.zeros_like(values[k])
+        return (values[after] - values[before]) / dt
+
+    @abstractmethod
+    def _instruction(self):
+        """The instruction that describes the track to the frontend"""
+
+
+class UniformTrack(Track):
+    """Keyframes of a uniform of a program.
+
+    `method` is the GL method that sets the uniform, e.g. 'uniform1f',
+    'uniform3fv' or 'uniformMatrix4fv', and each value holds its
+    arguments after the location (the matrix for `uniformMatrix*`).
+    Matrices only support 'step' interpolation.
+    """
+
+    def __init__(self, program, location, method, times, values,
+                 interpolation='linear'):
+        super(UniformTrack, self).__init__(times, values, interpolation)
+        if not method.startswith('uniform'):
+            raise ValueError('Not a uniform method: %s' % method)
+        if method.startswith('uniformMatrix') and interpolation != 'step':
+            raise ValueError(
+                'Matrix uniforms can only be animated with step '
+                'interpolation, not %s' % interpolation)
+        self.program = program
+        self.location = location
+        self.method = method
+
+    def _instruction(self):
+        return Instruction('uniform', [
+            self.program, self.location, self.method, self.times,
+            self.values, self.size, self.interpolation])
+
+
+class CameraTrack(Track):
+    """Keyframes of a camera parameter of the orbit view.
+
+    `parameter` is 'position', 'target' (3-element values) or 'fov' (in
+    degrees), as for `JupyterGL.set_view_state`.
+    """
+
+    def __init__(self, parameter, times, values, interpolation='linear'):
+        super(CameraTrack, self).__init__(times, values, interpolation)
+        if parameter not in CAMERA_PARAMETERS:
+            raise ValueError('Unknown camera parameter: %s' % parameter)
+        if self.size != CAMERA_PARAMETERS[parameter]:
+            raise ValueError(
+                'Camera %s takes %d components, not %d' %
+                (parameter, CAMERA_PARAMETERS[parameter], self.size))
+        self.parameter = parameter
+
+    def _instruction(self):
+        return Instruction('camera', [
+            self.parameter, self.times, self.values, self.size,
+            self.interpolation])
+
+
+class Animation:
+    """A set of tracks, played together by the frontend.
+
+    The keyframes are sent on creation. The animation lasts until the last
+    keyframe of its tracks, and starts over at the end if `loop` is true
+    (otherwise it holds its last values). With `autoplay`, it starts
+    playing as soon as the frontend has it.
+    """
+
+    def __init__(self, gl, tracks, loop=True, autoplay=True):
+        self.gl = gl
+        self.tracks = list(tracks)
+        if not self.tracks:
+            raise ValueError('An animation needs at least one track')
+        self.loop = loop
+        self.id = 'a%d' % next(_animation_ids)
+        instructions = [track._instruction() for track in self.tracks]
+        gl._pin(self.id, instructions)
+        gl._send_command('animation', [self.id, loop, autoplay], instructions)
+
+    @property
+    def duration(self):
+        return max(track.duration for track in self.tracks)
+
+    def _control(self, action, *args):
+        self.gl._send_command(
+            'animationControl', [self.id, action] + list(args), [])
+
+    def play(self, speed=1.):
+        """Play from the current time, at `speed` times real time"""
+        self._control('play', speed)
+
+    def pause(self):
+        self._control('pause')
+
+    def seek(self, time):
+        """Jump to a time in seconds, keeping the animation (not) playing"""
+        self._control('seek', time)
+
+    def remove(self):
+        """Stop the animation, and drop its tracks from the frontend"""
+        self._control('remove')
+        self.gl._unpin(self.id)
@@ -0,0 +1,212 @@
+"""
+Packing of many small material textures into a few large atlas textures.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+Region = namedtuple('Region', ('page', 'x', 'y', 'width', 'height'))
+
+
+def pack_rectangles(sizes, max_size=4096, padding=2):
+    """Pack rectangles into as few pages as possible with shelf packing.
+
+    `sizes` is a sequence of (width, height). Returns a list of `Region`
+    (one per size, in the same order) and a list of the (width, height)
+    used on each page. Each rectangle gets `padding` pixels of free space
+    around it.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    regions = [None] * len(sizes)
+    pages = []
+    page = x = y = shelf_height = 0
+    for i in order:
+        w, h = sizes[i]
+        pw, ph = w + 2 * padding, h + 2 * padding
+        if pw > max_size or ph > max_size:
+            raise ValueError(
+                'Texture of size %dx%d does not fit in an atlas of size %d' %
+                (w, h, max_size))
+        if not pages:
+            pages.append([0, 0])
+        if x + pw > max_size:
+            # New shelf
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        if y + ph > max_size:
+            # New page
+            pages.append([0, 0])
+            page += 1
+            x = y = shelf_height = 0
+        regions[i] = Region(page, x + padding, y + padding, w, h)
+        x += pw
+        shelf_height = max(shelf_height, ph)
+        pages[page][0] = max(pages[page][0], x)
+        pages[page][1] = max(pages[page][1], y + shelf_height)
+    return regions, [tuple(p) for p in pages]
+
+
+def _as_rgba(image):
+    image = np.asarray(image)
+    if image.ndim == 2:
+        image = image[:, :, None]
+    channels = image.shape[2]
+    if channels == 4:
+        return image
+    rgba = np.empty(image.shape[:2] + (4,), dtype=image.dtype)
+    if channels in (1, 2):
+        rgba[:, :, :3] = image[:, :, :1]
+    else:
+        rgba[:, :, :3] = image[:, :, :3]
+    if channels == 2:
+        rgba[:, :, 3] = image[:, :, 1]
+    else:
+        rgba[:, :, 3] = np.iinfo(image.dtype).max if image.dtype.kind in 'ui' else 1
+    return rgba
+
+
+class Atlas:
+    """A set of atlas pages, with the region of each packed material.
+
+    `pages` is a list of RGBA images, and `regions` maps `Material`
+    objects to their `Region` (materials need not have unique names).
+    """
+
+    def __init__(self, pages, regions):
+        self.pages = pages
+        self.regions = regions
+
+    def uv_transform(self, material):
+        """Return (page, scale_u, scale_v, offset_u, offset_v) of a material.
+
+        A texture coordinate of the material maps to the page with
+        `uv * scale + offset`. This can be passed as a uniform, to draw
+        meshes with several materials from the same page.
+        """
+        region = self.regions[material]
+        h, w = self.pages[region.page].shape[:2]
+        return (region.page, region.width / w, region.height / h,
+                region.x / w, region.y / h)
+
+    def uv_transforms(self):
+        """Return the `uv_transform` of all materials"""
+        return {material: self.uv_transform(material)
+                for material in self.regions}
+
+
+def build_atlas(materials, kind='Kd', max_size=4096, padding=2):
+    """Pack the `kind` textures of a set of materials into atlas pages.
+
+    `materials` is an iterable of `Material`, e.g. the values of
+    `Mesh.materials` over all meshes of a scene. Materials sharing an
+    image file share a region. The padding around each region is filled
+    by repeating the edge pixels of the texture, so that linear filtering
+    does not bleed between regions.
+
+    Note that atlases cannot represent repeating textures, so texture
+    coordinates should be within [0, 1].
+    """
+    images = []
+    image_index = {}
+    material_image = {}
+    for material in materials:
+        texture = material.textures.get(kind)
+        if texture is None:
+            continue
+        if texture.image_name not in image_index:
+            image_index[texture.image_name] = len(images)
+            images.append(_as_rgba(texture.image))
+        material_image[material] = image_index[texture.image_name]
+
+    sizes = [(image.shape[1], image.shape[0]) for image in images]
+    packed, page_sizes = pack_rectangles(sizes, max_size, padding)
+    dtype = images[0].dtype if images else np.uint8
+    pages = [np.zeros((h, w, 4), dtype=dtype) for w, h in page_sizes]
+    for image, region in zip(images, packed):
+        page = pages[region.page]
+        x0, y0 = region.x - padding, region.y - padding
+        x1 = region.x + region.width + padding
+        y1 = region.y + region.height + padding
+        page[y0:y1, x0:x1] = np.pad(
+            image, ((padding, padding), (padding, padding), (0, 0)), 'edge')
+
+    regions = {material: packed[i] for material, i in material_image.items()}
+    return Atlas(pages, regions)
+
+
+def remap_texture_coords(mesh, atlas):
+    """Remap the texture coordinates of a mesh into its atlas pages, in place.
+
+    The texture coordinates used by the faces of each material (see
+    `Mesh.draw_ranges`) are mapped into the region of that material.
+    Vertices shared by materials with different regions (or by textured
+    and untextured materials) are duplicated first, so that each keeps
+    the coordinates of its own material. This needs to be done before
+    `Mesh.interleave`.
+
+    Returns a dict with the atlas page of each textured material of the
+    mesh, by material name, to bind when drawing its range. Meshes without
+    materials in the atlas are left as they are.
+    """
+    materials = list(mesh.materials.values())
+    if not any(m in atlas.regions for m in materials):
+        return {}
+    if mesh.texture_coords is None:
+        raise ValueError(
+            'Mesh %r has textured materials, but no texture coordinates' %
+            mesh.name)
+    if mesh.vertex_data is not None:
+        raise ValueError('Remap the texture coordinates before interleaving')
+    region_ids = {}
+    # Group of each material: 0 if untextured, else 1 + its region id
+    groups = np.array([
+        1 + region_ids.setdefault(atlas.regions[m], len(region_ids))
+        if m in atlas.regions else 0
+        for m in materials] or [0], np.intp)
+    n_groups = len(region_ids) + 1
+
+    # One vertex per pair of old vertex and group, keeping the old index
+    # for the first group of each vertex, and appending the others
+    n_vertices = len(mesh.vertices)
+    corner_groups = np.repeat(groups[mesh.face_materials()], 3)
+    pairs, inverse = np.unique(
+        mesh.faces.ravel().astype(np.intp) * n_groups + corner_groups,
+        return_inverse=True)
+    old = pairs // n_groups
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = old[1:] != old[:-1]
+    new_index = np.where(first, old, 0)
+    new_index[~first] = n_vertices + np.arange(np.count_nonzero(~first))
+    source = np.concatenate([np.arange(n_vertices), old[~first]])
+    if len(source) > np.iinfo(mesh.faces.dtype).max + 1:
+        raise ValueError(
+            'Mesh %r needs %d vertices for its atlas regions, more than its '
+            'faces can index' % (mesh.name, len(source)))
+    group = np.zeros(len(source), np.intp)
+    group[new_index] = pairs % n_groups
+
+    mesh.faces = new_index[inverse].reshape(mesh.faces.shape).astype(
+        mesh.faces.dtype)
+    mesh.vertices = mesh.vertices[source]
+    if mesh.normals is not None:
+        mesh.normals = mesh.normals[source]
+    coords = mesh.texture_coords = mesh.texture_coords[source]
+    pages = {}
+    transformed = set()
+    for name, material in mesh.materials.items():
+        if material not in atlas.regions:
+            continue
+        page, scale_u, scale_v, offset_u, offset_v = atlas.uv_transform(material)
+        pages[name] = page
+        region_id = region_ids[atlas.regions[material]]
+        if region_id in transformed:
+            # Shares its vertices with a material of the same region
+            continue
+        transformed.add(region_id)
+        selected = group == 1 + region_id
+        coords[selected, 0] = coords[selected, 0] * scale_u + offset_u
+        coords[selected, 1] = coords[selected, 1] * scale_v + offset_v
+    return pages
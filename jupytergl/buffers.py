@@ -0,0 +1,119 @@
+"""
+GL buffers mirrored by NumPy arrays, updated by their modified ranges.
+"""
+
+import numpy as np
+
+
+def _merge_ranges(ranges, gap):
+    """Merge sorted (start, stop) ranges that are at most `gap` apart"""
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start - merged[-1][1] <= gap:
+            if stop > merged[-1][1]:
+                merged[-1][1] = stop
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+class TrackedBuffer:
+    """A NumPy array bound to a GL buffer, which tracks modified ranges.
+
+    Assign to the buffer by indexing it (`tracked[10:20] = values`), and
+    call `flush` to send the modified rows with `bufferSubData`. Rows are
+    indexed along the first axis of `data`. Modifications done directly
+    on `data` are not seen, unless they are reported with `mark_dirty`.
+
+    Ranges separated by at most `merge_gap` bytes are sent as one call,
+    trading some redundant bytes for fewer messages.
+    """
+
+    def __init__(self, gl, buffer, data, target=None, usage=None,
+                 merge_gap=4096, upload=True):
+        self.gl = gl
+        self.buffer = buffer
+        self.data = np.ascontiguousarray(data)
+        self.target = gl.ARRAY_BUFFER if target is None else target
+        self.merge_gap = merge_gap
+        self._dirty = []
+        if upload:
+            with gl.chunk():
+                gl.bindBuffer(self.target, buffer)
+                gl.bufferData(
+                    self.target, self.data,
+                    gl.DYNAMIC_DRAW if usage is None else usage)
+
+    @property
+    def row_nbytes(self):
+        return self.data.itemsize * int(np.prod(self.data.shape[1:]))
+
+    @property
+    def dirty(self):
+        """Whether there are modifications that have not been flushed"""
+        return bool(self._dirty)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        rows = key[0] if isinstance(key, tuple) else key
+        n = len(self.data)
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(n)
+            if step < 0:
+                start, stop = stop + 1, start + 1
+            if start < stop:
+                self.mark_dirty(start, stop)
+        elif rows is Ellipsis:
+            self.mark_dirty(0, n)
+        elif np.ndim(rows) == 0:
+            row = int(rows) % n
+            self.mark_dirty(row, row + 1)
+        else:
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+            rows = np.unique(rows % n)
+            if not len(rows):
+                return
+            # Split into runs of consecutive rows
+            breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+            starts = rows[np.concatenate(([0], breaks))]
+            stops = rows[np.concatenate((breaks - 1, [len(rows) - 1]))] + 1
+            self._dirty.extend(zip(starts.tolist(), stops.tolist()))
+
+    def mark_dirty(self, start=0, stop=None):
+        """Mark the rows [start, stop) as modified"""
+        if stop is None:
+            stop = len(self.data)
+        self._dirty.append((start, stop))
+
+    def dirty_ranges(self):
+        """Return the merged ranges of modified rows as (start, stop) lists"""
+        row_nbytes = self.row_nbytes
+        gap = self.merge_gap // row_nbytes if row_nbytes else 0
+        return _merge_ranges(self._dirty, gap)
+
+    def flush(self):
+        """Send the modified ranges to the GL buffer.
+
+        Returns the number of `bufferSubData` calls issued.
+        """
+        if not self._dirty:
+            return 0
+        ranges = self.dirty_ranges()
+        self._dirty = []
+        gl = self.gl
+        row_nbytes = self.row_nbytes
+        with gl.chunk():
+            gl.bindBuffer(self.target, self.buffer)
+            for start, stop in ranges:
+                # Copy, as the data is sent after the caller can modify it
+                gl.bufferSubData(self.target, start * row_nbytes,
+                                 self.data[start:stop].copy())
+        return len(ranges)
@@ -0,0 +1,186 @@
+"""
+Self-contained bundles of a recorded JupyterGL session, for static output.
+
+A bundle is laid out as:
+
+- The magic bytes `JGLB`, followed by a little-endian uint32 format
+  version and a uint32 byte length of the header.
+- A UTF-8 JSON header: `{"messages": [{"data": ..., "buffers": [[offset,
+  length], ...]}, ...]}`, where the offsets are from the start of the
+  bundle.
+- The binary buffers, each aligned to 8 bytes so that typed arrays can be
+  viewed in place.
+"""
+
+import base64
+import json
+import struct
+
+from .gl import _KEY
+
+
+MAGIC = b'JGLB'
+VERSION = 1
+MIME_TYPE = 'application/vnd.jupytergl.bundle'
+
+_PREFIX = struct.Struct('<4sII')
+_ALIGNMENT = 8
+
+
+def _padding(n):
+    return -n % _ALIGNMENT
+
+
+def encode_bundle(messages):
+    """Encode a list of (data, buffers) messages into a bundle"""
+    entries = []
+    offset = 0
+    for data, buffers in messages:
+        ranges = []
+        for buffer in buffers:
+            length = memoryview(buffer).nbytes
+            ranges.append([offset, length])
+            offset += length + _padding(length)
+        entries.append(dict(data=data, buffers=ranges))
+
+    # The buffer offsets depend on the header size, which depends on the
+    # offsets. Pad the header so that the buffers start aligned, and
+    # shift the offsets by the (fixed width) start of the buffer section.
+    def header_for(start):
+        shifted = [dict(data=e['data'],
+                        buffers=[[o + start, n] for o, n in e['buffers']])
+                   for e in entries]
+        return json.dumps(dict(messages=shifted),
+                          separators=(',', ':')).encode('utf-8')
+
+    start = _PREFIX.size
+    while True:
+        header = header_for(start)
+        end = _PREFIX.size + len(header)
+        if end + _padding(end) == start:
+            break
+        start = end + _padding(end)
+    header += b' ' * (start - _PREFIX.size - len(header))
+
+    parts = [_PREFIX.pack(MAGIC, VERSION, len(header)), header]
+    for _, buffers in messages:
+        for buffer in buffers:
+            buffer = memoryview(buffer).cast('B')
+            parts.append(buffer)
+            parts.append(b'\0' * _padding(len(buffer)))
+    return b''.join(parts)
+
+
+def decode_bundle(bundle):
+    """Decode a bundle into a list of (data, buffers) messages.
+
+    The buffers are memoryviews into `bundle`.
+    """
+    bundle = memoryview(bundle)
+    magic, version, header_length = _PREFIX.unpack_from(bundle)
+    if magic != MAGIC:
+        raise ValueError('Not a JupyterGL bundle')
+    if version != VERSION:
+        raise ValueError('Unsupported JupyterGL bundle version: %s' % version)
+    header = json.loads(
+        bytes(bundle[_PREFIX.size:_PREFIX.size + header_length]).decode('utf-8'))
+    return [(entry['data'],
+             [bundle[offset:offset + length]
+              for offset, length in entry['buffers']])
+            for entry in header['messages']]
+
+
+def _remap_keys(value, mapping, unknown):
+    """Replace the object handles in message data, using `mapping`"""
+    if isinstance(value, str) and _KEY.match(value):
+        if value not in mapping:
+            unknown.add(value)
+        return mapping.get(value, value)
+    elif isinstance(value, list):
+        return [_remap_keys(v, mapping, unknown) for v in value]
+    elif isinstance(value, dict):
+        return {k: _remap_keys(v, mapping, unknown) for k, v in value.items()}
+    return value
+
+
+def _result_keys(data):
+    """The object handles created by a query, from the data of its reply"""
+    results = data if isinstance(data, list) else [data]
+    return [r for r in results if isinstance(r, str) and _KEY.match(r)]
+
+
+class BundleRecorder:
+    """Records the messages sent on a comm, for replay without a kernel.
+
+    Attach it with `JupyterGL.record`. Messages that need a live frontend
+    to reply (the constants and methods requests) are left out, while
+    queries are kept, as replaying them recreates the object handles
+    that later instructions refer to.
+
+    The frontend that replays a bundle numbers the handles from the
+    start, so the replies to the recorded queries are kept as well, and
+    the handles are renumbered when the bundle is encoded. A recording
+    can therefore start at any point, as long as it does not use objects
+    created before it started.
+    """
+
+    skipped_types = ('getConstants', 'getMethods')
+
+    def __init__(self):
+        self.messages = []
+        self._replies = {}
+
+    def sent(self, data, metadata, buffers):
+        if data is None or data.get('type') in self.skipped_types:
+            return
+        # Copy, as arrays can be modified after they were sent
+        self.messages.append((data, [bytes(memoryview(b).cast('B'))
+                                     for b in buffers or []],
+                              (metadata or {}).get('cmd_id')))
+
+    def received(self, message):
+        data = message['content'].get('data')
+        cmd_id = (message.get('metadata') or {}).get('cmd_id')
+        if cmd_id is None or not data:
+            return
+        if data.get('type') == 'queryReply':
+            self._replies.setdefault(cmd_id, data['data'])
+        elif data.get('type') == 'queryError':
+            self._replies.setdefault(cmd_id, None)
+
+    def _renumbered(self):
+        """The recorded messages, with the handles renumbered from 1"""
+        mapping = {}
+        unknown = set()
+        messages = []
+        for data, buffers, cmd_id in self.messages:
+            messages.append((_remap_keys(data, mapping, unknown), buffers))
+            if data.get('type') in ('query', 'queryAll'):
+                if cmd_id not in self._replies:
+                    raise ValueError(
+                        'The reply to a recorded query has not arrived yet')
+                for key in _result_keys(self._replies[cmd_id]):
+                    mapping[key] = 'key%d' % (len(mapping) + 1)
+        if unknown:
+            raise ValueError(
+                'The recording uses objects created before it started (%s). '
+                'Start recording before creating them.' %
+                ', '.join(sorted(unknown, key=lambda k: int(k[3:]))))
+        return messages
+
+    def encode(self):
+        """Return the recorded session as a bundle"""
+        return encode_bundle(self._renumbered())
+
+    def save(self, filename):
+        """Write the recorded session as a bundle to a file"""
+        with open(filename, 'wb') as f:
+            f.write(self.encode())
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        return {MIME_TYPE: base64.b64encode(self.encode()).decode('ascii')}
+
+    def display(self):
+        """Embed the recorded session in the output of the current cell"""
+        from IPython.display import display
+        display(self._repr_mimebundle_(), raw=True)
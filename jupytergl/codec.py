@@ -0,0 +1,177 @@
+"""
+Compact encodings of mesh data for transport to the frontend.
+
+- Positions (and texture coordinates) are quantized to a number of bits
+  within their bounding box.
+- Normals are octahedral encoded as two signed integers.
+- Indices are delta encoded, zigzag mapped to unsigned, and written as
+  variable length integers (LEB128), so that the small deltas of meshes
+  in vertex cache order take a byte or two each.
+
+An `EncodedArray` can be passed as an argument to e.g. `bufferData`, and
+is decoded into a typed array by the frontend before the call.
+"""
+
+import numpy as np
+
+
+class EncodedArray:
+    """Encoded array data, with the parameters needed to decode it.
+
+    `decode` is the name of the decoding ('quantized', 'octahedral' or
+    'delta'), and `data` the encoded array, sent as a binary buffer.
+    """
+
+    def __init__(self, decode, data, **params):
+        self.decode = decode
+        self.data = np.ascontiguousarray(data)
+        self.params = params
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def _serialize(self, buffer_arg):
+        return dict(self.params, decode=self.decode, data=buffer_arg)
+
+    def decoded(self):
+        """Decode the data in the kernel, as the frontend would"""
+        return _decoders[self.decode](self.data, **self.params)
+
+
+def quantize_positions(positions, bits=16):
+    """Quantize positions relative to their bounding box.
+
+    Returns (quantized, offset, scale) where quantized are unsigned
+    integers of `bits` bits (up to 16), stored as uint8 or uint16.
+    """
+    if not 1 <= bits <= 16:
+        raise ValueError('Positions can be quantized to 1-16 bits')
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    max_value = 2 ** bits - 1
+    positions = np.asarray(positions, dtype=np.float64)
+    offset = positions.min(axis=0)
+    scale = positions.max(axis=0) - offset
+    safe_scale = np.where(scale > 0, scale, 1)
+    quantized = np.rint((positions - offset) * (max_value / safe_scale))
+    return (quantized.astype(dtype), offset.astype(np.float32),
+            scale.astype(np.float32))
+
+
+def encode_quantized(values, bits=16):
+    """Quantize (N, k) values within their bounding box"""
+    values = np.asarray(values)
+    quantized, offset, scale = quantize_positions(values, bits)
+    step = scale / (2 ** bits - 1)
+    return EncodedArray('quantized', quantized, size=values.shape[1],
+                        offset=offset.tolist(), step=step.tolist())
+
+
+def _decode_quantized(data, size, offset, step):
+    values = data.reshape(-1, size) * np.array(step, np.float32)
+    return (values + np.array(offset, np.float32)).astype(np.float32)
+
+
+def _sign_not_zero(v):
+    return np.where(v >= 0, 1., -1.)
+
+
+def encode_octahedral(normals, bits=8):
+    """Octahedral encode unit normals as two signed integers of `bits` bits"""
+    if not 2 <= bits <= 16:
+        raise ValueError('Normals can be encoded with 2-16 bits')
+    normals = np.asarray(normals, dtype=np.float64)
+    n = normals / np.maximum(np.abs(normals).sum(axis=1, keepdims=True),
+                             np.finfo(np.float64).tiny)
+    x, y, z = n[:, 0], n[:, 1], n[:, 2]
+    # Fold the lower hemisphere over the diagonals
+    folded_x = (1 - np.abs(y)) * _sign_not_zero(x)
+    folded_y = (1 - np.abs(x)) * _sign_not_zero(y)
+    x = np.where(z < 0, folded_x, x)
+    y = np.where(z < 0, folded_y, y)
+    max_value = 2 ** (bits - 1) - 1
+    dtype = np.int8 if bits <= 8 else np.int16
+    encoded = np.rint(np.clip(np.stack([x, y], axis=1), -1, 1) * max_value)
+    return EncodedArray('octahedral', encoded.astype(dtype), bits=bits)
+
+
+def _decode_octahedral(data, bits):
+    xy = data.reshape(-1, 2).astype(np.float32) / (2 ** (bits - 1) - 1)
+    x, y = xy[:, 0], xy[:, 1]
+    z = 1 - np.abs(x) - np.abs(y)
+    t = np.maximum(-z, 0)
+    x = x - np.where(x >= 0, t, -t)
+    y = y - np.where(y >= 0, t, -t)
+    normals = np.stack([x, y, z], axis=1)
+    return (normals / np.linalg.norm(normals, axis=1, keepdims=True)).astype(np.float32)
+
+
+def encode_varints(values):
+    """Write unsigned integers as LEB128 variable length integers"""
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    n_bytes = np.ones(len(values), dtype=np.intp)
+    for shift in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        n_bytes += values >= (np.uint64(1) << np.uint64(shift))
+    starts = np.concatenate([[0], np.cumsum(n_bytes)[:-1]])
+    out = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    for k in range(int(n_bytes.max()) if len(values) else 0):
+        mask = n_bytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = np.where(n_bytes[mask] > k + 1, 0x80, 0)
+        out[starts[mask] + k] = byte.astype(np.uint8) | more
+    return out
+
+
+def decode_varints(data, count):
+    data = np.asarray(data, dtype=np.uint8)
+    last = np.flatnonzero(data < 0x80)[:count]
+    starts = np.concatenate([[0], last[:-1] + 1])
+    values = np.zeros(count, dtype=np.uint64)
+    for k in range(int((last - starts).max()) + 1 if count else 0):
+        mask = starts + k <= last
+        values[mask] |= (data[starts[mask] + k].astype(np.uint64) &
+                         np.uint64(0x7f)) << np.uint64(7 * k)
+    return values
+
+
+def encode_delta(indices):
+    """Delta, zigzag and varint encode indices"""
+    indices = np.asarray(indices)
+    flat = indices.ravel().astype(np.int64)
+    deltas = np.diff(flat, prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    return EncodedArray('delta', encode_varints(zigzag.view(np.uint64)),
+                        count=len(flat), type=str(indices.dtype))
+
+
+def _decode_delta(data, count, type):
+    zigzag = decode_varints(data, count).view(np.int64)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    return np.cumsum(deltas).astype(type)
+
+
+_decoders = {
+    'quantized': _decode_quantized,
+    'octahedral': _decode_octahedral,
+    'delta': _decode_delta,
+}
+
+
+def encode_mesh(mesh, position_bits=16, normal_bits=10, texture_coord_bits=12):
+    """Encode the vertex attributes and faces of a `Mesh` for upload.
+
+    Returns a dict with an `EncodedArray` for each of 'vertices',
+    'normals', 'texture_coords' (if present) and 'faces'. The precision
+    loss is set by the bits of each attribute. For the most compact
+    indices, reorder the mesh with `Mesh.optimize` first.
+    """
+    encoded = dict(
+        vertices=encode_quantized(mesh.vertices, position_bits),
+        faces=encode_delta(mesh.faces),
+    )
+    if mesh.normals is not None:
+        encoded['normals'] = encode_octahedral(mesh.normals, normal_bits)
+    if mesh.texture_coords is not None:
+        encoded['texture_coords'] = encode_quantized(
+            mesh.texture_coords, texture_coord_bits)
+    return encoded
@@ -1,16 +1,66 @@
 import asyncio
+import json
+
+import numpy as np
+
 from ipykernel.comm import Comm
+from ipykernel.jsonutil import json_clean
 
 
 class QueryableComm(Comm):
 
     def __init__(self, *args, **kwargs):
         self.waiting_queries = {}
+        self.query_outputs = {}
+        self.recorders = []
         super(QueryableComm, self).__init__(*args, **kwargs)
 
-    def future_query_reply(self, cmd_id):
+    def send(self, data=None, metadata=None, buffers=None):
+        for recorder in self.recorders:
+            recorder.sent(data, metadata, buffers)
+        super(QueryableComm, self).send(data, metadata, buffers)
+
+    @staticmethod
+    def pack(data):
+        """JSON encode message data, for use with `send_packed`"""
+        return json.dumps(json_clean(data), ensure_ascii=False,
+                          allow_nan=False).encode('utf8', 'surrogateescape')
+
+    def send_packed(self, data, packed, metadata=None, buffers=None):
+        """Send message data that has already been encoded with `pack`.
+
+        This allows the same encoded payload to be sent on several comms,
+        only wrapping it in the (small) comm specific content.
+        """
+        for recorder in self.recorders:
+            recorder.sent(data, metadata, buffers)
+        content = b''.join([
+            b'{"comm_id":', json.dumps(self.comm_id).encode('utf8'),
+            b',"data":', packed, b'}'])
+        self.kernel.session.send(
+            self.kernel.iopub_socket, 'comm_msg', content,
+            metadata=json_clean(metadata or {}),
+            parent=self.kernel._parent_header,
+            ident=self.topic,
+            buffers=buffers,
+        )
+
+    @property
+    def connected(self):
+        """Whether messages can be sent to a frontend"""
+        return self.kernel is not None
+
+    def future_query_reply(self, cmd_id, outputs=None):
+        """Return a future of the reply to a query.
+
+        If the query has `Output` arguments, the future resolves to the
+        array filled in by the frontend (or a list of arrays if there are
+        several), read straight from the binary buffers of the reply.
+        """
         future = asyncio.get_event_loop().create_future()
         self.waiting_queries[cmd_id] = future
+        if outputs:
+            self.query_outputs[cmd_id] = outputs
         return future
 
     def clear_queue(self):
@@ -21,13 +71,25 @@ class QueryableComm(Comm):
         return n_cleared
 
     def handle_msg(self, message):
+        for recorder in self.recorders:
+            recorder.received(message)
         msg = message['content'].get('data')
-        if msg and msg.get('type') == 'queryReply':
-            query = self.waiting_queries.pop(message['metadata']['cmd_id'])
-            query.set_result(msg['data'])
-        elif msg and msg.get('type') == 'queryError':
-            query = self.waiting_queries.pop(message['metadata']['cmd_id'])
-            query.set_exception(RuntimeError(msg['data']))
+        if msg and msg.get('type') in ('queryReply', 'queryError'):
+            # Replies from secondary views of a fan-out are not waited for
+            cmd_id = message['metadata']['cmd_id']
+            query = self.waiting_queries.pop(cmd_id, None)
+            outputs = self.query_outputs.pop(cmd_id, None)
+            if query is None or query.cancelled():
+                return
+            if msg['type'] == 'queryReply' and outputs:
+                # Zero-copy (read-only) views of the reply buffers
+                arrays = [np.frombuffer(buffer, dtype=output.dtype).reshape(output.shape)
+                          for output, buffer in zip(outputs, message['buffers'])]
+                query.set_result(arrays[0] if len(arrays) == 1 else arrays)
+            elif msg['type'] == 'queryReply':
+                query.set_result(msg['data'])
+            else:
+                query.set_exception(RuntimeError(msg['data']))
         else:
             return super(QueryableComm, self).handle_msg(message)
 
@@ -0,0 +1,165 @@
+"""
+Bounding volume hierarchy and frustum culling for scenes of many meshes.
+"""
+
+import numpy as np
+
+
+def bounding_box(vertices):
+    """Return the axis aligned bounding box of vertices as (lower, upper)"""
+    vertices = np.asarray(vertices)
+    return np.array([vertices.min(axis=0), vertices.max(axis=0)])
+
+
+def frustum_planes(projection, modelview):
+    """Extract the six frustum planes from a set of camera matrices.
+
+    The matrices should be laid out as returned by the functions in
+    `glu` (i.e. transposed, ready to be passed to `uniformMatrix4fv`).
+    The planes are returned as a (6, 4) array of normalized `(a, b, c, d)`
+    coefficients, with the normals pointing into the frustum.
+    """
+    m = np.dot(np.asarray(projection, np.float64).T,
+               np.asarray(modelview, np.float64).T)
+    planes = np.array([
+        m[3] + m[0], m[3] - m[0],  # left, right
+        m[3] + m[1], m[3] - m[1],  # bottom, top
+        m[3] + m[2], m[3] - m[2],  # near, far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+def _classify(planes, lower, upper):
+    """Classify boxes against planes.
+
+    Returns two boolean arrays, (outside, inside), where `inside` means
+    the box is completely inside all the planes.
+    """
+    normals = planes[:, :3]
+    positive = normals > 0
+    # The corner furthest along, and furthest against, each plane normal:
+    far = np.where(positive, upper[:, None, :], lower[:, None, :])
+    near = np.where(positive, lower[:, None, :], upper[:, None, :])
+    far_distance = np.einsum('bpk,pk->bp', far, normals) + planes[:, 3]
+    near_distance = np.einsum('bpk,pk->bp', near, normals) + planes[:, 3]
+    outside = (far_distance < 0).any(axis=1)
+    inside = (near_distance >= 0).all(axis=1)
+    return outside, inside
+
+
+class BVH:
+    """A bounding volume hierarchy over a set of axis aligned boxes.
+
+    `boxes` is an array of shape (n, 2, 3) with the lower and upper
+    corners of each box. The tree is built top-down, splitting on the
+    median of the box centers along the axis of largest spread, and is
+    stored in flat arrays.
+    """
+
+    def __init__(self, boxes, leaf_size=8):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3)
+        self.boxes = boxes
+        self.leaf_size = leaf_size
+        centers = boxes.mean(axis=1)
+
+        lower, upper, children, ranges = [], [], [], []
+        order = np.arange(len(boxes))
+        stack = [(-1, 0, len(boxes))] if len(boxes) else []
+        while stack:
+            parent, start, stop = stack.pop()
+            node = len(lower)
+            if parent >= 0:
+                children[parent].append(node)
+            items = order[start:stop]
+            lower.append(boxes[items, 0].min(axis=0))
+            upper.append(boxes[items, 1].max(axis=0))
+            children.append([])
+            ranges.append((start, stop))
+            if stop - start <= leaf_size:
+                continue
+            spread = centers[items].max(axis=0) - centers[items].min(axis=0)
+            axis = np.argmax(spread)
+            half = (stop - start) // 2
+            split = np.argpartition(centers[items, axis], half)
+            order[start:stop] = items[split]
+            stack.append((node, start + half, stop))
+            stack.append((node, start, start + half))
+
+        self.order = order
+        self.lower = np.array(lower).reshape(-1, 3)
+        self.upper = np.array(upper).reshape(-1, 3)
+        self.children = children
+        self.ranges = np.array(ranges, dtype=np.intp).reshape(-1, 2)
+
+    @classmethod
+    def from_meshes(cls, meshes, leaf_size=8):
+        """Build a hierarchy over the bounding boxes of a list of meshes"""
+        boxes = [bounding_box(mesh.vertices) for mesh in meshes]
+        return cls(np.array(boxes).reshape(-1, 2, 3), leaf_size=leaf_size)
+
+    def cull(self, planes):
+        """Return the sorted indices of the boxes intersecting the planes"""
+        if not len(self.boxes):
+            return np.empty(0, dtype=np.intp)
+        visible = []
+        level = np.array([0])
+        while len(level):
+            outside, inside = _classify(
+                planes, self.lower[level], self.upper[level])
+            next_level = []
+            for node, out, contained in zip(level, outside, inside):
+                if out:
+                    continue
+                children = self.children[node]
+                start, stop = self.ranges[node]
+                if contained:
+                    visible.append(self.order[start:stop])
+                elif children:
+                    next_level.extend(children)
+                else:
+                    # Partially visible leaf, test the boxes themselves
+                    items = self.order[start:stop]
+                    out, _ = _classify(
+                        planes, self.boxes[items, 0], self.boxes[items, 1])
+                    visible.append(items[~out])
+            level = np.array(next_level, dtype=np.intp)
+        if not visible:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(visible))
+
+
+class CulledScene:
+    """A scene of meshes where only the visible ones are uploaded and drawn.
+
+    `upload(gl, mesh)` is called the first time a mesh becomes visible,
+    and its return value (e.g. buffer handles) is kept. `draw(gl, mesh,
+    uploaded)` is called for each visible mesh every frame, from within
+    a chunk.
+    """
+
+    def __init__(self, gl, meshes, upload, draw, leaf_size=8):
+        self.gl = gl
+        self.meshes = list(meshes)
+        self.bvh = BVH.from_meshes(self.meshes, leaf_size=leaf_size)
+        self._upload = upload
+        self._draw = draw
+        self._uploaded = {}
+
+    def visible(self, projection, modelview):
+        """Return the indices of the meshes visible from a camera"""
+        return self.bvh.cull(frustum_planes(projection, modelview))
+
+    def render(self, projection, modelview):
+        """Upload and draw the meshes visible from a camera.
+
+        Returns the indices of the meshes that were drawn.
+        """
+        gl = self.gl
+        visible = self.visible(projection, modelview)
+        missing = [i for i in visible if i not in self._uploaded]
+        for i in missing:
+            self._uploaded[i] = self._upload(gl, self.meshes[i])
+        with gl.chunk():
+            for i in visible:
+                self._draw(gl, self.meshes[i], self._uploaded[i])
+        return visible
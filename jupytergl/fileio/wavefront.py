@@ -39,16 +39,39 @@ from collections import namedtuple
 
 import numpy as np
 
+from ..geometry import vertex_normals, optimize_vertex_cache, reorder_vertices
+from ..layout import interleave_attributes
+
 InterleavedIndices = namedtuple(
     'InterleavedIndices', ('v', 'n', 't'))
 
 Face = namedtuple(
     'Face', ('vertex_indices', 'normal_indices', 'tex_coord_indices'))
 
+DrawRange = namedtuple(
+    'DrawRange', ('material', 'start', 'count'))
+
+
+def load_obj(filename, interleave=False, optimize=False):
+    """Load the meshes of a wavefront .obj file.
 
-def load_obj(filename):
+    If `optimize` is true, the meshes are reordered for the GPU vertex
+    caches with `Mesh.optimize`. This is off by default, as it takes a
+    few seconds per million triangles. If `interleave` is true, the vertex
+    attributes of each mesh are also packed into `Mesh.vertex_data`,
+    described by `Mesh.layout`. It can be a dict of attribute formats,
+    see `Mesh.interleave`.
+    """
     internal = Wavefront(filename)
-    return [create_mesh(internal, mesh) for mesh in internal.mesh_list]
+    meshes = [create_mesh(internal, mesh) for mesh in internal.mesh_list]
+    if optimize:
+        for mesh in meshes:
+            mesh.optimize()
+    if interleave:
+        formats = interleave if isinstance(interleave, dict) else None
+        for mesh in meshes:
+            mesh.vertex_data, mesh.layout = mesh.interleave(formats)
+    return meshes
 
 
 class PywavefrontException(Exception):
@@ -163,7 +186,7 @@ class ObjParser(Parser):
             self.wavefront.add_mesh(self.mesh)
         if self.material is None:
             self.material = Material()
-        self.mesh.add_material(self.material)
+        material_index = self.mesh.add_material(self.material)
 
         if self.index_lut is None and (self.wavefront.normals or self.wavefront.tex_coords):
             # Need to assure each index triplet is unique
@@ -193,6 +216,7 @@ class ObjParser(Parser):
                     (first_indices.n, previous_indices.n, indices.n),
                     (first_indices.t, previous_indices.t, indices.t),
                 ))
+                self.mesh.face_materials.append(material_index)
             elif i == 0:
                 first_indices = indices
             previous_indices = indices
@@ -254,7 +278,7 @@ class MaterialParser(Parser):
 
 
 class Material:
-    def __init__(self, name):
+    def __init__(self, name=''):
         self.name = name
         self.diffuse = [.8, .8, .8, 1.]
         self.ambient = [.2, .2, .2, 1.]
@@ -263,13 +287,6 @@ class Material:
         self.shininess = 0.
         self.textures = {}
 
-    @property
-    def normals(self):
-        if self._normals:
-            return self._normals
-        # TODO: Compute from geometry
-        return self._normals
-
     def pad_light(self, values):
         """Accept an array of up to 4 values, and return an array of 4 values.
         If the input array is less than length 4, pad it with zeroes until it
@@ -309,19 +326,26 @@ class InternalMesh:
         self.name = name
         self.materials = []
         self.faces = []
+        # Index into `materials` of the material of each face
+        self.face_materials = []
+        self._material_indices = {}
 
     def has_material(self, new_material):
         """Determine whether we already have a material of this name."""
-        for material in self.materials:
-            if material.name == new_material.name:
-                return True
-        return False
+        return new_material.name in self._material_indices
 
     def add_material(self, material):
-        """Add a material to the mesh, IFF it is not already present."""
-        if self.has_material(material):
-            return
-        self.materials.append(material)
+        """Add a material to the mesh, IFF it is not already present.
+
+        Returns the index of the material (of this name) in `materials`.
+        """
+        try:
+            return self._material_indices[material.name]
+        except KeyError:
+            index = len(self.materials)
+            self._material_indices[material.name] = index
+            self.materials.append(material)
+            return index
 
 
 class Texture:
@@ -332,11 +356,27 @@ class Texture:
 
 
 class Mesh:
+    """A mesh ready for upload, with uint16 triangle `faces`.
+
+    The faces are sorted by material, and `draw_ranges` holds a
+    `DrawRange(material, start, count)` per material, where `start` and
+    `count` are in indices (i.e. three per face). `count` is passed to
+    `drawElements` as is, but its offset is in bytes, i.e.
+    `start * faces.itemsize`::
+
+        gl.drawElements(gl.TRIANGLES, r.count, gl.UNSIGNED_SHORT,
+                        r.start * mesh.faces.itemsize)
+    """
+
     def __init__(self, name, n_faces, materials):
         self.name = name
         self.vertices = []
         self.normals = []
         self.texture_coords = []
+        self.draw_ranges = []
+        # Interleaved vertex attributes, see `interleave`
+        self.vertex_data = None
+        self.layout = None
 
         unknown_id = 0
         self.materials = {}
@@ -349,12 +389,83 @@ class Mesh:
 
         self.faces = np.empty((n_faces, 3), np.uint16)
 
+    def interleave(self, formats=None):
+        """Pack the vertex attributes into one interleaved buffer.
+
+        `formats` maps 'vertices', 'normals' and 'texture_coords' to a
+        storage format (see `layout.ATTRIBUTE_TYPES`), e.g. `{'normals':
+        'int8'}`. Absent attributes are left out. Returns the buffer as a
+        uint8 array, and its `VertexLayout`.
+        """
+        return interleave_attributes([
+            ('vertices', self.vertices),
+            ('normals', self.normals),
+            ('texture_coords', self.texture_coords),
+        ], formats)
+
+    def optimize(self, cache_size=16):
+        """Reorder the mesh for the GPU vertex caches, in place.
+
+        The triangles of each draw range are reordered for the
+        post-transform cache (see `geometry.optimize_vertex_cache`), and
+        the vertices are then renumbered in the order of first use, for
+        the vertex fetch. The geometry itself is unchanged. See
+        `geometry.optimize_vertex_cache` for the cost on large meshes.
+        """
+        n_vertices = len(self.vertices)
+        ranges = [(r.start // 3, (r.start + r.count) // 3) for r in self.draw_ranges]
+        for start, end in ranges or [(0, len(self.faces))]:
+            faces = self.faces[start:end]
+            self.faces[start:end] = faces[optimize_vertex_cache(
+                faces, n_vertices, cache_size)]
+        self.faces, order = reorder_vertices(self.faces, n_vertices)
+        self.vertices = self.vertices[order]
+        if self.normals is not None:
+            self.normals = self.normals[order]
+        if self.texture_coords is not None:
+            self.texture_coords = self.texture_coords[order]
+        if self.vertex_data is not None:
+            self.vertex_data = self.vertex_data[order]
+        return self
+
+    def face_materials(self):
+        """Return the index into `materials` of the material of each face"""
+        names = list(self.materials)
+        ids = np.zeros(len(self.faces), np.intp)
+        for draw_range in self.draw_ranges:
+            start = draw_range.start // 3
+            ids[start:start + draw_range.count // 3] = names.index(
+                draw_range.material)
+        return ids
+
+    def sort_by_material(self, face_materials):
+        """Sort the faces by material, and set the draw ranges.
+
+        `face_materials` is the index into `materials` of the material of
+        each face. The sort is stable, so faces keep their order within
+        each material.
+        """
+        face_materials = np.asarray(face_materials, np.intp)
+        order = np.argsort(face_materials, kind='stable')
+        self.faces = self.faces[order]
+        face_materials = face_materials[order]
+        names = list(self.materials)
+        starts = np.flatnonzero(np.diff(face_materials)) + 1
+        starts = np.concatenate([[0], starts]) if len(face_materials) else starts
+        ends = np.append(starts[1:], len(face_materials))
+        self.draw_ranges = [
+            DrawRange(names[face_materials[start]], 3 * int(start),
+                      3 * int(end - start))
+            for start, end in zip(starts, ends)]
+
 
 def create_mesh(model, source_mesh):
     mesh = Mesh(source_mesh.name, len(source_mesh.faces), source_mesh.materials)
 
     # Copy vertices, normals and textures into Mesh instance
     indices_seen = {}
+    # The position index in `model` of each vertex of the mesh
+    source_vertices = []
     for face_out_index, source_face in enumerate(source_mesh.faces):
         # Copy all index arrays
         for i, composit_index in enumerate(zip(source_face.vertex_indices,
@@ -366,13 +477,31 @@ def create_mesh(model, source_mesh):
                 new_index = len(mesh.vertices)
                 indices_seen[composit_index] = new_index
                 (vi, ni, ti) = composit_index
+                source_vertices.append(vi)
                 mesh.vertices.append(model.vertices[vi])
                 mesh.normals.append(model.normals[ni])
                 mesh.texture_coords.append(model.tex_coords[ti])
 
             # Set destination face indices:
             mesh.faces[face_out_index, i] = new_index
+    mesh.sort_by_material(source_mesh.face_materials)
     mesh.vertices = np.array(mesh.vertices, np.float32)
-    mesh.normals = np.array(mesh.normals, np.float32) if mesh.normals else None
-    mesh.texture_coords = np.array(mesh.texture_coords, np.float32) if mesh.texture_coords else None
+    if not any(any(face.normal_indices) for face in source_mesh.faces):
+        # No normals in file, compute them from the geometry. Vertices that
+        # were split (e.g. on texture seams) share the faces around their
+        # position, so that the shading is smooth across the split.
+        positions, position_faces = np.unique(
+            [face.vertex_indices for face in source_mesh.faces],
+            return_inverse=True)
+        normals = vertex_normals(
+            np.array(model.vertices, np.float32)[positions],
+            position_faces.reshape(-1, 3))
+        mesh.normals = normals[np.searchsorted(positions, source_vertices)]
+    else:
+        mesh.normals = np.array(mesh.normals, np.float32) if mesh.normals else None
+    if not any(any(face.tex_coord_indices) for face in source_mesh.faces):
+        # Only the placeholder entry, the file has no texture coordinates
+        mesh.texture_coords = None
+    else:
+        mesh.texture_coords = np.array(mesh.texture_coords, np.float32)
     return mesh
@@ -0,0 +1,249 @@
+"""
+Vectorized geometry processing: vertex normals and tangents, and
+reordering of meshes for the GPU vertex caches.
+
+All accumulation over faces is done with scatter-adds (`np.bincount`), so
+vertices shared by several faces in the same batch get every contribution,
+and faces are processed in chunks to bound the memory of the temporaries.
+"""
+
+import numpy as np
+
+
+#: Number of faces to process at a time
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def _chunks(faces, chunk_size):
+    for start in range(0, len(faces), chunk_size):
+        yield faces[start:start + chunk_size]
+
+
+def _scatter_add(out, indices, values):
+    """Add rows of `values` to the rows `indices` of `out`.
+
+    Unlike `out[indices] += values`, this accumulates all contributions
+    when `indices` contains duplicates.
+    """
+    for axis in range(out.shape[1]):
+        out[:, axis] += np.bincount(
+            indices, weights=values[:, axis], minlength=len(out))
+
+
+def _normalize_rows(v):
+    lengths = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.where(lengths > 0, lengths, 1)
+
+
+def face_normals(vertices, faces, normalized=True):
+    """Calculate the normals of a set of triangles.
+
+    If `normalized` is false, the length of each normal is twice the
+    area of the triangle.
+    """
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    if normalized:
+        normals = _normalize_rows(normals)
+    return normals
+
+
+def _corner_angles(v0, v1, v2):
+    """The interior angles at each of the three corners of triangles"""
+    angles = np.empty((len(v0), 3), dtype=v0.dtype)
+    for i, (a, b, c) in enumerate(((v0, v1, v2), (v1, v2, v0), (v2, v0, v1))):
+        e1 = b - a
+        e2 = c - a
+        angles[:, i] = np.arctan2(
+            np.linalg.norm(np.cross(e1, e2), axis=1),
+            np.einsum('ij,ij->i', e1, e2))
+    return angles
+
+
+def vertex_normals(vertices, faces, weighting='area',
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """Calculate smooth vertex normals for a triangle mesh.
+
+    The normal of each vertex is the normalized sum of the normals of the
+    faces using it, weighted by either face area (`weighting='area'`) or
+    by the angle of the face at the vertex (`weighting='angle'`).
+    """
+    if weighting not in ('area', 'angle'):
+        raise ValueError('Unknown normal weighting: %r' % weighting)
+    vertices = np.asarray(vertices, dtype=np.float32)
+    faces = np.asarray(faces)
+    normals = np.zeros((len(vertices), 3), dtype=np.float64)
+    for chunk in _chunks(faces, chunk_size):
+        v0, v1, v2 = (vertices[chunk[:, i]] for i in range(3))
+        # Unnormalized, so the length is proportional to the area:
+        n = np.cross(v1 - v0, v2 - v0)
+        if weighting == 'area':
+            contributions = np.concatenate([n, n, n])
+        else:
+            n = _normalize_rows(n)
+            angles = _corner_angles(v0, v1, v2)
+            contributions = np.concatenate(
+                [n * angles[:, i, None] for i in range(3)])
+        _scatter_add(normals, chunk.T.ravel(), contributions)
+    return _normalize_rows(normals).astype(np.float32)
+
+
+def vertex_tangents(vertices, normals, tex_coords, faces,
+                    chunk_size=DEFAULT_CHUNK_SIZE):
+    """Calculate per-vertex tangents for a triangle mesh.
+
+    The tangents point along the direction of increasing u texture
+    coordinate, and are Gram-Schmidt orthogonalized against `normals`.
+    Faces with degenerate texture coordinates do not contribute.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    normals = np.asarray(normals, dtype=np.float32)
+    tex_coords = np.asarray(tex_coords, dtype=np.float32)
+    faces = np.asarray(faces)
+    tangents = np.zeros((len(vertices), 3), dtype=np.float64)
+    for chunk in _chunks(faces, chunk_size):
+        v0, v1, v2 = (vertices[chunk[:, i]] for i in range(3))
+        w0, w1, w2 = (tex_coords[chunk[:, i]] for i in range(3))
+        e1 = v1 - v0
+        e2 = v2 - v0
+        d1 = w1 - w0
+        d2 = w2 - w0
+        det = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where(det != 0, 1.0 / det, 0)
+        sdir = (d2[:, 1, None] * e1 - d1[:, 1, None] * e2) * r[:, None]
+        _scatter_add(tangents, chunk.T.ravel(), np.concatenate([sdir] * 3))
+
+    # Gram-Schmidt orthogonalize
+    tangents -= normals * np.einsum('ij,ij->i', normals, tangents)[:, None]
+    return _normalize_rows(tangents).astype(np.float32)
+
+
+def cache_miss_ratio(faces, cache_size=16):
+    """Simulate a FIFO post-transform vertex cache over triangles.
+
+    Returns the average number of cache misses per triangle (ACMR),
+    between 0.5 for an ideal order of a regular mesh, and 3.
+    """
+    cache = []
+    cached = set()
+    misses = 0
+    for v in np.asarray(faces).ravel().tolist():
+        if v not in cached:
+            misses += 1
+            cached.add(v)
+            cache.append(v)
+            if len(cache) > cache_size:
+                cached.discard(cache.pop(0))
+    return misses / max(len(faces), 1)
+
+
+def optimize_vertex_cache(faces, n_vertices=None, cache_size=16,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+    """Reorder triangles for locality in the post-transform vertex cache.
+
+    This is the Tipsify algorithm of Sander, Nehab and Barczak (2007):
+    triangles are emitted fanning around vertices, picking as the next
+    fan center the most recently used vertex that will still be in the
+    cache. Returns the permutation of the faces.
+
+    Large meshes are reordered in chunks of `chunk_size` consecutive
+    faces, with the vertices of each chunk renumbered, so that the
+    bookkeeping stays bounded by the chunk size.
+
+    The adjacency is built with NumPy, but the triangles are emitted one
+    by one in Python, which takes a few seconds per million triangles.
+    For large meshes it is worth doing once, and saving the result.
+    """
+    faces = np.asarray(faces)
+    if n_vertices is None:
+        n_vertices = int(faces.max()) + 1 if len(faces) else 0
+    order = np.empty(len(faces), dtype=np.intp)
+    remap = np.empty(n_vertices, dtype=np.intp)
+    used = np.zeros(n_vertices, dtype=bool)
+    for start in range(0, len(faces), chunk_size):
+        chunk = faces[start:start + chunk_size]
+        used[chunk.ravel()] = True
+        vertices = np.flatnonzero(used)
+        used[vertices] = False
+        remap[vertices] = np.arange(len(vertices))
+        order[start:start + len(chunk)] = start + _tipsify(
+            remap[chunk], len(vertices), cache_size)
+    return order
+
+
+def _tipsify(faces, n_vertices, cache_size):
+    """Tipsify the faces of a mesh, using all its vertices"""
+    flat = faces.ravel()
+    # Triangles around each vertex, in CSR form
+    counts = np.bincount(flat, minlength=n_vertices)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    adjacency = (np.argsort(flat, kind='stable') // 3).tolist()
+    live = counts.tolist()
+    cache_time = [0] * n_vertices
+    emitted = [False] * len(faces)
+    corners = flat.tolist()
+
+    order = []
+    dead_end = []
+    time = cache_size + 1
+    cursor = 0
+    fan = -1
+    while True:
+        if fan < 0:
+            # Find a vertex with triangles left, preferring recent ones
+            while dead_end:
+                v = dead_end.pop()
+                if live[v]:
+                    fan = v
+                    break
+            while fan < 0 and cursor < n_vertices:
+                if live[cursor]:
+                    fan = cursor
+                cursor += 1
+            if fan < 0:
+                break
+        candidates = []
+        for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            triangle = corners[3 * t:3 * t + 3]
+            dead_end += triangle
+            candidates += triangle
+            for v in triangle:
+                live[v] -= 1
+                if time - cache_time[v] > cache_size:
+                    cache_time[v] = time
+                    time += 1
+        # The candidate that will still be cached, and has been the longest.
+        # Without one, fall back to the dead-end stack.
+        fan = -1
+        best = 0
+        for v in candidates:
+            if live[v]:
+                age = time - cache_time[v]
+                if age + 2 * live[v] <= cache_size and age > best:
+                    best = age
+                    fan = v
+    return np.array(order, dtype=np.intp)
+
+
+def reorder_vertices(faces, n_vertices=None):
+    """Renumber vertices in the order they are first used by the faces.
+
+    This improves the locality of vertex fetches. Unreferenced vertices
+    are moved to the end. Returns the new faces, and the old index of each
+    new vertex (to reorder the vertex attributes with).
+    """
+    faces = np.asarray(faces)
+    if n_vertices is None:
+        n_vertices = int(faces.max()) + 1 if len(faces) else 0
+    used, first = np.unique(faces.ravel(), return_index=True)
+    order = used[np.argsort(first, kind='stable')]
+    unused = np.setdiff1d(np.arange(n_vertices), used, assume_unique=True)
+    order = np.concatenate([order, unused])
+    remap = np.empty(n_vertices, dtype=faces.dtype)
+    remap[order] = np.arange(n_vertices, dtype=faces.dtype)
+    return remap[faces], order
@@ -1,16 +1,162 @@
+from collections import deque
 from contextlib import contextmanager
-from asyncio import Future, ensure_future, get_event_loop
+from asyncio import Future, ensure_future, get_event_loop, wrap_future
+import concurrent.futures
+import re
+import threading
 
 import numpy as np
 
 from .comm import QueryableComm
 
 
+_executor = None
+
+_KEY = re.compile(r'key\d+$')
+
+#: The constants and methods of the frontend WebGL context, as last
+#: reported by a frontend. New contexts start out with these, so that GL
+#: calls can be made before their own frontend has replied.
+_bindings = dict(constants=None, methods=None)
+
+
+def load_bindings(filename):
+    """Preload the binding tables from a file written by `save_bindings`"""
+    import json
+    with open(filename) as f:
+        bindings = json.load(f)
+    _bindings.update(constants=bindings['constants'],
+                     methods=bindings['methods'])
+
+
+def save_bindings(filename):
+    """Save the binding tables reported by a frontend, for `load_bindings`"""
+    import json
+    if _bindings['constants'] is None or _bindings['methods'] is None:
+        raise ValueError('No binding tables have been received yet')
+    with open(filename, 'w') as f:
+        json.dump(_bindings, f)
+
+
 def _is_json_primitive(value):
     return value is None or isinstance(
         value, (str, list, dict, bool, int, float))
 
 
+class Output:
+    """An array argument for the frontend to allocate and fill in.
+
+    Pass it to a query such as `readPixels`, and the query resolves to
+    a NumPy array of `shape` and `dtype`, sent back as a binary buffer.
+    """
+
+    def __init__(self, shape, dtype=np.uint8):
+        self.shape = tuple(np.atleast_1d(shape))
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+
+class Result:
+    """The return value of an earlier call in the same `query_all`.
+
+    Pass it as an argument to use an object created earlier in the same
+    message (e.g. by `createShader`), without waiting for its handle.
+    `index` is the position of that call.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+
+def _run_in_executor(func, *args):
+    """Run a function on the serialization thread pool"""
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=2)
+    return get_event_loop().run_in_executor(_executor, func, *args)
+
+
+#: Handles can be asyncio futures, or concurrent ones from queries made on
+#: worker threads
+_future_types = (Future, concurrent.futures.Future)
+
+
+def _is_encoded(arg):
+    """Whether an argument is a `codec.EncodedArray`.
+
+    The codec is only imported once some other argument type is found.
+    """
+    from .codec import EncodedArray
+    return isinstance(arg, EncodedArray)
+
+
+def _find_futures(instructions):
+    return [a for i in instructions for a in i.args
+            if isinstance(a, _future_types)]
+
+
+def _handle_keys(handle):
+    """The ways a handle can be referred to: its future, and its key"""
+    keys = {handle}
+    if (isinstance(handle, _future_types) and handle.done() and
+            not handle.cancelled() and handle.exception() is None):
+        keys.add(handle.result())
+    return keys
+
+
+def _find_handles(instructions):
+    """The object handles among the arguments of instructions"""
+    return [a for i in instructions for a in i.args
+            if isinstance(a, _future_types) or
+            (isinstance(a, str) and _KEY.match(a))]
+
+
+async def _resolve(future):
+    if isinstance(future, concurrent.futures.Future):
+        future = wrap_future(future)
+    return await future
+
+
+def _serialize_instructions(instructions, resolved):
+    """Serialize instructions, separating out their binary buffers.
+
+    `resolved` maps the ids of the futures among the arguments to their
+    results.
+    """
+    buffers = []
+    processed_instructions = []
+    for i in instructions:
+        processed_args = []
+        for a in i.args:
+            if _is_json_primitive(a):
+                processed_args.append(a)
+            elif isinstance(a, (np.ndarray, np.generic)):
+                processed_args.append('buffer%s' % a.dtype)
+                buffers.append(memoryview(a))
+            elif isinstance(a, (memoryview, bytes, bytearray)):
+                processed_args.append('buffer%s' % a.dtype)
+                buffers.append(a)
+            elif isinstance(a, _future_types):
+                processed_args.append(resolved[id(a)])
+            elif isinstance(a, Output):
+                processed_args.append(dict(alloc=str(a.dtype), length=a.size))
+            elif isinstance(a, Result):
+                processed_args.append(dict(result=a.index))
+            elif _is_encoded(a):
+                # Decoded by the frontend, from a binary buffer
+                processed_args.append(a._serialize('buffer%s' % a.data.dtype))
+                buffers.append(memoryview(a.data))
+            else:
+                raise TypeError(
+                    'Invalid argument to method %s: %r' % (i.name, a))
+        processed_instructions.append(Instruction(i.name, processed_args)._serialize())
+    return processed_instructions, buffers
+
+
 class Instruction:
     def __init__(self, name, args=None, gl=None):
         self.name = name
@@ -27,23 +173,59 @@ class Instruction:
         return dict(op=self.name, args=self.args)
 
 
+def _arg_nbytes(arg):
+    if isinstance(arg, (np.ndarray, np.generic, memoryview, bytes, bytearray)):
+        return memoryview(arg).nbytes
+    elif _is_json_primitive(arg) or isinstance(arg, _future_types):
+        return 0
+    elif _is_encoded(arg):
+        return arg.nbytes
+    return 0
+
+
 class ChunkContext:
-    """A context that accumulates instructions for later execution"""
-    def __init__(self, constants, methods):
+    """A context that accumulates instructions for later execution
+
+    If `flush` is given, the instructions accumulated so far are passed to
+    it whenever they reach `max_bytes` of array data or `max_instructions`
+    instructions.
+    """
+    def __init__(self, constants, methods, flush=None, max_bytes=None,
+                 max_instructions=None):
         self._constants = constants
         self._methods = methods
         self._instructions = []
+        self._flush = flush
+        self._max_bytes = max_bytes
+        self._max_instructions = max_instructions
+        self._nbytes = 0
+        self.flushed = False
 
     def __getattr__(self, name):
         if self._constants and name in self._constants:
             return self._constants[name]
         elif self._methods and name in self._methods:
+            if self._flush is not None:
+                self._check_flush()
             method = Instruction(name)
             self._instructions.append(method)
             return method
         else:
             raise AttributeError(name)
 
+    def _check_flush(self):
+        """Flush if the last (completed) instruction reached a limit"""
+        if not self._instructions or not hasattr(self._instructions[-1], 'args'):
+            return
+        self._nbytes += sum(_arg_nbytes(a) for a in self._instructions[-1].args)
+        if ((self._max_instructions and
+                len(self._instructions) >= self._max_instructions) or
+                (self._max_bytes and self._nbytes >= self._max_bytes)):
+            self._flush(list(self))
+            self._instructions = []
+            self._nbytes = 0
+            self.flushed = True
+
     def __iter__(self):
         for instruction in self._instructions:
             if not hasattr(instruction, 'args'):
@@ -52,21 +234,102 @@ class ChunkContext:
             yield instruction
 
 
+class _SubmissionQueue:
+    """Callables submitted from other threads, run in order on the event loop.
+
+    Worker threads append to a deque, and the loop is woken up once to
+    run everything queued so far.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.thread = threading.get_ident()
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def on_loop_thread(self):
+        return threading.get_ident() == self.thread
+
+    def put(self, func):
+        self._queue.append(func)
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self._lock:
+            self._scheduled = False
+        while self._queue:
+            self._queue.popleft()()
+
+
+def _copy_to_concurrent(source, target):
+    """Pass the outcome of an asyncio future on to a concurrent one"""
+    def copy(source):
+        if source.cancelled():
+            target.cancel()
+        elif source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
+    source.add_done_callback(copy)
+
+
 class JupyterGL:
+    """A WebGL context in the frontend.
+
+    GL calls can be made from worker threads as well as from the event
+    loop. Each thread builds its own chunks, and what a worker thread
+    sends is queued and sent in order by the event loop. Queries made
+    from a worker thread return a `concurrent.futures.Future`.
+
+    With `preserve_drawing_buffer`, the frontend keeps the drawing buffer
+    after it has been displayed, so that it can be read back (e.g. with
+    `glu.read_pixels`) after the draw calls. This can be slower, and is
+    off by default.
+    """
 
     _cmd_id = 0
+    _cmd_id_lock = threading.Lock()
+
+    #: Chunks of at least this many instructions are serialized on a
+    #: worker thread, to keep the event loop responsive.
+    offload_threshold = 10000
 
-    def __init__(self):
+    def __init__(self, comm=None, preserve_drawing_buffer=False):
+        self._local = threading.local()
         self._context = None
         self._comm = None
-        self._open()
-        self._constants = {}
-        self._methods = []
+        self._views = []
+        self._preserve_drawing_buffer = preserve_drawing_buffer
+        self._open(comm)
+        self._constants = dict(_bindings['constants'] or {})
+        self._methods = list(_bindings['methods'] or [])
+        self._program_cache = {}
+        # Handles used by instructions the frontend keeps (e.g. those of
+        # the view), by the owner of the instructions
+        self._pinned = {}
+        # Called whenever handles may have been unpinned
+        self._unpin_hooks = []
+        self._submissions = _SubmissionQueue(get_event_loop())
+        self._send_context_attributes()
         self._request_constants()
         self._request_methods()
         self._prev_sent = get_event_loop().create_future()
         self._prev_sent.set_result(None)
 
+    @property
+    def _context(self):
+        """The chunk being built by the current thread, if any"""
+        return getattr(self._local, 'context', None)
+
+    @_context.setter
+    def _context(self, value):
+        self._local.context = value
+
     def __del__(self):
         self._close()
 
@@ -78,36 +341,163 @@ class JupyterGL:
             d.extend(self._methods)
         return d
 
-    def _open(self):
-        """Open a _comm to the frontend if one isn't already open."""
+    def _open(self, comm=None):
+        """Open a _comm to the frontend if one isn't already open.
+
+        An already opened `QueryableComm` can be given as `comm`.
+        """
         if self._comm is None:
-            self._comm = QueryableComm(target_name='jupytergl')
+            if comm is None:
+                comm = QueryableComm(target_name='jupytergl')
+            self._comm = comm
             self._comm.on_msg(self._handle_msg)
             self._comm.kernel
 
     def _close(self):
-        """Close the underlying _comm."""
+        """Close the underlying _comm, and those of any added views."""
         if self._comm is not None:
             self._comm.close()
             self._comm = None
+        while self._views:
+            self._views.pop().close()
+
+    def add_view(self, comm=None):
+        """Also send everything to another frontend context.
+
+        Every message is encoded once, and the same payload is sent to the
+        main comm and all added views. Queries are executed by all views,
+        so that they allocate the same object handles, but only replies
+        from the main comm are used. Views should therefore be added
+        before any objects are created. Returns the comm of the view.
+        """
+        if comm is None:
+            comm = QueryableComm(target_name='jupytergl')
+        self._views.append(comm)
+        self._send_context_attributes(comms=[comm])
+        return comm
+
+    def remove_view(self, comm):
+        """Stop sending to a view added with `add_view`, and close it"""
+        self._views.remove(comm)
+        comm.close()
+
+    def set_view_state(self, comm, camera=None, viewport=None):
+        """Override the camera and/or viewport of a single view.
+
+        `comm` is the main comm (`_comm`) or one returned by `add_view`.
+        `camera` is a dict with any of the keys `position`, `target` (both
+        3-element lists) and `fov`, and `viewport` an `[x, y, width,
+        height]` list.
+        """
+        async def send_state(prev_sent):
+            await prev_sent
+            command = dict(
+                type='command',
+                command=dict(
+                    op='viewState',
+                    args=[camera, viewport],
+                    instructions=[],
+                )
+            )
+            self._send(command, comms=[comm])
+        self._chain(send_state)
 
     @contextmanager
-    def chunk(self):
+    def chunk(self, max_bytes=None, max_instructions=None):
+        """Accumulate the GL calls of the block, and send them at its end.
+
+        With `max_bytes` (of array arguments) or `max_instructions`, the
+        calls are sent in parts as the limits are reached, so that they
+        do not all have to be kept in memory. The frontend still executes
+        the whole chunk at once, when the last part arrives. The limits
+        are ignored for nested chunks.
+
+        On the event loop, a part is only sent right away if nothing is
+        waiting to be sent before it and the handles it uses are resolved.
+        The frontend holds back other GL calls until the last part, but
+        answers queries in between, so that later parts can use handles
+        that are created while the chunk is sent. From a worker thread,
+        building the chunk waits for each part to be sent. If the block
+        raises, the parts already sent are discarded by the frontend.
+        """
         outermost = self._context is None
         if outermost:
-            self._context = ChunkContext(self._constants, self._methods)
+            flush = None
+            if max_bytes or max_instructions:
+                # The parts are tagged, so that the frontend can tell them
+                # from other messages sent while the chunk is built
+                chunk_id = self._next_cmd_id()
+                flush = lambda instructions: self._flush_part(
+                    chunk_id, instructions)
+            self._context = ChunkContext(
+                self._constants, self._methods, flush, max_bytes,
+                max_instructions)
         try:
-            yield self
+            try:
+                yield self
+            except BaseException:
+                if outermost and self._context.flushed:
+                    # Close the chunk, so that the frontend drops the parts
+                    # it has and stops holding back other messages
+                    self._send_instructions(
+                        [], 'exec', chunk=chunk_id, abort=True)
+                raise
             if outermost:
-                self._send_instructions(self._context, 'exec')
+                # The last part of a flushed chunk is sent even if empty
+                if self._context.flushed:
+                    self._send_instructions(
+                        self._context, 'exec', more=False, chunk=chunk_id)
+                else:
+                    self._send_instructions(self._context, 'exec')
         finally:
-            self._context = None
+            if outermost:
+                self._context = None
+
+    def _flush_part(self, chunk_id, instructions):
+        """Send a completed part of a chunk.
+
+        From a worker thread, this waits until the part has been sent, so
+        that at most one part of the chunk is held in memory at a time.
+        """
+        if self._submissions.on_loop_thread():
+            self._send_part(chunk_id, instructions)
+        else:
+            sent = concurrent.futures.Future()
+            self._submissions.put(
+                lambda: self._send_part(chunk_id, instructions, sent))
+            sent.result()
+
+    def _send_part(self, chunk_id, instructions, sent=None):
+        """Send a part of a chunk, right away if possible.
+
+        If nothing is waiting to be sent before it, and the handles among
+        its arguments are already resolved, the part is sent immediately,
+        so that its arrays can be released while the rest of the chunk is
+        built. Otherwise it is queued after the pending sends. `sent` is
+        a concurrent future to resolve once the part has been sent.
+        """
+        futures = _find_futures(instructions)
+        if self._prev_sent.done() and all(
+                f.done() and not f.cancelled() and f.exception() is None
+                for f in futures):
+            resolved = {id(f): f.result() for f in futures}
+            serialized, buffers = _serialize_instructions(instructions, resolved)
+            self._send(dict(type='exec', instructions=serialized, more=True,
+                            chunk=chunk_id),
+                       dict(cmd_id=self._next_cmd_id()), buffers)
+            if sent is not None:
+                sent.set_result(None)
+        else:
+            self._send_instructions(instructions, 'exec', more=True,
+                                    chunk=chunk_id)
+            if sent is not None:
+                _copy_to_concurrent(self._prev_sent, sent)
 
     def branch(self):
         return BranchContext(self)
 
     def exec_(self, name, args):
-        if self.context is None:
+        if self._context is None:
             self._send_instructions([Instruction(name, args)], 'exec')
         else:
             getattr(self._context, name)(*args)
@@ -117,35 +507,160 @@ class JupyterGL:
             raise RuntimeError(
                 'Cannot directly query a JupyterGL method within '
                 'an active context')
+        if not self._submissions.on_loop_thread():
+            return self._query_from_thread(self.query, name, args)
         cmd_id = self._send_instructions([Instruction(name, args)], 'query')
-        return self._comm.future_query_reply(cmd_id)
+        outputs = [a for a in args if isinstance(a, Output)]
+        return self._comm.future_query_reply(cmd_id, outputs)
+
+    def query_all(self, calls):
+        """Execute several calls in one message, and return all results.
+
+        `calls` is a sequence of `(name, args)` pairs. The returned future
+        resolves to a list with the return value of each call, or if any
+        call has `Output` arguments, to the filled in arrays.
+        """
+        if self._context is not None:
+            raise RuntimeError(
+                'Cannot directly query a JupyterGL method within '
+                'an active context')
+        if not self._submissions.on_loop_thread():
+            return self._query_from_thread(self.query_all, calls)
+        instructions = [Instruction(name, tuple(args)) for name, args in calls]
+        cmd_id = self._send_instructions(instructions, 'queryAll')
+        outputs = [a for i in instructions for a in i.args
+                   if isinstance(a, Output)]
+        return self._comm.future_query_reply(cmd_id, outputs)
+
+    def _query_from_thread(self, query, *args):
+        """Queue a query for the event loop, and return a concurrent future"""
+        result = concurrent.futures.Future()
+        self._submissions.put(
+            lambda: _copy_to_concurrent(query(*args), result))
+        return result
+
+    def record(self, recorder=None):
+        """Record all messages sent from now on.
+
+        Returns the recorder, by default a `BundleRecorder` which can
+        export the session for replay without a kernel. Stop recording
+        with `stop_recording`.
+        """
+        if recorder is None:
+            from .bundle import BundleRecorder
+            recorder = BundleRecorder()
+        self._comm.recorders.append(recorder)
+        return recorder
+
+    def stop_recording(self, recorder):
+        self._comm.recorders.remove(recorder)
+        return recorder
+
+    def release(self, *handles):
+        """Drop the frontend references to a set of object handles.
+
+        This should be called after the objects have been deleted (e.g.
+        with `deleteBuffer`), so that the frontend can garbage collect them.
+        Handles still used by the view, a scene or an animation cannot be
+        released. Released programs are dropped from the program cache.
+        """
+        pinned = [h for h in handles if self._is_pinned(h)]
+        if pinned:
+            raise ValueError(
+                'Cannot release handles that are still used by the view, '
+                'a scene or an animation: %r' % pinned)
+        released = set()
+        for handle in handles:
+            released |= _handle_keys(handle)
+        for key, program in list(self._program_cache.items()):
+            if _handle_keys(program) & released:
+                del self._program_cache[key]
+        async def send_release(prev_sent):
+            keys = []
+            for handle in handles:
+                if isinstance(handle, _future_types):
+                    handle = await _resolve(handle)
+                keys.append(handle)
+            await prev_sent
+            self._send(dict(type='release', keys=keys))
+        self._chain(send_release)
 
     @contextmanager
     def orbitView(self, fov=None, near=None, far=None):
+        with self._command('orbitView', [fov, near, far]):
+            yield self
+
+    @contextmanager
+    def updateView(self):
+        """Replace the render instructions of the current view.
+
+        Unlike `orbitView`, this keeps the existing view (and its camera)
+        alive, and simply re-renders it with the new instructions.
+        """
+        with self._command('updateView', []):
+            yield self
+
+    @contextmanager
+    def _command(self, op, args):
         if self._context is not None:
-            raise ValueError('Cannot call orbit view from chunk!')
+            raise ValueError('Cannot call %s from chunk!' % op)
         self._context = ChunkContext(self._constants, self._methods)
         try:
-            yield self
+            yield
             instructions = list(self._context)
         finally:
             self._context = None
-
-        async def send_command():
+        if op in ('orbitView', 'updateView'):
+            self._pin('view', instructions)
+        self._send_command(op, args, instructions)
+
+    def _pin(self, owner, instructions):
+        """Record the handles used by instructions the frontend keeps.
+
+        `owner` identifies the instructions (e.g. 'view'), and replaces
+        the handles previously pinned by it.
+        """
+        handles = _find_handles(instructions)
+        if handles:
+            previous = self._pinned.get(owner)
+            self._pinned[owner] = handles
+            if previous is not None:
+                self._unpinned()
+        else:
+            self._unpin(owner)
+
+    def _unpin(self, owner):
+        if self._pinned.pop(owner, None) is not None:
+            self._unpinned()
+
+    def _unpinned(self):
+        for hook in list(self._unpin_hooks):
+            hook = hook()
+            if hook is not None:
+                hook()
+
+    def _is_pinned(self, handle):
+        """Whether a handle is used by instructions the frontend keeps"""
+        keys = _handle_keys(handle)
+        return any(keys & _handle_keys(h)
+                   for handles in self._pinned.values() for h in handles)
+
+    def _send_command(self, op, args, instructions):
+        async def send_command(prev_sent):
             nonlocal instructions
             instructions, buffers = await self._separate_buffers(instructions)
             command = dict(
                 type='command',
                 command=dict(
-                    op='orbitView',
-                    args=[fov, near, far],
+                    op=op,
+                    args=args,
                     instructions=instructions,
                 )
             )
+            packed = await self._pack(command, len(instructions))
             await prev_sent
-            self._send(command, None, buffers)
-        prev_sent = self._prev_sent  # Put into closure
-        self._prev_sent = ensure_future(send_command())
+            self._send(command, None, buffers, packed=packed)
+        self._chain(send_command)
 
     def __getattr__(self, name):
         if self._constants and name in self._constants:
@@ -160,29 +675,38 @@ class JupyterGL:
             raise AttributeError(name)
 
     def _get_futures(self, instructions):
-        return [a for i in instructions for a in i.args if isinstance(a, Future)]
+        return _find_futures(instructions)
 
     async def _separate_buffers(self, instructions):
-        buffers = []
-        processed_instructions = []
-        for i in instructions:
-            processed_args = []
-            for a in i.args:
-                if _is_json_primitive(a):
-                    processed_args.append(a)
-                elif isinstance(a, (np.ndarray, np.generic)):
-                    processed_args.append('buffer%s' % a.dtype)
-                    buffers.append(memoryview(a))
-                elif isinstance(a, (memoryview, bytes, bytearray)):
-                    processed_args.append('buffer%s' % a.dtype)
-                    buffers.append(a)
-                elif isinstance(a, Future):
-                    processed_args.append(await a)
-                else:
-                    raise TypeError(
-                        'Invalid argument to method %s: %r' % (i.name, a))
-            processed_instructions.append(Instruction(i.name, processed_args)._serialize())
-        return processed_instructions, buffers
+        instructions = list(instructions)
+        offload = len(instructions) >= self.offload_threshold
+        if offload:
+            futures = await _run_in_executor(_find_futures, instructions)
+        else:
+            futures = _find_futures(instructions)
+        resolved = {}
+        for future in futures:
+            resolved[id(future)] = await _resolve(future)
+        if offload:
+            return await _run_in_executor(
+                _serialize_instructions, instructions, resolved)
+        return _serialize_instructions(instructions, resolved)
+
+    async def _pack(self, msg, n_instructions):
+        """JSON encode large messages on a worker thread.
+
+        Returns None for small messages, which are encoded when sent.
+        """
+        if n_instructions < self.offload_threshold:
+            return None
+        return await _run_in_executor(QueryableComm.pack, msg)
+
+    def _send_context_attributes(self, comms=None):
+        """Send the WebGL context attributes, before the context is created"""
+        if self._preserve_drawing_buffer:
+            msg = dict(type='contextAttributes',
+                       attributes=dict(preserveDrawingBuffer=True))
+            self._send(msg, comms=comms)
 
     def _request_constants(self):
         msg = dict(type="getConstants", target="context")
@@ -192,29 +716,72 @@ class JupyterGL:
         msg = dict(type="getMethods", target="context")
         self._send(msg)
 
-    def _send_instructions(self, instructions, mode):
-        if not instructions:
+    def _send_instructions(self, instructions, mode, more=None, chunk=None,
+                           abort=False):
+        """Send instructions in a message of type `mode`.
+
+        For the parts of a chunk, `chunk` is the id of the chunk, and `more`
+        is true for all but the last part, which is sent even when empty.
+        With `abort`, the last part instead discards the chunk.
+        """
+        if not instructions and chunk is None:
             return
-        async def send_resolved():
+        async def send_resolved(prev_sent):
             nonlocal instructions
             instructions, buffers = await self._separate_buffers(instructions)
             msg = dict(
                 type=mode,
                 instructions=instructions,
             )
+            if chunk is not None:
+                msg['chunk'] = chunk
+                if more:
+                    msg['more'] = True
+                if abort:
+                    msg['abort'] = True
+            packed = await self._pack(msg, len(instructions))
             await prev_sent
-            self._send(msg, metadata, buffers)
+            self._send(msg, metadata, buffers, packed=packed)
 
-        JupyterGL._cmd_id += 1
-        metadata = dict(cmd_id=JupyterGL._cmd_id)
-        prev_sent = self._prev_sent  # Put into closure
-        self._prev_sent = ensure_future(send_resolved())
+        metadata = dict(cmd_id=self._next_cmd_id())
+        self._chain(send_resolved)
         return metadata['cmd_id']
 
-    def _send(self, msg, metadata=None, buffers=None):
-        """Sends a message to the model in the front-end."""
-        if self._comm is not None and self._comm.kernel is not None:
-            self._comm.send(data=msg, metadata=metadata, buffers=buffers)
+    def _chain(self, send):
+        """Schedule the coroutine `send(prev_sent)` after all previous sends.
+
+        From a thread other than the event loop's, this is queued for the
+        loop, in the order of submission.
+        """
+        def submit():
+            self._prev_sent = ensure_future(send(self._prev_sent))
+        if self._submissions.on_loop_thread():
+            submit()
+        else:
+            self._submissions.put(submit)
+
+    @staticmethod
+    def _next_cmd_id():
+        with JupyterGL._cmd_id_lock:
+            JupyterGL._cmd_id += 1
+            return JupyterGL._cmd_id
+
+    def _send(self, msg, metadata=None, buffers=None, comms=None, packed=None):
+        """Sends a message to the model in the front-end(s).
+
+        `packed` is the message already encoded with `QueryableComm.pack`.
+        """
+        if comms is None:
+            comms = [self._comm] + self._views
+        comms = [c for c in comms if c is not None and c.connected]
+        if len(comms) == 1 and packed is None:
+            comms[0].send(data=msg, metadata=metadata, buffers=buffers)
+        elif comms:
+            # Encode once, and send the same payload to all views
+            if packed is None:
+                packed = comms[0].pack(msg)
+            for comm in comms:
+                comm.send_packed(msg, packed, metadata, buffers)
 
     def _handle_msg(self, message):
         """Called when a msg is received from the front-end"""
@@ -225,9 +792,11 @@ class JupyterGL:
             # TODO: Sanitize constants?
             self._constants.clear()
             self._constants.update(msg['data'])
+            _bindings['constants'] = dict(msg['data'])
         elif msg['type'] == 'methodsReply':
             # TODO: Sanitize methods?
             self._methods[:] = msg['data']
+            _bindings['methods'] = list(msg['data'])
         elif msg['type'] == 'queryReply':
             # This should have been handled in QueryableComm!
             raise ValueError(msg)
@@ -243,10 +812,17 @@ class BranchContext(JupyterGL):
     """
 
     def __init__(self, gl):
+        self._local = threading.local()
         self._context = None
+        self._submissions = gl._submissions
         self._comm = gl._comm
+        self._views = gl._views
+        self._preserve_drawing_buffer = gl._preserve_drawing_buffer
         self._constants = gl._constants
         self._methods = gl._methods
+        self._program_cache = gl._program_cache
+        self._pinned = gl._pinned
+        self._unpin_hooks = gl._unpin_hooks
         self._prev_sent = gl._prev_sent
         self._gl = gl
 
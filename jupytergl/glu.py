@@ -5,10 +5,11 @@ Orignial code covered by Mozilla Public License, version 2.0.
 """
 
 import asyncio
+import hashlib
+import os
 import traceback
 
 import numpy as np
-from numpy.core.umath_tests import inner1d
 
 
 def normalize(v, axis=None):
@@ -49,35 +50,90 @@ def make_shader(gl, source, type):
 async def _ensure_program(gl, vertex_shader_source, fragment_shader_source):
     """Ensure that the shader program status is OK.
 
+    The shaders and program are created, compiled and linked in one
+    message, and their status is returned in a single reply. Info logs are
+    only fetched on failure.
+
     Note: This function is a coroutine, and therefore needs
     to be called with a branched GL context
     """
-    program = gl.createProgram()
-    vertex_shader = await _ensure_shader(gl, vertex_shader_source, gl.VERTEX_SHADER)
-    frag_shader = await _ensure_shader(gl, fragment_shader_source, gl.FRAGMENT_SHADER)
-
+    from .gl import Result
+    vertex_shader, frag_shader, program = Result(0), Result(1), Result(2)
+    results = await gl.query_all([
+        ('createShader', [gl.VERTEX_SHADER]),
+        ('createShader', [gl.FRAGMENT_SHADER]),
+        ('createProgram', []),
+        ('shaderSource', [vertex_shader, vertex_shader_source]),
+        ('compileShader', [vertex_shader]),
+        ('shaderSource', [frag_shader, fragment_shader_source]),
+        ('compileShader', [frag_shader]),
+        ('attachShader', [program, vertex_shader]),
+        ('attachShader', [program, frag_shader]),
+        ('linkProgram', [program]),
+        ('getShaderParameter', [vertex_shader, gl.COMPILE_STATUS]),
+        ('getShaderParameter', [frag_shader, gl.COMPILE_STATUS]),
+        ('getProgramParameter', [program, gl.LINK_STATUS]),
+    ])
+    vertex_shader, frag_shader, program = results[:3]
+    vertex_ok, frag_ok, link_ok = results[-3:]
+    if vertex_ok and frag_ok and link_ok:
+        return program
+
+    failed = [s for s, ok in ((vertex_shader, vertex_ok), (frag_shader, frag_ok))
+              if not ok]
+    if failed:
+        logs = gl.query_all([('getShaderInfoLog', [s]) for s in failed])
+    else:
+        logs = gl.query_all([('getProgramInfoLog', [program])])
+    logs = await logs
     with gl.chunk():
-        gl.attachShader(program, vertex_shader)
-        gl.attachShader(program, frag_shader)
-        gl.linkProgram(program)
-
-    status = gl.getProgramParameter(program, gl.LINK_STATUS)
-    if not await status:
-        log = gl.getProgramInfoLog(program)
+        gl.deleteShader(vertex_shader)
+        gl.deleteShader(frag_shader)
         gl.deleteProgram(program)
-        raise ValueError(
-            'Unable to initialize the shader program: %s' % await log)
-    return await program
+    gl.release(vertex_shader, frag_shader, program)
+    if failed:
+        raise RuntimeError(
+            'An error occurred compiling the shaders: %s' % '\n'.join(logs))
+    raise ValueError(
+        'Unable to initialize the shader program: %s' % logs[0])
+
 
+def _program_key(vertex_shader_source, fragment_shader_source):
+    return hashlib.sha1(
+        ('%s\0%s' % (vertex_shader_source, fragment_shader_source)
+         ).encode('utf-8')).hexdigest()
 
-def make_program(gl, vertex_shader_source, fragment_shader_source):
-    return asyncio.ensure_future(_ensure_program(
-        gl.branch(), vertex_shader_source, fragment_shader_source))
+
+def make_program(gl, vertex_shader_source, fragment_shader_source, cache=True):
+    """Compile and link a shader program, returning a future handle.
+
+    Programs are cached per JupyterGL instance on the hash of their
+    sources, so making the same program again does not cause any traffic.
+    Programs that fail to compile are not cached. To delete a cached
+    program, `release` it after `deleteProgram`, which also drops it from
+    the cache.
+    """
+    if not cache:
+        return asyncio.ensure_future(_ensure_program(
+            gl.branch(), vertex_shader_source, fragment_shader_source))
+    key = _program_key(vertex_shader_source, fragment_shader_source)
+    program = gl._program_cache.get(key)
+    if program is None:
+        program = asyncio.ensure_future(_ensure_program(
+            gl.branch(), vertex_shader_source, fragment_shader_source))
+        gl._program_cache[key] = program
+
+        def uncache_failed(future):
+            if future.cancelled() or future.exception() is not None:
+                if gl._program_cache.get(key) is future:
+                    del gl._program_cache[key]
+        program.add_done_callback(uncache_failed)
+    return program
 
 
 async def _upload_texture(gl, texture_data, gl_type, debug):
     texture = gl.createTexture()
-    w, h, ch = texture_data.shape
+    h, w, ch = texture_data.shape
     gl.bindTexture(gl.TEXTURE_2D, texture)
     if ch == 4:
         await gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGBA, w, h, 0, gl.RGBA,
@@ -101,6 +157,178 @@ def make_texture(gl, texture_data, gl_type, debug=False):
         gl.branch(), texture_data, gl_type, debug))
 
 
+def _next_power_of_two(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+def power_of_two_scale(shape):
+    """The texture coordinate scale of an image padded to power-of-two size.
+
+    Returns (scale_u, scale_v), for an image of shape (h, w[, ch]).
+    """
+    h, w = shape[:2]
+    return w / _next_power_of_two(w), h / _next_power_of_two(h)
+
+
+def pad_to_power_of_two(image):
+    """Pad an image to power-of-two dimensions by repeating its edges.
+
+    WebGL1 requires power-of-two textures for mipmapping. Texture
+    coordinates need to be scaled by `power_of_two_scale(image.shape)`.
+    """
+    h, w = image.shape[:2]
+    pad = [(0, _next_power_of_two(h) - h), (0, _next_power_of_two(w) - w)]
+    pad += [(0, 0)] * (image.ndim - 2)
+    if not any(after for _, after in pad):
+        return image
+    return np.pad(image, pad, 'edge')
+
+
+def _lanczos_weights(a=3):
+    """Filter taps of a Lanczos kernel for decimation by a factor of 2"""
+    # Output sample i is centered between input samples 2i and 2i + 1
+    offsets = np.arange(-2 * a + 1, 2 * a + 1)
+    x = (offsets - 0.5) / 2
+    weights = np.sinc(x) * np.sinc(x / a)
+    return offsets, (weights / weights.sum()).astype(np.float32)
+
+
+def _downsample_axis(image, axis, method):
+    n = image.shape[axis]
+    if n == 1:
+        return image
+    image = np.moveaxis(image, axis, 0)
+    if n % 2:
+        image = np.concatenate([image, image[-1:]])
+    if method == 'box':
+        out = 0.5 * (image[0::2] + image[1::2])
+    else:
+        offsets, weights = _lanczos_weights()
+        before = -offsets[0]
+        after = offsets[-1]
+        padded = np.concatenate(
+            [image[:1]] * before + [image] + [image[-1:]] * after)
+        out = np.zeros_like(image[0::2])
+        for offset, weight in zip(offsets, weights):
+            start = before + offset
+            out += weight * padded[start:start + len(image):2]
+    return np.moveaxis(out, 0, axis)
+
+
+def downsample(image, method='box'):
+    """Halve the size of an image, with a box or Lanczos-3 filter.
+
+    The result is float32, regardless of the input type.
+    """
+    if method not in ('box', 'lanczos'):
+        raise ValueError('Unknown downsampling method: %r' % method)
+    image = np.asarray(image, dtype=np.float32)
+    image = _downsample_axis(image, 0, method)
+    return _downsample_axis(image, 1, method)
+
+
+def make_mipmaps(image, method='box'):
+    """Build the full mip chain of an image, finest level first.
+
+    Levels have the same dtype as the image. Integer images are rounded
+    and clipped to the range of their type.
+    """
+    levels = [image]
+    current = np.asarray(image, dtype=np.float32)
+    while current.shape[0] > 1 or current.shape[1] > 1:
+        current = downsample(current, method)
+        levels.append(_convert_image(current, image.dtype))
+    return levels
+
+
+def _convert_image(image, dtype):
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        image = np.clip(np.rint(image), info.min, info.max)
+    return image.astype(dtype)
+
+
+def _tex_image_2d(gl, level, image, gl_type):
+    h, w, ch = image.shape
+    fmt = gl.RGBA if ch == 4 else gl.RGB
+    # Rows of the small RGB levels are not 4-byte aligned. Restore the
+    # default alignment afterwards, for other uploads.
+    gl.pixelStorei(gl.UNPACK_ALIGNMENT, 1)
+    gl.texImage2D(gl.TEXTURE_2D, level, fmt, w, h, 0, fmt,
+                  gl_type, np.ascontiguousarray(image).reshape(-1))
+    gl.pixelStorei(gl.UNPACK_ALIGNMENT, 4)
+
+
+async def _upload_mipmapped_texture(gl, levels, gl_type, preview_size, debug):
+    """Upload a mip chain, coarse levels first.
+
+    WebGL1 has no base or max level, so until the full chain has arrived,
+    level 0 holds the finest level received so far, sampled without
+    mipmaps. Each level is sent in its own message, so the texture gets
+    sharper as they arrive. The mip levels are then sent coarse to fine,
+    and finally the full resolution level enables mipmapped filtering.
+    Levels below the full resolution are thus sent twice, which adds a
+    third to the data of the full level.
+
+    Note: This function is a coroutine, and therefore needs
+    to be called with a branched GL context
+    """
+    texture = gl.createTexture()
+    preview = next(i for i, level in enumerate(levels)
+                   if max(level.shape[:2]) <= preview_size)
+    with gl.chunk():
+        gl.bindTexture(gl.TEXTURE_2D, texture)
+        _tex_image_2d(gl, 0, levels[preview], gl_type)
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.LINEAR)
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.LINEAR)
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE)
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE)
+        gl.bindTexture(gl.TEXTURE_2D, None)
+    if debug:
+        await check_error(gl)
+    for i in range(preview - 1, 0, -1):
+        await gl._prev_sent
+        with gl.chunk():
+            gl.bindTexture(gl.TEXTURE_2D, texture)
+            _tex_image_2d(gl, 0, levels[i], gl_type)
+            gl.bindTexture(gl.TEXTURE_2D, None)
+    # The mip levels are not sampled before level 0 is complete
+    for i in range(len(levels) - 1, 0, -1):
+        await gl._prev_sent
+        with gl.chunk():
+            gl.bindTexture(gl.TEXTURE_2D, texture)
+            _tex_image_2d(gl, i, levels[i], gl_type)
+            gl.bindTexture(gl.TEXTURE_2D, None)
+    await gl._prev_sent
+    with gl.chunk():
+        gl.bindTexture(gl.TEXTURE_2D, texture)
+        _tex_image_2d(gl, 0, levels[0], gl_type)
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER,
+                         gl.LINEAR_MIPMAP_LINEAR)
+        gl.bindTexture(gl.TEXTURE_2D, None)
+    if debug:
+        await check_error(gl)
+    return await texture
+
+
+def make_mipmapped_texture(gl, texture_data, gl_type, method='box',
+                           preview_size=64, debug=False):
+    """Upload a mipmapped texture progressively, coarsest levels first.
+
+    The mip chain is built on the kernel side with `make_mipmaps`. Images
+    that are not power-of-two sized are padded, as required by WebGL1, so
+    their texture coordinates need to be scaled by `power_of_two_scale`.
+    Returns a future for the texture handle, which resolves once the
+    full resolution level has been sent.
+    """
+    texture_data = np.asarray(texture_data)
+    if texture_data.ndim == 2:
+        texture_data = texture_data[:, :, None].repeat(3, axis=2)
+    levels = make_mipmaps(pad_to_power_of_two(texture_data), method)
+    return asyncio.ensure_future(_upload_mipmapped_texture(
+        gl.branch(), levels, gl_type, preview_size, debug))
+
+
 # gluLookAt
 def make_look_at(ex, ey, ez,
                  cx, cy, cz,
@@ -122,7 +350,7 @@ def make_look_at(ex, ey, ez,
                   [0, 1, 0, -ey],
                   [0, 0, 1, -ez],
                   [0, 0, 0, 1]], dtype=np.float32)
-    return (m * t).T
+    return np.dot(m, t).T
 
 
 # gluPerspective
@@ -192,51 +420,71 @@ def _format_task(task):
 
 def calulate_tangents(vertices, normals, tex_coords, faces):
     """Calculate the tangents for a set of faces"""
-    vertex_count = vertices.shape[0]
-    tangents = np.zeros((vertex_count, 3))
-
-    i1 = faces[:, 0]
-    i2 = faces[:, 1]
-    i3 = faces[:, 2]
-
-    v1 = vertices[i1]
-    v2 = vertices[i2]
-    v3 = vertices[i3]
-
-    w1 = tex_coords[i1]
-    w2 = tex_coords[i2]
-    w3 = tex_coords[i3]
-
-    dv1 = v2 - v1
-    dv2 = v3 - v2
-
-    dw1 = w2 - w1
-    dw2 = w3 - w2
-
-    dw1u = dw1[:, 0]
-    dw1v = dw1[:, 1]
-    dw2u = dw2[:, 0]
-    dw2v = dw2[:, 1]
-
-    r = 1.0 / (dw1u * dw2v - dw1v * dw2u)
-    sdir = ((dw2v * dv1.T - dw1v * dv2.T) * r).T
-
-    tangents[i1] += sdir
-    tangents[i2] += sdir
-    tangents[i3] += sdir
-
-     # Gram-Schmidt orthogonalize
-    tangents[:] = normalize(tangents - (normals.T * inner1d(normals, tangents)).T)
-
-    return tangents
-
-
-def bump_map_to_normal_map(bump_map):
-    gradient = np.gradient(bump_map.astype(np.float) / 255.)
-    z = np.sqrt(1.0 - np.dot(gradient[0] ** 2, gradient[1] ** 2))
-    gradient = np.array(gradient + [z])
-    gradient = (127 * (1.0 + gradient)).astype(np.uint8)
-    return np.rollaxis(gradient, 0, 3)
+    from .geometry import vertex_tangents
+    return vertex_tangents(vertices, normals, tex_coords, faces)
+
+
+def _normal_map_tile(bump_map, out, y0, y1, x0, x1):
+    """Convert one tile of a bump map, using a one pixel halo around it"""
+    h, w = bump_map.shape
+    hy0, hx0 = max(y0 - 1, 0), max(x0 - 1, 0)
+    hy1, hx1 = min(y1 + 1, h), min(x1 + 1, w)
+    tile = bump_map[hy0:hy1, hx0:hx1].astype(np.float32)
+    tile *= 1 / 255.
+    gradient = np.gradient(tile)
+    inner = (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
+    gy, gx = gradient[0][inner], gradient[1][inner]
+    z = 1.0 - gy * gy
+    z -= gx * gx
+    np.sqrt(np.maximum(z, 0, out=z), out=z)
+    for channel, values in enumerate((gy, gx, z)):
+        out[y0:y1, x0:x1, channel] = 127 * (1.0 + values)
+
+
+def bump_map_to_normal_map(bump_map, tile_size=1024, workers=None):
+    """Convert an 8-bit bump (height) map to a normal map.
+
+    The image is processed in float32 tiles with a one pixel halo, so the
+    result is identical to processing it in one go, while memory use is
+    bounded by the tile size. Tiles are processed on a thread pool with
+    `workers` threads (default: one per core).
+    """
+    bump_map = np.asarray(bump_map)
+    h, w = bump_map.shape
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    tiles = [(y0, min(y0 + tile_size, h), x0, min(x0 + tile_size, w))
+             for y0 in range(0, h, tile_size)
+             for x0 in range(0, w, tile_size)]
+    if len(tiles) == 1:
+        _normal_map_tile(bump_map, out, *tiles[0])
+        return out
+    if workers is None:
+        workers = os.cpu_count() or 1
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consume results to propagate any exceptions
+        list(executor.map(
+            lambda tile: _normal_map_tile(bump_map, out, *tile), tiles))
+    return out
+
+
+async def _read_pixels(gl, x, y, width, height):
+    from .gl import Output
+    pixels = await gl.readPixels(x, y, width, height, gl.RGBA,
+                                 gl.UNSIGNED_BYTE, Output((height, width, 4)))
+    # WebGL rows start at the bottom
+    return pixels[::-1]
+
+
+def read_pixels(gl, x, y, width, height):
+    """Read back a block of the framebuffer.
+
+    Returns a future of a (height, width, 4) uint8 image, with the first
+    row at the top. Unless `gl` was created with `preserve_drawing_buffer`,
+    the drawing buffer may have been cleared once it has been displayed.
+    """
+    return asyncio.ensure_future(_read_pixels(
+        gl.branch(), x, y, width, height))
 
 
 def check_error(gl):
@@ -1,9 +1,12 @@
 from tornado.ioloop import IOLoop
 from tornado.platform.asyncio import AsyncIOMainLoop
 import asyncio
+from collections import deque
+from importlib import import_module
 import zmq.asyncio
 import zmq.eventloop
 import ipykernel.kernelapp
+from traitlets import Float, List, Unicode
 
 p = asyncio.get_event_loop_policy()
 
@@ -22,40 +25,176 @@ class ZMQPolicy(p.__class__):
             return zmq.asyncio.ZMQEventLoop()
 
 
-def install_loop():
+def make_loop_policy(name):
+    """Create an event loop policy from its name.
+
+    `name` is one of 'zmq' (pyzmq's ZMQEventLoop), 'asyncio' (the default
+    asyncio loop), 'uvloop', 'auto' (uvloop if installed, else 'zmq'), or
+    the import path of an event loop policy class.
+    """
+    if name == 'auto':
+        try:
+            import_module('uvloop')
+        except ImportError:
+            name = 'zmq'
+        else:
+            name = 'uvloop'
+    if name == 'zmq':
+        return ZMQPolicy()
+    elif name == 'asyncio':
+        return asyncio.DefaultEventLoopPolicy()
+    elif name == 'uvloop':
+        return import_module('uvloop').EventLoopPolicy()
+    module, _, cls = name.rpartition('.')
+    if not module:
+        raise ValueError('Unknown event loop: %r' % name)
+    return getattr(import_module(module), cls)()
+
+
+def install_loop(policy=None):
     """Install and return the global ZMQEventLoop
     registers the loop with asyncio.set_event_loop
+
+    If `policy` is not given, the policy configured on the `AsyncApp`
+    is used.
     """
     # check if tornado's IOLoop is already initialized to something other
     # than the pyzmq IOLoop instance:
     assert (not IOLoop.initialized()) or \
         IOLoop.instance() is AsyncIOMainLoop.instance(), "tornado IOLoop already initialized"
 
-    # First, set asyncio to use ZMQEventLoop (ZMQSelector) as its loop
-    asyncio.set_event_loop_policy(ZMQPolicy())
+    if policy is None:
+        if AsyncApp.initialized():
+            policy = make_loop_policy(AsyncApp.instance().loop)
+        else:
+            policy = ZMQPolicy()
+    # First, set asyncio to use the selected loop
+    asyncio.set_event_loop_policy(policy)
     # Next have tornado work on top of current asyncio loop
     AsyncIOMainLoop().install()
 
 
-ipykernel.kernelapp.zmq_ioloop.install = install_loop
+class LoopMonitor:
+    """Samples the scheduling latency of an event loop.
+
+    Every `interval` seconds a callback is scheduled, and the delay
+    between when it should and when it did run is recorded. The most
+    recent `max_samples` delays are kept.
+    """
+
+    def __init__(self, loop=None, interval=0.1, max_samples=1000):
+        self.loop = asyncio.get_event_loop() if loop is None else loop
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self._handle = None
+
+    def start(self):
+        if self._handle is None:
+            self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        expected = self.loop.time() + self.interval
+        self._handle = self.loop.call_at(expected, self._tick, expected)
+
+    def _tick(self, expected):
+        self.samples.append(self.loop.time() - expected)
+        self._schedule()
+
+    def stats(self):
+        """Return the number, mean and maximum of the sampled lags (s)"""
+        samples = list(self.samples)
+        if not samples:
+            return dict(samples=0, mean=0., max=0.)
+        return dict(samples=len(samples),
+                    mean=sum(samples) / len(samples),
+                    max=max(samples))
 
 
 class AsyncApp(ipykernel.kernelapp.IPKernelApp):
 
     name='asyncio-ipython-kernel'
 
+    loop = Unicode('zmq', config=True,
+        help="""The asyncio event loop to run the kernel on: 'zmq',
+        'asyncio', 'uvloop', 'auto' (uvloop if installed, else zmq), or the
+        import path of an event loop policy class.""")
+
+    loop_monitor_interval = Float(0, config=True,
+        help="""Interval (in seconds) at which to sample the event loop
+        latency, see `loop_stats`. Zero disables the sampling.""")
+
+    preload_modules = List(Unicode(), ['jupytergl.gl'], config=True,
+        help="""Modules to import as soon as the kernel has started, so that
+        the first cell using them does not pay for their import.""")
+
+    bindings_file = Unicode('', config=True,
+        help="""A file of WebGL binding tables written by
+        `jupytergl.gl.save_bindings`, preloaded so that GL calls can be made
+        before the frontend has reported its own.""")
+
+    loop_monitor = None
+
+    def initialize(self, argv=None):
+        # Have the kernel install our event loop (instead of patching
+        # ipykernel whenever this module is imported)
+        ipykernel.kernelapp.zmq_ioloop.install = install_loop
+        super(AsyncApp, self).initialize(argv)
+
+    def preload(self):
+        """Import `preload_modules`, and load the `bindings_file`.
+
+        This is called from the event loop once the kernel has started, so
+        that it does not hold up the kernel becoming ready.
+        """
+        for name in self.preload_modules:
+            try:
+                import_module(name)
+            except Exception:
+                self.log.warning('Could not preload %s', name, exc_info=True)
+        if self.bindings_file:
+            from .gl import load_bindings
+            try:
+                load_bindings(self.bindings_file)
+            except (OSError, ValueError, KeyError):
+                self.log.warning('Could not load the binding tables from %s',
+                                 self.bindings_file, exc_info=True)
+
     def start(self):
         if self.subapp is not None:
             return self.subapp.start()
         if self.poller is not None:
             self.poller.start()
         self.kernel.start()
+        if self.loop_monitor_interval > 0:
+            self.loop_monitor = LoopMonitor(interval=self.loop_monitor_interval)
+            self.loop_monitor.start()
+        IOLoop.instance().add_callback(self.preload)
         try:
             IOLoop.instance().start()
         except KeyboardInterrupt:
             pass
 
 
+def loop_stats():
+    """Return the event loop latency statistics of the running kernel.
+
+    Requires the kernel to be started with a `loop_monitor_interval`.
+    """
+    monitor = AsyncApp.instance().loop_monitor
+    if monitor is None:
+        raise RuntimeError(
+            'The loop monitor is not enabled, set '
+            'AsyncApp.loop_monitor_interval to enable it')
+    stats = monitor.stats()
+    stats['loop'] = type(monitor.loop).__name__
+    return stats
+
+
 def main():
     """Run an IPKernel as an application"""
     app = AsyncApp.instance()
@@ -0,0 +1,121 @@
+"""
+Interleaving of vertex attributes into a single vertex buffer.
+
+Each attribute can be stored as float32, or as a normalized integer type
+to save space (e.g. int8 normals). Attributes are aligned to 4 bytes
+within a vertex, as WebGL requires offsets and strides to be multiples of
+the size of the attribute type.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+#: The WebGL type (as a constant name) of each supported format
+ATTRIBUTE_TYPES = {
+    'float32': 'FLOAT',
+    'int8': 'BYTE',
+    'uint8': 'UNSIGNED_BYTE',
+    'int16': 'SHORT',
+    'uint16': 'UNSIGNED_SHORT',
+}
+
+_ALIGNMENT = 4
+
+VertexAttribute = namedtuple(
+    'VertexAttribute', ('name', 'size', 'type', 'normalized', 'offset'))
+
+
+class VertexLayout:
+    """The layout of the attributes in an interleaved vertex buffer.
+
+    `attributes` is a list of `VertexAttribute`, where `type` is the name
+    of the WebGL type constant (e.g. 'FLOAT'), and `offset` is in bytes
+    from the start of a vertex. `stride` is the size of a vertex in bytes.
+    """
+
+    def __init__(self, attributes, stride):
+        self.attributes = attributes
+        self.stride = stride
+
+    def __getitem__(self, name):
+        for attribute in self.attributes:
+            if attribute.name == name:
+                return attribute
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return any(a.name == name for a in self.attributes)
+
+    def bind(self, gl, locations):
+        """Set up the attribute pointers for the bound vertex buffer.
+
+        `locations` maps attribute names to attribute locations. Attributes
+        without a location are skipped.
+        """
+        for attribute in self.attributes:
+            location = locations.get(attribute.name)
+            if location is None:
+                continue
+            gl.vertexAttribPointer(
+                location, attribute.size, getattr(gl, attribute.type),
+                attribute.normalized, self.stride, attribute.offset)
+            gl.enableVertexAttribArray(location)
+
+
+def _convert(values, data_format):
+    """Convert attribute values to a format, normalizing integer formats"""
+    dtype = np.dtype(data_format)
+    if dtype.kind == 'f':
+        return values.astype(dtype)
+    info = np.iinfo(dtype)
+    lower = -1 if info.min < 0 else 0
+    if values.size and (values.min() < lower or values.max() > 1):
+        raise ValueError(
+            'Values must be within [%d, 1] to be stored as normalized %s' %
+            (lower, data_format))
+    return np.rint(values * info.max).astype(dtype)
+
+
+def interleave_attributes(attributes, formats=None):
+    """Interleave vertex attributes into one buffer.
+
+    `attributes` is a sequence of `(name, values)` pairs, where values is
+    an (N, k) array, or None for an absent attribute, which is left out.
+    `formats` maps names to a key of `ATTRIBUTE_TYPES` (default float32).
+    Returns the buffer as an (N, stride) uint8 array, and its
+    `VertexLayout`.
+    """
+    formats = formats or {}
+    present = []
+    offset = 0
+    for name, values in attributes:
+        if values is None:
+            continue
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, None]
+        data_format = formats.get(name, 'float32')
+        if data_format not in ATTRIBUTE_TYPES:
+            raise ValueError(
+                'Unsupported vertex attribute format: %s' % data_format)
+        converted = _convert(values, data_format)
+        present.append((VertexAttribute(
+            name, values.shape[1], ATTRIBUTE_TYPES[data_format],
+            data_format != 'float32', offset), converted))
+        offset += converted.itemsize * values.shape[1]
+        offset += -offset % _ALIGNMENT
+    if not present:
+        raise ValueError('No vertex attributes to interleave')
+
+    n_vertices = len(present[0][1])
+    data = np.zeros((n_vertices, offset), dtype=np.uint8)
+    for attribute, converted in present:
+        if len(converted) != n_vertices:
+            raise ValueError(
+                'Attribute %s has %d vertices, expected %d' %
+                (attribute.name, len(converted), n_vertices))
+        raw = np.ascontiguousarray(converted).view(np.uint8).reshape(n_vertices, -1)
+        data[:, attribute.offset:attribute.offset + raw.shape[1]] = raw
+    return data, VertexLayout([a for a, _ in present], offset)
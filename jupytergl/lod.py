@@ -0,0 +1,138 @@
+"""
+Level-of-detail generation for meshes, and progressive display of them.
+"""
+
+import asyncio
+
+import numpy as np
+
+from .fileio.wavefront import Mesh
+
+
+def cluster_vertices(mesh, divisions):
+    """Simplify a mesh by vertex clustering.
+
+    The bounding box of the mesh is split into a grid with `divisions`
+    cells along its longest axis, and all vertices within a cell are
+    merged into their mean. Faces that collapse are dropped. A mesh
+    without vertices or faces is returned as is.
+    """
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    if len(vertices) == 0 or len(mesh.faces) == 0:
+        return mesh
+    lower = vertices.min(axis=0)
+    extent = vertices.max(axis=0) - lower
+    cell_size = max(extent.max(), np.finfo(np.float32).tiny) / divisions
+
+    cells = np.floor((vertices - lower) / cell_size).astype(np.int64)
+    cells = np.minimum(cells, divisions - 1)
+    keys = (cells[:, 0] * divisions + cells[:, 1]) * divisions + cells[:, 2]
+    _, cluster = np.unique(keys, return_inverse=True)
+    cluster = cluster.ravel()
+    n_clusters = cluster.max() + 1
+    counts = np.bincount(cluster, minlength=n_clusters)
+
+    def cluster_mean(values):
+        if values is None:
+            return None
+        values = np.asarray(values, dtype=np.float64)
+        mean = np.empty((n_clusters, values.shape[1]), dtype=np.float32)
+        for axis in range(values.shape[1]):
+            mean[:, axis] = np.bincount(
+                cluster, weights=values[:, axis], minlength=n_clusters) / counts
+        return mean
+
+    faces = cluster[mesh.faces]
+    face_materials = mesh.face_materials()
+    keep = ((faces[:, 0] != faces[:, 1]) &
+            (faces[:, 1] != faces[:, 2]) &
+            (faces[:, 2] != faces[:, 0]))
+    faces = faces[keep]
+    face_materials = face_materials[keep]
+    # Several faces can collapse onto the same triangle, only keep one.
+    # Triangles are compared rotated to start at their smallest index, so
+    # that twins of opposite winding (e.g. two-sided features) are kept.
+    start = np.argmin(faces, axis=1)[:, None]
+    rotated = np.take_along_axis(faces, (start + np.arange(3)) % 3, axis=1)
+    _, first = np.unique(rotated, axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+    face_materials = face_materials[np.sort(first)]
+
+    # Drop clusters that are no longer referenced by any face:
+    used = np.zeros(n_clusters, dtype=bool)
+    used[faces] = True
+    remap = np.cumsum(used) - 1
+
+    simplified = Mesh(mesh.name, len(faces), mesh.materials.values())
+    simplified.vertices = cluster_mean(vertices)[used]
+    normals = cluster_mean(mesh.normals)
+    if normals is not None:
+        normals = normals[used]
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals /= np.where(lengths > 0, lengths, 1)
+    simplified.normals = normals
+    texture_coords = cluster_mean(mesh.texture_coords)
+    simplified.texture_coords = (
+        None if texture_coords is None else texture_coords[used])
+    simplified.faces[:] = remap[faces]
+    simplified.sort_by_material(face_materials)
+    return simplified
+
+
+def make_lods(mesh, levels=4, factor=2, min_faces=32):
+    """Create a chain of increasingly coarse versions of a mesh.
+
+    The first entry is the mesh itself. Each following level halves
+    (for the default `factor`) the clustering grid resolution of the
+    previous level, which reduces the face count by roughly `factor ** 2`.
+    The chain stops early once a level has fewer than `min_faces` faces,
+    or when simplification no longer reduces the face count.
+    """
+    lods = [mesh]
+    divisions = max(2, int(np.sqrt(len(mesh.vertices))))
+    for _ in range(levels - 1):
+        divisions = divisions // factor
+        if divisions < 2 or len(lods[-1].faces) < min_faces:
+            break
+        lod = cluster_vertices(mesh, divisions)
+        if len(lod.faces) == 0 or len(lod.faces) >= len(lods[-1].faces):
+            break
+        lods.append(lod)
+    return lods
+
+
+async def _stream_lods(gl, lods, upload, draw, fov, near, far):
+    """Show the coarsest LOD, then replace it by finer ones.
+
+    Note: This function is a coroutine, and therefore needs
+    to be called with a branched GL context
+    """
+    first = True
+    for mesh in reversed(lods):
+        with gl.chunk():
+            upload(gl, mesh)
+        if first:
+            with gl.orbitView(fov, near, far):
+                draw(gl, mesh)
+            first = False
+        else:
+            with gl.updateView():
+                draw(gl, mesh)
+        # Let the level go out before preparing the next (larger) one
+        await gl._prev_sent
+
+
+def stream_lods(gl, lods, upload, draw, fov=None, near=None, far=None):
+    """Display a LOD chain progressively in an orbit view.
+
+    The coarsest level of `lods` (as returned by `make_lods`) is shown
+    immediately, and finer levels are streamed in the background,
+    replacing the buffers as they arrive. The camera is kept between
+    levels.
+
+    `upload(gl, mesh)` should issue the instructions that fill the
+    buffers of a level (e.g. `bufferData` on existing buffer handles),
+    and `draw(gl, mesh)` the instructions that render it.
+    """
+    return asyncio.ensure_future(_stream_lods(
+        gl.branch(), lods, upload, draw, fov, near, far))
@@ -0,0 +1,255 @@
+"""
+Streaming of large point clouds, in spatially coherent, quantized chunks.
+
+The points are sorted along a Z-order (Morton) curve and cut into chunks
+of a bounded number of points, so that each chunk covers a compact region
+of space. The positions of a chunk are quantized to 16 (or 8) bits
+relative to its bounding box, and colors to 8 bits, which the vertex
+shader expands again with normalized attributes.
+"""
+
+import asyncio
+
+import numpy as np
+
+from .codec import quantize_positions
+from .glu import make_program
+from .scene import Scene, Material, Mesh
+
+
+VERTEX_SHADER = """
+attribute vec3 position;
+attribute vec3 color;
+uniform mat4 modelViewMatrix;
+uniform mat4 projectionMatrix;
+uniform vec3 offset;
+uniform vec3 scale;
+uniform float pointSize;
+varying vec3 vColor;
+
+void main() {
+    vColor = color;
+    gl_PointSize = pointSize;
+    gl_Position = projectionMatrix * modelViewMatrix *
+        vec4(offset + position * scale, 1.0);
+}
+"""
+
+FRAGMENT_SHADER = """
+precision mediump float;
+varying vec3 vColor;
+
+void main() {
+    gl_FragColor = vec4(vColor, 1.0);
+}
+"""
+
+
+def _spread_bits(v):
+    """Spread the lower 21 bits of v, two zero bits between each bit"""
+    v = v.astype(np.uint64) & np.uint64(0x1fffff)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_codes(positions, block_size=1 << 20):
+    """Return the 63 bit Z-order codes of positions within their bounds.
+
+    The positions are converted in blocks of `block_size` points, so that
+    the temporary arrays stay small for clouds of many millions of points
+    (e.g. memory mapped ones).
+    """
+    positions = np.asarray(positions)
+    lower = positions.min(axis=0).astype(np.float64)
+    extent = positions.max(axis=0) - lower
+    extent[extent == 0] = 1
+    factor = (2 ** 21 - 1) / extent
+    codes = np.empty(len(positions), dtype=np.uint64)
+    for start in range(0, len(positions), block_size):
+        stop = start + block_size
+        cells = ((positions[start:stop] - lower) * factor).astype(np.uint32)
+        codes[start:stop] = (_spread_bits(cells[:, 0]) |
+                             _spread_bits(cells[:, 1]) << np.uint64(1) |
+                             _spread_bits(cells[:, 2]) << np.uint64(2))
+    return codes
+
+
+class PointChunk:
+    """A quantized chunk of a point cloud.
+
+    `positions` are unsigned integers (N, 3), that map back to space with
+    `offset + positions / max_value * scale`. `colors` are uint8 (N, 3),
+    or None.
+    """
+
+    def __init__(self, positions, colors, offset, scale):
+        self.positions = positions
+        self.colors = colors
+        self.offset = offset
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + (
+            self.colors.nbytes if self.colors is not None else 0)
+
+
+def quantize_colors(colors):
+    """Convert colors (floats in [0, 1], or integers) to uint8"""
+    colors = np.asarray(colors)
+    if colors.dtype == np.uint8:
+        return np.ascontiguousarray(colors[:, :3])
+    if colors.dtype.kind in 'ui':
+        shift = 8 * colors.dtype.itemsize - 8
+        return (colors[:, :3] >> shift).astype(np.uint8)
+    return np.rint(np.clip(colors[:, :3], 0, 1) * 255).astype(np.uint8)
+
+
+class PointCloud:
+    """A point cloud, partitioned into spatially coherent chunks.
+
+    `positions` is a (N, 3) array, and `colors` an optional (N, 3) array of
+    float colors in [0, 1] or integer colors. Chunks have at most
+    `max_points` points, and are quantized on demand with `bits` bits per
+    coordinate.
+    """
+
+    def __init__(self, positions, colors=None, max_points=65536, bits=16):
+        if bits not in (8, 16):
+            raise ValueError('Positions can only be quantized to 8 or 16 bits')
+        self.positions = positions
+        self.colors = colors
+        self.bits = bits
+        self.order = np.argsort(morton_codes(positions), kind='stable')
+        self.bounds = np.arange(0, len(self.order) + max_points, max_points)
+        self.bounds[-1] = len(self.order)
+        self.bounds = np.unique(self.bounds)
+        # Bounds of each chunk, without a sorted copy of all points
+        positions = np.asarray(positions)
+        self.lower = np.empty((len(self), 3), dtype=positions.dtype)
+        self.upper = np.empty((len(self), 3), dtype=positions.dtype)
+        for i in range(len(self)):
+            chunk = positions[self.order[self.bounds[i]:self.bounds[i + 1]]]
+            self.lower[i] = chunk.min(axis=0)
+            self.upper[i] = chunk.max(axis=0)
+
+    def __len__(self):
+        return len(self.bounds) - 1
+
+    def chunk(self, index):
+        """Return the quantized `PointChunk` of a given index"""
+        indices = self.order[self.bounds[index]:self.bounds[index + 1]]
+        positions, offset, scale = quantize_positions(
+            np.asarray(self.positions)[indices], self.bits)
+        colors = None
+        if self.colors is not None:
+            colors = quantize_colors(np.asarray(self.colors)[indices])
+        return PointChunk(positions, colors, offset, scale)
+
+    def priority(self, camera_position):
+        """Return the chunk indices, ordered by distance to the camera.
+
+        The distance is measured to the bounding box of each chunk, so the
+        chunk containing the camera comes first.
+        """
+        camera_position = np.asarray(camera_position, dtype=np.float64)
+        nearest = np.clip(camera_position, self.lower, self.upper)
+        distance = np.linalg.norm(nearest - camera_position, axis=1)
+        return np.argsort(distance, kind='stable')
+
+
+async def _stream_points(gl, cloud, camera_position, bytes_per_frame,
+                         point_size, fov, near, far):
+    """Upload the chunks of a point cloud in priority order.
+
+    Note: This function is a coroutine, and therefore needs
+    to be called with a branched GL context
+    """
+    program = await make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+    (position_location, color_location, offset_location, scale_location,
+     size_location) = await gl.query_all([
+        ('getAttribLocation', (program, 'position')),
+        ('getAttribLocation', (program, 'color')),
+        ('getUniformLocation', (program, 'offset')),
+        ('getUniformLocation', (program, 'scale')),
+        ('getUniformLocation', (program, 'pointSize')),
+    ])
+    position_type = gl.UNSIGNED_BYTE if cloud.bits == 8 else gl.UNSIGNED_SHORT
+
+    # The orbit view looks up its matrix uniforms in the current program
+    gl.useProgram(program)
+    with gl.orbitView(fov, near, far):
+        gl.useProgram(program)
+    scene = Scene(gl)
+    material = scene.add(Material(
+        program, {size_location: ('uniform1f', (point_size,))}))
+
+    def make_draw(chunk, position_buffer, color_buffer):
+        def draw(gl):
+            gl.bindBuffer(gl.ARRAY_BUFFER, position_buffer)
+            gl.vertexAttribPointer(
+                position_location, 3, position_type, True, 0, 0)
+            gl.enableVertexAttribArray(position_location)
+            if color_buffer is None:
+                gl.disableVertexAttribArray(color_location)
+                gl.vertexAttrib3f(color_location, 1., 1., 1.)
+            else:
+                gl.bindBuffer(gl.ARRAY_BUFFER, color_buffer)
+                gl.vertexAttribPointer(
+                    color_location, 3, gl.UNSIGNED_BYTE, True, 0, 0)
+                gl.enableVertexAttribArray(color_location)
+            gl.uniform3f(offset_location, *chunk.offset.tolist())
+            gl.uniform3f(scale_location, *chunk.scale.tolist())
+            gl.drawArrays(gl.POINTS, 0, len(chunk))
+        return draw
+
+    pending = (cloud.chunk(i) for i in cloud.priority(camera_position))
+    chunk = next(pending, None)
+    while chunk is not None:
+        # Take chunks until the frame budget is used (at least one chunk)
+        frame = []
+        frame_bytes = 0
+        while chunk is not None:
+            if frame and frame_bytes + chunk.nbytes > bytes_per_frame:
+                break
+            frame.append(chunk)
+            frame_bytes += chunk.nbytes
+            chunk = next(pending, None)
+        n_buffers = sum(1 if c.colors is None else 2 for c in frame)
+        handles = iter(await gl.query_all([('createBuffer', ())] * n_buffers))
+        with gl.chunk():
+            for queued in frame:
+                position_buffer = next(handles)
+                gl.bindBuffer(gl.ARRAY_BUFFER, position_buffer)
+                gl.bufferData(gl.ARRAY_BUFFER, queued.positions, gl.STATIC_DRAW)
+                color_buffer = None
+                if queued.colors is not None:
+                    color_buffer = next(handles)
+                    gl.bindBuffer(gl.ARRAY_BUFFER, color_buffer)
+                    gl.bufferData(gl.ARRAY_BUFFER, queued.colors, gl.STATIC_DRAW)
+                material.add(Mesh(make_draw(queued, position_buffer, color_buffer)))
+        # The acknowledgement of the update paces the frames
+        await scene.update()
+    return scene
+
+
+def stream_points(gl, cloud, camera_position=(0, 0, 20), bytes_per_frame=4 << 20,
+                  point_size=1., fov=None, near=None, far=None):
+    """Display a point cloud in an orbit view, streaming it in chunks.
+
+    `cloud` is a `PointCloud`. Chunks are uploaded nearest to
+    `camera_position` first (by default the initial camera of the orbit
+    view), with at most `bytes_per_frame` of point data sent before
+    waiting for the frontend to display what it has. Returns a future of
+    the `Scene` holding the chunks.
+    """
+    return asyncio.ensure_future(_stream_points(
+        gl.branch(), cloud, camera_position, bytes_per_frame, point_size,
+        fov, near, far))
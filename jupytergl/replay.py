@@ -0,0 +1,306 @@
+"""
+Capture of comm traffic to session files, and replay of them for
+performance regression testing.
+
+Record a session with::
+
+    recorder = gl.record(SessionRecorder('session.jgls'))
+    ...
+    gl.stop_recording(recorder).close()
+
+and replay it through the current code with::
+
+    python -m jupytergl.replay session.jgls [--realtime]
+"""
+
+import asyncio
+import json
+import struct
+import sys
+import time
+
+import numpy as np
+
+from .codec import EncodedArray
+from .comm import QueryableComm
+from .gl import Instruction, JupyterGL, Output, Result
+
+
+MAGIC = b'JGLS'
+VERSION = 1
+
+_FILE_HEADER = struct.Struct('<4sI')
+_FRAME_HEADER = struct.Struct('<I')
+
+
+class SessionRecorder:
+    """Writes every message sent and received on a comm to a session file.
+
+    Each message is stored with its metadata, binary buffers and a
+    timestamp relative to the start of the recording.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'wb')
+        self._file.write(_FILE_HEADER.pack(MAGIC, VERSION))
+        self._start = time.perf_counter()
+
+    def _write(self, direction, data, metadata, buffers):
+        buffers = [memoryview(b).cast('B') for b in buffers or []]
+        header = json.dumps(dict(
+            time=time.perf_counter() - self._start,
+            direction=direction,
+            data=data,
+            metadata=metadata or {},
+            buffers=[len(b) for b in buffers],
+        ), separators=(',', ':')).encode('utf-8')
+        self._file.write(_FRAME_HEADER.pack(len(header)))
+        self._file.write(header)
+        for buffer in buffers:
+            self._file.write(buffer)
+
+    def sent(self, data, metadata, buffers):
+        self._write('sent', data, metadata, buffers)
+
+    def received(self, message):
+        self._write('received', message['content'].get('data'),
+                    message.get('metadata'), message.get('buffers'))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_session(filename):
+    """Read a session file as a list of message dicts.
+
+    Each message has the keys `time`, `direction` ('sent' or
+    'received'), `data`, `metadata` and `buffers`.
+    """
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    magic, version = _FILE_HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError('Not a JupyterGL session file: %s' % filename)
+    if version != VERSION:
+        raise ValueError('Unsupported session file version: %s' % version)
+    view = memoryview(raw)
+    offset = _FILE_HEADER.size
+    messages = []
+    while offset < len(raw):
+        [length] = _FRAME_HEADER.unpack_from(raw, offset)
+        offset += _FRAME_HEADER.size
+        message = json.loads(bytes(view[offset:offset + length]).decode('utf-8'))
+        offset += length
+        buffers = []
+        for size in message['buffers']:
+            buffers.append(view[offset:offset + size])
+            offset += size
+        message['buffers'] = buffers
+        messages.append(message)
+    return messages
+
+
+class LoopbackComm(QueryableComm):
+    """A stand-in for a frontend, replying with the recorded replies.
+
+    Sent messages are JSON encoded to UTF-8 (as the kernel session would)
+    and counted in bytes, and queries are answered with the recorded
+    replies in order. Queries beyond the recorded replies are not answered, and counted in
+    `missing_replies`.
+    """
+
+    def __init__(self, session):
+        super(LoopbackComm, self).__init__(
+            target_name='jupytergl', kernel=None, primary=False)
+        self._replies = [m for m in session if m['direction'] == 'received' and
+                         m['data'] and m['data'].get('type') in
+                         ('queryReply', 'queryError')]
+        self._inspect_replies = {
+            m['data']['type']: m for m in session
+            if m['direction'] == 'received' and m['data'] and
+            m['data'].get('type') in ('constantsReply', 'methodsReply')}
+        self.n_messages = 0
+        self.n_bytes = 0
+        self.missing_replies = 0
+        self.reply_times = {}
+
+    @property
+    def connected(self):
+        return True
+
+    def send(self, data=None, metadata=None, buffers=None):
+        self.send_packed(data, self.pack(data), metadata, buffers)
+
+    def send_packed(self, data, packed, metadata=None, buffers=None):
+        self.n_messages += 1
+        self.n_bytes += len(packed)
+        self.n_bytes += sum(memoryview(b).nbytes for b in buffers or [])
+        msg_type = data.get('type')
+        if msg_type in ('query', 'queryAll', 'sceneUpdate'):
+            if not self._replies:
+                # E.g. the capture started or stopped mid-session. Such
+                # queries are left unanswered, and counted.
+                self.missing_replies += 1
+                return
+            reply = self._replies.pop(0)
+            self._reply(reply['data'], metadata, reply['buffers'])
+        elif msg_type in ('getConstants', 'getMethods'):
+            reply_type = 'constantsReply' if msg_type == 'getConstants' else 'methodsReply'
+            reply = self._inspect_replies.get(reply_type)
+            if reply is not None:
+                self._reply(reply['data'], metadata)
+
+    def _reply(self, data, metadata, buffers=None):
+        message = dict(content=dict(data=data), metadata=metadata or {},
+                       buffers=buffers or [])
+        asyncio.get_event_loop().call_soon(self.handle_msg, message)
+
+    def handle_msg(self, message):
+        cmd_id = message['metadata'].get('cmd_id')
+        if cmd_id is not None:
+            self.reply_times[cmd_id] = time.perf_counter()
+        return super(LoopbackComm, self).handle_msg(message)
+
+    def close(self, *args, **kwargs):
+        pass
+
+
+def _rebuild_instructions(instructions, buffers):
+    """Turn serialized instructions back into instructions with arrays"""
+    buffers = list(buffers)
+    rebuilt = []
+    for instruction in instructions:
+        args = []
+        for arg in instruction['args']:
+            if isinstance(arg, str) and arg.startswith('buffer'):
+                arg = np.frombuffer(buffers.pop(0), dtype=arg[len('buffer'):])
+            elif isinstance(arg, dict) and 'alloc' in arg:
+                arg = Output(arg['length'], arg['alloc'])
+            elif isinstance(arg, dict) and 'result' in arg:
+                arg = Result(arg['result'])
+            elif isinstance(arg, dict) and 'decode' in arg:
+                params = dict(arg)
+                data = params.pop('data')
+                arg = EncodedArray(
+                    params.pop('decode'),
+                    np.frombuffer(buffers.pop(0), dtype=data[len('buffer'):]),
+                    **params)
+            args.append(arg)
+        rebuilt.append(Instruction(instruction['op'], args))
+    return rebuilt
+
+
+async def replay_session(session, realtime=False):
+    """Replay the sent messages of a session through the current code.
+
+    The messages are pushed through a `JupyterGL` connected to a
+    `LoopbackComm`, either as fast as possible, or with the recorded
+    timing if `realtime` is true. Returns a dict of statistics.
+    """
+    comm = LoopbackComm(session)
+    gl = JupyterGL(comm=comm)
+    submit_times = {}
+    start = time.perf_counter()
+    for message in session:
+        data = message['data']
+        if message['direction'] != 'sent' or not data:
+            continue
+        if realtime:
+            delay = message['time'] - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        msg_type = data.get('type')
+        if msg_type in ('exec', 'query', 'queryAll'):
+            instructions = _rebuild_instructions(
+                data['instructions'], message['buffers'])
+            # Keep the parts of chunks, including empty last parts
+            cmd_id = gl._send_instructions(
+                instructions, msg_type, more=data.get('more', False),
+                chunk=data.get('chunk'))
+            if msg_type != 'exec':
+                submit_times[cmd_id] = time.perf_counter()
+                comm.future_query_reply(cmd_id)
+        elif msg_type == 'command':
+            command = data['command']
+            gl._send_command(command['op'], command['args'],
+                             _rebuild_instructions(command['instructions'],
+                                                   message['buffers']))
+        elif msg_type == 'release':
+            gl.release(*data['keys'])
+        elif msg_type == 'sceneUpdate':
+            cmd_id = gl._next_cmd_id()
+            await gl._prev_sent
+            submit_times[cmd_id] = time.perf_counter()
+            comm.future_query_reply(cmd_id)
+            gl._send(data, dict(cmd_id=cmd_id), message['buffers'])
+    await gl._prev_sent
+    # Let the last replies be delivered
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([comm.reply_times[cmd_id] - t
+                          for cmd_id, t in submit_times.items()
+                          if cmd_id in comm.reply_times])
+    stats = dict(
+        messages=comm.n_messages,
+        bytes=comm.n_bytes,
+        seconds=elapsed,
+        messages_per_second=comm.n_messages / elapsed if elapsed else 0.,
+        bytes_per_second=comm.n_bytes / elapsed if elapsed else 0.,
+        queries=len(latencies),
+        missing_replies=comm.missing_replies,
+    )
+    if len(latencies):
+        stats.update(
+            latency_mean=latencies.mean(),
+            latency_p50=np.percentile(latencies, 50),
+            latency_p95=np.percentile(latencies, 95),
+            latency_max=latencies.max(),
+        )
+    return stats
+
+
+def format_stats(stats):
+    lines = [
+        'Messages:   %d' % stats['messages'],
+        'Bytes:      %d' % stats['bytes'],
+        'Time:       %.3f s' % stats['seconds'],
+        'Throughput: %.1f msg/s, %.2f MB/s' % (
+            stats['messages_per_second'], stats['bytes_per_second'] / 1e6),
+    ]
+    if stats['missing_replies']:
+        lines.append('Unanswered: %d queries had no recorded reply' %
+                     stats['missing_replies'])
+    if stats['queries']:
+        lines.append(
+            'Query latency (%d): mean %.3f ms, p50 %.3f ms, p95 %.3f ms, '
+            'max %.3f ms' % (
+                stats['queries'], 1e3 * stats['latency_mean'],
+                1e3 * stats['latency_p50'], 1e3 * stats['latency_p95'],
+                1e3 * stats['latency_max']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m jupytergl.replay',
+        description="Replay a recorded JupyterGL session, and report the "
+                    "throughput and latency of the current code.")
+    parser.add_argument('session', help="The session file to replay")
+    parser.add_argument('--realtime', action='store_true',
+        help="Replay with the recorded timing instead of at maximum speed")
+    opts = parser.parse_args(argv)
+    session = read_session(opts.session)
+    stats = asyncio.run(replay_session(session, realtime=opts.realtime))
+    print(format_stats(stats))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,244 @@
+"""
+Tracking of GPU resources (buffers, textures and programs).
+"""
+
+from asyncio import get_event_loop
+from collections import OrderedDict
+import weakref
+
+import numpy as np
+
+from .glu import make_program, make_texture
+
+
+class _Entry:
+    """Book-keeping for a resource. Does not reference its owners."""
+
+    def __init__(self, kind, nbytes, upload, delete, evictable):
+        self.kind = kind
+        self.nbytes = nbytes
+        self.upload = upload
+        self.delete = delete
+        self.evictable = evictable
+        self.handle = None
+        self.refs = 0
+
+
+class Resource:
+    """A handle to a GPU resource managed by a `ResourceManager`.
+
+    Pass `manager.use(resource)` to GL calls, rather than `handle`, so
+    that the manager knows that the resource is in use, and can re-upload
+    it if it has been evicted.
+    """
+
+    def __init__(self, manager, key):
+        self._manager = manager
+        self._key = key
+
+    @property
+    def kind(self):
+        return self._manager._entries[self._key].kind
+
+    @property
+    def nbytes(self):
+        """The estimated GPU memory used by the resource"""
+        return self._manager._entries[self._key].nbytes
+
+    @property
+    def handle(self):
+        """The current handle, or None if the resource is not uploaded"""
+        entry = self._manager._entries.get(self._key)
+        return None if entry is None else entry.handle
+
+    @property
+    def resident(self):
+        return self.handle is not None
+
+
+class ResourceManager:
+    """Create, track and delete GPU resources of a JupyterGL instance.
+
+    Every resource is reference counted by its owners: by default the
+    returned `Resource` object itself, else the objects passed as
+    `owner` (or later to `retain`). Once all owners are garbage collected,
+    the GPU resource is deleted.
+
+    If `budget` (in bytes) is given, the least recently used buffers and
+    textures are evicted from the GPU when the estimated total exceeds it,
+    and transparently re-uploaded the next time they are used. To be able
+    to do so, the manager keeps a reference to their data.
+
+    Resources used by instructions that the frontend keeps (those of the
+    view, a scene or an animation) are never evicted. If their owners go
+    away, they are deleted once no longer used by such instructions.
+    """
+
+    def __init__(self, gl, budget=None):
+        self.gl = gl
+        self.budget = budget
+        self._entries = OrderedDict()  # In LRU order, most recent last
+        self._next_key = 0
+        self._loop = get_event_loop()
+        # Keys of resources without owners, still used by the frontend
+        self._orphans = set()
+        gl._unpin_hooks.append(weakref.WeakMethod(self._delete_orphans))
+
+    @property
+    def total_bytes(self):
+        """The estimated GPU memory of all resident resources"""
+        return sum(e.nbytes for e in self._entries.values()
+                   if e.handle is not None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def create_buffer(self, data, target=None, usage=None, owner=None):
+        """Create a buffer filled with `data`"""
+        gl = self.gl
+        data = np.ascontiguousarray(data)
+        target = gl.ARRAY_BUFFER if target is None else target
+        usage = gl.STATIC_DRAW if usage is None else usage
+
+        def upload():
+            buffer = gl.createBuffer()
+            with gl.chunk():
+                gl.bindBuffer(target, buffer)
+                gl.bufferData(target, data, usage)
+            return buffer
+
+        return self._add('buffer', data.nbytes, upload, 'deleteBuffer',
+                         True, owner)
+
+    def create_texture(self, texture_data, gl_type=None, owner=None):
+        """Create a 2D texture from an image array of shape (h, w, ch)"""
+        gl = self.gl
+        gl_type = gl.UNSIGNED_BYTE if gl_type is None else gl_type
+        texture_data = np.ascontiguousarray(texture_data)
+        h, w = texture_data.shape[:2]
+        # Drivers typically store RGB textures padded to RGBA
+        nbytes = h * w * 4 * texture_data.itemsize
+
+        def upload():
+            return make_texture(gl, texture_data, gl_type)
+
+        return self._add('texture', nbytes, upload, 'deleteTexture',
+                         True, owner)
+
+    def create_program(self, vertex_shader_source, fragment_shader_source,
+                       owner=None):
+        """Create a linked shader program. Programs are never evicted."""
+        gl = self.gl
+
+        def upload():
+            # Bypass the program cache, as the program can be deleted
+            return make_program(
+                gl, vertex_shader_source, fragment_shader_source, cache=False)
+
+        return self._add('program', 0, upload, 'deleteProgram',
+                         False, owner)
+
+    def retain(self, resource, owner):
+        """Keep the resource alive for as long as `owner` is alive"""
+        entry = self._entries[resource._key]
+        entry.refs += 1
+        finalizer = weakref.finalize(
+            owner, self._loop.call_soon_threadsafe,
+            self._release_ref, resource._key)
+        finalizer.atexit = False
+
+    def use(self, resource):
+        """Mark a resource as used, and return its current handle.
+
+        Evicted resources are uploaded again.
+        """
+        key = resource._key
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        if entry.handle is None:
+            entry.handle = entry.upload()
+            self._enforce_budget(keep=key)
+        return entry.handle
+
+    def delete(self, resource):
+        """Delete a resource immediately, regardless of its owners"""
+        entry = self._entries.get(resource._key)
+        if entry is None:
+            return
+        self._check_unpinned(entry)
+        del self._entries[resource._key]
+        self._orphans.discard(resource._key)
+        self._delete_handle(entry)
+
+    def evict(self, resource):
+        """Delete the GPU copy of a resource, keeping it for re-upload"""
+        entry = self._entries[resource._key]
+        if not entry.evictable:
+            raise ValueError('Resources of kind %r cannot be evicted' %
+                             entry.kind)
+        self._check_unpinned(entry)
+        self._delete_handle(entry)
+
+    def _pinned(self, entry):
+        return entry.handle is not None and self.gl._is_pinned(entry.handle)
+
+    def _check_unpinned(self, entry):
+        if self._pinned(entry):
+            raise ValueError(
+                'The %s is still used by the view, a scene or an animation'
+                % entry.kind)
+
+    def _add(self, kind, nbytes, upload, delete, evictable, owner):
+        key = self._next_key
+        self._next_key += 1
+        entry = _Entry(kind, nbytes, upload, delete, evictable)
+        self._entries[key] = entry
+        resource = Resource(self, key)
+        self.retain(resource, resource if owner is None else owner)
+        self.use(resource)
+        return resource
+
+    def _release_ref(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.refs -= 1
+        if entry.refs <= 0:
+            if self._pinned(entry):
+                self._orphans.add(key)
+                return
+            del self._entries[key]
+            self._delete_handle(entry)
+
+    def _delete_orphans(self):
+        """Delete the resources without owners that are no longer pinned"""
+        if not self._orphans:
+            return
+        for key in list(self._orphans):
+            entry = self._entries[key]
+            if not self._pinned(entry):
+                self._orphans.discard(key)
+                del self._entries[key]
+                self._delete_handle(entry)
+
+    def _delete_handle(self, entry):
+        handle = entry.handle
+        if handle is None:
+            return
+        entry.handle = None
+        with self.gl.chunk():
+            getattr(self.gl, entry.delete)(handle)
+        self.gl.release(handle)
+
+    def _enforce_budget(self, keep=None):
+        if self.budget is None:
+            return
+        total = self.total_bytes
+        for key, entry in list(self._entries.items()):
+            if total <= self.budget:
+                break
+            if (key == keep or not entry.evictable or entry.handle is None or
+                    self._pinned(entry)):
+                continue
+            total -= entry.nbytes
+            self._delete_handle(entry)
@@ -0,0 +1,400 @@
+"""
+A retained scene graph, kept in sync with the frontend by sending deltas.
+
+The instructions of a scene are split into small named slots (e.g. the
+model matrix of a mesh, or its draw calls), which the frontend keeps and
+renders in order every frame. When the graph changes, only the slots
+whose instructions differ from what the frontend has are sent, so that
+moving one object of a large scene sends a single matrix.
+
+Matrices are laid out as returned by the functions in `glu` (i.e.
+transposed, ready to be passed to `uniformMatrix4fv`).
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import itertools
+
+import numpy as np
+
+from .gl import ChunkContext
+
+
+_node_ids = itertools.count(1)
+
+_identity = np.eye(4, dtype=np.float32)
+
+
+def _fingerprint(instructions):
+    """A hashable summary of instructions, to detect changed slots"""
+    summary = []
+    for instruction in instructions:
+        args = []
+        for a in instruction.args:
+            if isinstance(a, (np.ndarray, np.generic)):
+                a = np.ascontiguousarray(a).reshape(-1)
+                a = ('buffer', a.dtype.str,
+                     hashlib.sha1(a.view(np.uint8)).digest())
+            elif isinstance(a, (list, dict)):
+                a = repr(a)
+            args.append(a)
+        summary.append((instruction.name, tuple(args)))
+    return tuple(summary)
+
+
+def _ancestors(node):
+    node = node.parent
+    while node is not None:
+        yield node
+        node = node.parent
+
+
+class Node:
+    """A node of a scene graph, with child nodes.
+
+    Plain nodes only group their children. Subclasses emit instructions
+    into slots through `_slots`.
+    """
+
+    def __init__(self):
+        self.key = 'n%d' % next(_node_ids)
+        self.parent = None
+        self.children = []
+        self._scene = None
+
+    def add(self, *children):
+        """Add child nodes, and return the last one"""
+        for child in children:
+            if child.parent is not None:
+                raise ValueError('Node %s already has a parent' % child.key)
+            child.parent = self
+            self.children.append(child)
+            if self._scene is not None:
+                self._scene._attach(child)
+        return child
+
+    def remove(self, child):
+        self.children.remove(child)
+        child.parent = None
+        if self._scene is not None:
+            self._scene._detach(child)
+
+    def walk(self):
+        """Iterate over this node and all its descendants, depth first"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def invalidate(self):
+        """Mark the slots of the node as changed"""
+        if self._scene is not None:
+            self._scene._dirty.add(self)
+
+    @property
+    def world_matrix(self):
+        """The combined matrix of all `Transform` ancestors"""
+        node = self.parent
+        while node is not None and not isinstance(node, Transform):
+            node = node.parent
+        if node is None:
+            return _identity
+        return node.world_matrix
+
+    def _model_location(self):
+        """The uniform location of the model matrix for this node"""
+        node = self.parent
+        while node is not None:
+            if isinstance(node, Material) and node.model_location is not None:
+                return node.model_location
+            node = node.parent
+        return self._scene.model_location if self._scene else None
+
+    def _slots(self):
+        """Return a list of (name, emit) pairs for the slots of the node.
+
+        `emit(gl)` issues the instructions of the slot, and is called
+        within a chunk. The slots are rendered before those of the
+        children.
+        """
+        return []
+
+
+class Transform(Node):
+    """A node that transforms all its descendants by `matrix`"""
+
+    def __init__(self, matrix=None):
+        super(Transform, self).__init__()
+        self._matrix = _identity if matrix is None else np.asarray(matrix, np.float32)
+
+    @property
+    def matrix(self):
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, value):
+        self._matrix = np.asarray(value, np.float32)
+        # The model matrices of all descendants change:
+        if self._scene is not None:
+            self._scene._dirty.update(self.walk())
+
+    @property
+    def world_matrix(self):
+        return np.dot(self._matrix, super(Transform, self).world_matrix)
+
+
+class Material(Node):
+    """A node that sets up the program, textures and uniforms to draw its
+    descendants with.
+
+    `uniforms` maps uniform locations to `(method, args)` pairs, e.g.
+    `{location: ('uniform3f', (1., 0., 0.))}`, and `textures` maps texture
+    units to 2D textures. If the program uses another model matrix
+    uniform than the scene, give its location as `model_location`.
+    """
+
+    def __init__(self, program, uniforms=None, textures=None, model_location=None):
+        super(Material, self).__init__()
+        self.program = program
+        self.uniforms = dict(uniforms or {})
+        self.textures = dict(textures or {})
+        self.model_location = model_location
+
+    def set_uniform(self, location, method, *args):
+        self.uniforms[location] = (method, args)
+        self.invalidate()
+
+    def set_texture(self, unit, texture):
+        self.textures[unit] = texture
+        self.invalidate()
+
+    def _slots(self):
+        def emit(gl):
+            gl.useProgram(self.program)
+            for unit, texture in self.textures.items():
+                gl.activeTexture(gl.TEXTURE0 + unit)
+                gl.bindTexture(gl.TEXTURE_2D, texture)
+            for location, (method, args) in self.uniforms.items():
+                getattr(gl, method)(location, *args)
+        return [('material', emit)]
+
+
+class Uniform(Node):
+    """A node that sets a single uniform, e.g. `Uniform(loc, 'uniform1f', 0.5)`"""
+
+    def __init__(self, location, method, *args):
+        super(Uniform, self).__init__()
+        self.location = location
+        self.method = method
+        self.args = args
+
+    def set(self, *args):
+        self.args = args
+        self.invalidate()
+
+    def _slots(self):
+        def emit(gl):
+            getattr(gl, self.method)(self.location, *self.args)
+        return [('uniform', emit)]
+
+
+class Mesh(Transform):
+    """A node that draws a mesh.
+
+    `draw(gl)` should issue the instructions that bind the buffers of
+    the mesh and draw it. If a model matrix location is set (on the scene
+    or the material), the world matrix of the mesh is set before drawing.
+    """
+
+    def __init__(self, draw, matrix=None):
+        super(Mesh, self).__init__(matrix)
+        self._draw = draw
+
+    @property
+    def draw(self):
+        return self._draw
+
+    @draw.setter
+    def draw(self, value):
+        self._draw = value
+        self.invalidate()
+
+    def _slots(self):
+        slots = []
+        location = self._model_location()
+        if location is not None:
+            def emit_model(gl):
+                gl.uniformMatrix4fv(location, False, self.world_matrix)
+            slots.append(('model', emit_model))
+        slots.append(('draw', self._draw))
+        return slots
+
+
+class Scene:
+    """The root of a scene graph displayed by a frontend.
+
+    Change the graph freely, and call `update` to send the changes. The
+    scene remembers the state of the slots acknowledged by the frontend,
+    and only sends the slots that differ from it (or from updates still
+    in flight). Slots are rendered in depth first order after the
+    instructions of the current view, if any.
+
+    Nodes added at the end of that order (e.g. as last children of the
+    last nodes) only append their slots to the order of the frontend, so
+    that a scene can be grown incrementally without resending its order.
+    """
+
+    def __init__(self, gl, model_location=None):
+        self.gl = gl
+        self.model_location = model_location
+        self.root = Node()
+        self.root._scene = self
+        self._dirty = set()
+        self._structure_changed = True
+        # Fingerprints of the slots, as the frontend will have them once
+        # all sent updates arrive, and as acknowledged by it:
+        self._state = {}
+        self._acked = {}
+        self._order = []
+        # Nodes added at the end of the order since the last update
+        self._appended = []
+
+    def add(self, *nodes):
+        return self.root.add(*nodes)
+
+    def remove(self, node):
+        self.root.remove(node)
+
+    def _attach(self, node):
+        for n in node.walk():
+            n._scene = self
+            self._dirty.add(n)
+        if self._structure_changed or not self._is_last(node):
+            self._structure_changed = True
+        else:
+            self._appended.append(node)
+
+    def _is_last(self, node):
+        """Whether a node comes last in the depth first order"""
+        while node.parent is not None:
+            if node.parent.children[-1] is not node:
+                return False
+            node = node.parent
+        return node is self.root
+
+    def _detach(self, node):
+        for n in node.walk():
+            n._scene = None
+            self._dirty.discard(n)
+        self._structure_changed = True
+
+    def _record(self, emit):
+        gl = self.gl
+        if gl._context is not None:
+            raise ValueError('Cannot update a scene from a chunk!')
+        gl._context = ChunkContext(gl._constants, gl._methods)
+        try:
+            emit(gl)
+            return list(gl._context)
+        finally:
+            gl._context = None
+
+    def update(self):
+        """Send the changes to the frontend since the last update.
+
+        Returns a future that resolves when the frontend has applied them
+        (a `concurrent.futures.Future` when called from a worker thread).
+        """
+        order = None
+        appended = None
+        if self._structure_changed:
+            self._order = [(node, name) for node in self.root.walk()
+                           for name, _ in node._slots()]
+            order = ['%s.%s' % (node.key, name) for node, name in self._order]
+        elif self._appended:
+            # Descendants of appended nodes come with them
+            tops = set(self._appended)
+            new_order = [(node, name) for top in self._appended
+                         if not any(a in tops for a in _ancestors(top))
+                         for node in top.walk()
+                         for name, _ in node._slots()]
+            self._order.extend(new_order)
+            appended = ['%s.%s' % (node.key, name) for node, name in new_order]
+        self._appended = []
+        changed = []
+        for node in self._dirty:
+            for name, emit in node._slots():
+                key = '%s.%s' % (node.key, name)
+                instructions = self._record(emit)
+                fingerprint = _fingerprint(instructions)
+                if self._state.get(key) != fingerprint:
+                    changed.append((key, instructions, fingerprint))
+        removed = []
+        if order is not None:
+            live = set(order)
+            removed = [key for key in self._state if key not in live]
+        self._dirty.clear()
+        self._structure_changed = False
+
+        if not changed and not removed and order is None and not appended:
+            if self.gl._submissions.on_loop_thread():
+                future = self.gl._submissions.loop.create_future()
+            else:
+                future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+
+        for key, instructions, fingerprint in changed:
+            self._state[key] = fingerprint
+            # The frontend keeps the slot, so its handles must stay alive
+            self.gl._pin((self, key), instructions)
+        for key in removed:
+            del self._state[key]
+            self.gl._unpin((self, key))
+        return self._send_update(changed, removed, order, appended)
+
+    def _resync(self):
+        """Fall back to the acknowledged state, e.g. after a failed update"""
+        self._state = dict(self._acked)
+        self._structure_changed = True
+        self._appended = []
+        self._dirty.update(self.root.walk())
+
+    def _send_update(self, changed, removed, order, appended):
+        """Send an update after all previous sends, and return a future of
+        its acknowledgement (a concurrent future from other threads)."""
+        gl = self.gl
+        if not gl._submissions.on_loop_thread():
+            return gl._query_from_thread(
+                self._send_update, changed, removed, order, appended)
+        metadata = dict(cmd_id=gl._next_cmd_id())
+        ack = gl._comm.future_query_reply(metadata['cmd_id'])
+
+        async def send_update(prev_sent):
+            instructions = [i for _, slot, _ in changed for i in slot]
+            serialized, buffers = await gl._separate_buffers(instructions)
+            slots = []
+            start = 0
+            for key, slot, _ in changed:
+                slots.append([key, serialized[start:start + len(slot)]])
+                start += len(slot)
+            msg = dict(type='sceneUpdate', slots=slots, removed=removed,
+                       order=order, append=appended)
+            await prev_sent
+            gl._send(msg, metadata, buffers)
+
+        async def acknowledged():
+            try:
+                await sent
+                await ack
+            except Exception:
+                self._resync()
+                raise
+            for key, _, fingerprint in changed:
+                self._acked[key] = fingerprint
+            for key in removed:
+                self._acked.pop(key, None)
+
+        gl._chain(send_update)
+        sent = gl._prev_sent
+        return asyncio.ensure_future(acknowledged())
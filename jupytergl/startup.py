@@ -0,0 +1,83 @@
+"""
+Benchmark of the import time of JupyterGL modules, in fresh interpreters.
+
+Run with::
+
+    python -m jupytergl.startup [module ...] [--repeat N]
+
+For each module, the total import time is measured over a number of cold
+starts, and the slowest imports it pulls in are listed, as reported by
+`python -X importtime`.
+"""
+
+import subprocess
+import sys
+
+
+DEFAULT_MODULES = ['jupytergl.gl', 'jupytergl.glu', 'jupytergl.kernel']
+
+
+def _parse_importtime(output):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us)"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure_import(module, repeat=5):
+    """Import a module in `repeat` fresh interpreters.
+
+    Returns a dict with the import times (s) of each run, and the imports
+    of the fastest run as (module, self, cumulative) tuples in seconds.
+    """
+    times = []
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+            stderr=subprocess.PIPE, universal_newlines=True)
+        if result.returncode != 0:
+            raise RuntimeError('Could not import %s:\n%s' % (module, result.stderr))
+        imports = [(name, s * 1e-6, c * 1e-6)
+                   for name, s, c in _parse_importtime(result.stderr)]
+        total = next(c for name, _, c in reversed(imports) if name == module)
+        times.append(total)
+        if best is None or total < best[0]:
+            best = (total, imports)
+    return dict(module=module, times=times, imports=best[1])
+
+
+def format_measurement(measurement, top=10):
+    times = sorted(measurement['times'])
+    lines = ['%s: min %.1f ms, median %.1f ms (%d runs)' % (
+        measurement['module'], 1e3 * times[0],
+        1e3 * times[len(times) // 2], len(times))]
+    slowest = sorted(measurement['imports'], key=lambda i: i[1], reverse=True)
+    for name, self_time, cumulative in slowest[:top]:
+        lines.append('    %7.1f ms self, %7.1f ms cumulative  %s' % (
+            1e3 * self_time, 1e3 * cumulative, name))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m jupytergl.startup',
+        description="Measure the cold import time of JupyterGL modules.")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES,
+        help="The modules to import (default: %s)" % ' '.join(DEFAULT_MODULES))
+    parser.add_argument('--repeat', type=int, default=5,
+        help="The number of fresh interpreters per module")
+    parser.add_argument('--top', type=int, default=10,
+        help="The number of slowest imports to list per module")
+    opts = parser.parse_args(argv)
+    for module in opts.modules:
+        print(format_measurement(measure_import(module, opts.repeat), opts.top))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,198 @@
+"""
+A stand-in for the frontend context, for testing the kernel side.
+
+It follows the message handling of `Context.handleData` in src/index.ts,
+without WebGL: object handles are allocated for `create*` calls, status
+queries succeed, and executed instructions are logged.
+"""
+
+import asyncio
+
+import numpy as np
+
+from ..codec import EncodedArray
+from ..comm import QueryableComm
+
+
+class FrontendComm(QueryableComm):
+    """A comm that handles messages as the frontend would.
+
+    `executed` lists the `(op, args)` of every executed instruction, with
+    binary buffers as arrays, and `messages` the data of every message
+    received from the kernel. `commands` lists the `(op, args,
+    instructions)` of every command, and `scene_slots` holds the
+    instructions of the retained scene by slot key, both expanded as
+    `executed`. `packed` lists the payloads given to `send_packed`.
+    `returns` can map method names to the value they return, e.g. to make
+    a status query fail.
+    """
+
+    def __init__(self):
+        super(FrontendComm, self).__init__(
+            target_name='jupytergl', kernel=None, primary=False)
+        self.variables = {}
+        self.executed = []
+        self.messages = []
+        self.returns = {}
+        self.commands = []
+        self.packed = []
+        self.scene_slots = {}
+        self.closed = False
+        self._next_key = 1
+        self._pending_chunk = None
+        self._pending_parts = []
+        self._queued = []
+
+    @property
+    def connected(self):
+        return not self.closed
+
+    def send(self, data=None, metadata=None, buffers=None):
+        for recorder in self.recorders:
+            recorder.sent(data, metadata, buffers)
+        self.messages.append(data)
+        # Copy, as the kernel session does when sending
+        buffers = [bytes(memoryview(b).cast('B')) for b in buffers or []]
+        self._handle(data, metadata or {}, buffers)
+
+    def send_packed(self, data, packed, metadata=None, buffers=None):
+        self.packed.append(packed)
+        self.send(data, metadata, buffers)
+
+    def close(self, *args, **kwargs):
+        self.closed = True
+
+    def _handle(self, data, metadata, buffers):
+        msg_type = data['type']
+        if (self._pending_chunk is not None and
+                not (msg_type == 'exec' and
+                     data.get('chunk') == self._pending_chunk) and
+                msg_type in ('exec', 'command', 'sceneUpdate')):
+            self._queued.append((data, metadata, buffers))
+            return
+        if msg_type == 'exec':
+            instructions = self._expand(data['instructions'], buffers)
+            if data.get('abort'):
+                self._pending_parts = []
+                self._pending_chunk = None
+                self._handle_queued()
+            elif 'chunk' in data:
+                self._pending_chunk = data['chunk']
+                self._pending_parts.extend(instructions)
+                if not data.get('more'):
+                    parts, self._pending_parts = self._pending_parts, []
+                    self._pending_chunk = None
+                    self._execute(parts)
+                    self._handle_queued()
+            else:
+                self._execute(instructions)
+        elif msg_type in ('query', 'queryAll'):
+            results = self._execute(self._expand(data['instructions'], buffers))
+            result = results if msg_type == 'queryAll' else results[-1]
+            self._reply(dict(type='queryReply', data=result), metadata)
+        elif msg_type == 'command':
+            command = data['command']
+            self.commands.append((command['op'], command['args'], self._expand(
+                command['instructions'], buffers)))
+        elif msg_type == 'release':
+            for key in data['keys']:
+                del self.variables[key]
+        elif msg_type == 'sceneUpdate':
+            for key, instructions in data['slots']:
+                self.scene_slots[key] = self._expand(instructions, buffers)
+            for key in data['removed']:
+                del self.scene_slots[key]
+            self._reply(dict(type='queryReply', data=None), metadata)
+
+    def _handle_queued(self):
+        queued, self._queued = self._queued, []
+        for queued_message in queued:
+            self._handle(*queued_message)
+
+    def _expand(self, instructions, buffers):
+        """Take the binary buffers of instructions, and check their handles"""
+        expanded = []
+        for instruction in instructions:
+            args = []
+            for arg in instruction['args']:
+                if isinstance(arg, str) and arg.startswith('buffer'):
+                    arg = np.frombuffer(buffers.pop(0), arg[len('buffer'):])
+                elif isinstance(arg, str) and arg.startswith('key'):
+                    if arg not in self.variables:
+                        raise KeyError('Unknown handle: %s' % arg)
+                elif isinstance(arg, dict) and 'decode' in arg:
+                    params = dict(arg)
+                    data = np.frombuffer(
+                        buffers.pop(0), params.pop('data')[len('buffer'):])
+                    arg = EncodedArray(params.pop('decode'), data,
+                                       **params).decoded()
+                elif isinstance(arg, dict) and 'alloc' in arg:
+                    arg = np.zeros(arg['length'], arg['alloc'])
+                args.append(arg)
+            expanded.append((instruction['op'], args))
+        return expanded
+
+    def _execute(self, instructions):
+        results = []
+        for op, args in instructions:
+            args = [results[a['result']] if isinstance(a, dict) else a
+                    for a in args]
+            self.executed.append((op, args))
+            if op in self.returns:
+                results.append(self.returns[op])
+            elif op.startswith('create'):
+                key = 'key%d' % self._next_key
+                self._next_key += 1
+                self.variables[key] = op
+                results.append(key)
+            elif op.startswith('get'):
+                results.append(True)
+            else:
+                results.append(None)
+        return results
+
+    def _reply(self, data, metadata):
+        message = dict(content=dict(data=data), metadata=metadata, buffers=[])
+        asyncio.get_event_loop().call_soon(self.handle_msg, message)
+
+
+#: The subset of WebGL used in the tests, as reported by `getMethods`
+METHODS = [
+    'attachShader', 'bindBuffer', 'bindTexture', 'bufferData',
+    'bufferSubData', 'clear', 'compileShader', 'createBuffer',
+    'createProgram', 'createShader', 'createTexture', 'deleteBuffer',
+    'deleteProgram', 'deleteShader', 'deleteTexture',
+    'disableVertexAttribArray', 'drawArrays', 'drawElements',
+    'enableVertexAttribArray', 'getAttribLocation', 'getError',
+    'getProgramInfoLog', 'getProgramParameter', 'getShaderInfoLog',
+    'getShaderParameter', 'getUniformLocation', 'linkProgram',
+    'pixelStorei', 'readPixels', 'shaderSource', 'texImage2D',
+    'texParameteri',
+    'uniform1f', 'uniform3f', 'uniformMatrix4fv', 'useProgram',
+    'vertexAttrib3f', 'vertexAttribPointer',
+]
+
+#: The constants used in the tests, as reported by `getConstants`
+CONSTANTS = dict(
+    ARRAY_BUFFER=34962, ELEMENT_ARRAY_BUFFER=34963, STATIC_DRAW=35044,
+    DYNAMIC_DRAW=35048, FLOAT=5126, UNSIGNED_SHORT=5123, UNSIGNED_INT=5125,
+    POINTS=0, TRIANGLES=4, VERTEX_SHADER=35633, FRAGMENT_SHADER=35632,
+    COMPILE_STATUS=35713, LINK_STATUS=35714, TEXTURE_2D=3553, RGB=6407,
+    RGBA=6408, UNSIGNED_BYTE=5121, UNPACK_ALIGNMENT=3317, LINEAR=9729,
+    LINEAR_MIPMAP_LINEAR=9987, CLAMP_TO_EDGE=33071, TEXTURE_MAG_FILTER=10240,
+    TEXTURE_MIN_FILTER=10241, TEXTURE_WRAP_S=10242, TEXTURE_WRAP_T=10243,
+    BYTE=5120, NO_ERROR=0,
+)
+
+
+def connect():
+    """A `JupyterGL` connected to a `FrontendComm`, with its bindings.
+
+    Must be called with an event loop running.
+    """
+    from ..gl import JupyterGL
+    comm = FrontendComm()
+    gl = JupyterGL(comm=comm)
+    gl._constants.update(CONSTANTS)
+    gl._methods[:] = METHODS
+    return gl, comm
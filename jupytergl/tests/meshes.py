@@ -0,0 +1,33 @@
+"""
+Meshes built in code, for testing mesh processing without files.
+"""
+
+import numpy as np
+
+from ..fileio.wavefront import Material, Mesh
+
+
+def grid_mesh(n, materials=None, name='grid'):
+    """A flat n x n vertex grid in the unit square of the xy plane.
+
+    The faces of each row of cells alternate between `materials` (by
+    default one untitled material). Normals point along z, and texture
+    coordinates follow x and y.
+    """
+    if materials is None:
+        materials = [Material('plain')]
+    i, j = np.meshgrid(np.arange(n - 1), np.arange(n - 1), indexing='ij')
+    v = (i * n + j).ravel()
+    faces = np.concatenate([np.stack([v, v + 1, v + n], 1),
+                            np.stack([v + 1, v + n + 1, v + n], 1)])
+    face_materials = np.tile(i.ravel() % len(materials), 2)
+    mesh = Mesh(name, len(faces), materials)
+    y, x = np.divmod(np.arange(n * n), n)
+    coords = np.stack([x, y], axis=1).astype(np.float32) / (n - 1)
+    mesh.vertices = np.concatenate(
+        [coords, np.zeros((n * n, 1), np.float32)], axis=1)
+    mesh.normals = np.tile(np.array([0, 0, 1], np.float32), (n * n, 1))
+    mesh.texture_coords = coords
+    mesh.faces[:] = faces
+    mesh.sort_by_material(face_materials)
+    return mesh
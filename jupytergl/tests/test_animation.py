@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ..animation import Animation, CameraTrack, UniformTrack
+from .frontend import connect
+
+
+@pytest.mark.parametrize('interpolation', ['step', 'linear', 'cubic'])
+def test_value_at_keyframes(interpolation):
+    track = CameraTrack('position', [0, 1, 3], [[0, 0, 0], [1, 2, 3], [0, 0, 6]],
+                        interpolation)
+    assert track.size == 3 and track.duration == 3
+    for time, value in zip(track.times, track.values):
+        np.testing.assert_allclose(track.value_at(time), value, atol=1e-6)
+    # Held before the first and after the last keyframe
+    np.testing.assert_array_equal(track.value_at(-1), [0, 0, 0])
+    np.testing.assert_array_equal(track.value_at(10), [0, 0, 6])
+
+
+def test_value_between_keyframes():
+    times, values = [0, 1, 2, 3], [0, 1, 2, 3]
+    step = CameraTrack('fov', times, values, 'step')
+    linear = CameraTrack('fov', times, values, 'linear')
+    cubic = CameraTrack('fov', times, values, 'cubic')
+    assert step.value_at(1.75) == [1]
+    np.testing.assert_allclose(linear.value_at(1.75), [1.75])
+    # The spline through points on a line follows the line
+    np.testing.assert_allclose(cubic.value_at(1.75), [1.75], rtol=1e-6)
+    # But it is smooth at the keyframes, unlike linear interpolation
+    curve = CameraTrack('fov', times, [0, 1, 0, 1], 'cubic')
+    assert curve.value_at(0.9) > 0.9 and curve.value_at(1.1) > 0.9
+
+
+def test_track_errors():
+    with pytest.raises(ValueError):
+        CameraTrack('fov', [0, 1], [30, 60], 'smooth')
+    with pytest.raises(ValueError):
+        CameraTrack('fov', [1, 0], [30, 60])
+    with pytest.raises(ValueError):
+        CameraTrack('fov', [0, 1, 2], [30, 60])
+    with pytest.raises(ValueError):
+        CameraTrack('position', [0, 1], [30, 60])
+    with pytest.raises(ValueError):
+        CameraTrack('zoom', [0, 1], [1, 2])
+    with pytest.raises(ValueError):
+        UniformTrack('key1', 'key2', 'bindTexture', [0, 1], [0, 1])
+    with pytest.raises(ValueError):
+        UniformTrack('key1', 'key2', 'uniformMatrix4fv', [0, 1],
+                     [np.eye(4), np.eye(4)])
+
+
+def test_animation_sends_tracks_once():
+    async def run():
+        gl, comm = connect()
+        program = await gl.createProgram()
+        # A stand-in for the handle of a uniform location
+        location = 'key100'
+        comm.variables[location] = 'getUniformLocation'
+        spin = UniformTrack(program, location, 'uniformMatrix4fv', [0, 1],
+                            [np.eye(4), 2 * np.eye(4)], 'step')
+        fov = CameraTrack('fov', [0, 2], [30, 60])
+        with pytest.raises(ValueError):
+            Animation(gl, [])
+        animation = Animation(gl, [spin, fov], loop=False)
+        assert animation.duration == 2
+        # The program is in use by the animation
+        with pytest.raises(ValueError):
+            gl.release(program)
+        animation.seek(1.5)
+        animation.play(2.)
+        animation.remove()
+        gl.release(program)
+        await gl._prev_sent
+
+        [(op, args, instructions), *controls] = comm.commands
+        assert (op, args) == ('animation', [animation.id, False, True])
+        assert [i[0] for i in instructions] == ['uniform', 'camera']
+        uniform_args = instructions[0][1]
+        assert uniform_args[:3] == [program, location, 'uniformMatrix4fv']
+        np.testing.assert_array_equal(uniform_args[3], [0, 1])
+        np.testing.assert_array_equal(
+            uniform_args[4].reshape(2, 4, 4), [np.eye(4), 2 * np.eye(4)])
+        assert uniform_args[5:] == [16, 'step']
+        assert instructions[1][1][0] == 'fov'
+        assert [(op, args) for op, args, _ in controls] == [
+            ('animationControl', [animation.id, 'seek', 1.5]),
+            ('animationControl', [animation.id, 'play', 2.]),
+            ('animationControl', [animation.id, 'remove']),
+        ]
+    asyncio.run(run())
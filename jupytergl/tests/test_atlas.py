@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from ..atlas import build_atlas, pack_rectangles, remap_texture_coords
+from ..fileio.wavefront import Material, Mesh
+
+
+FakeTexture = namedtuple('FakeTexture', ('image_name', 'image'))
+
+
+def textured(name, width, height, value):
+    material = Material(name)
+    image = np.full((height, width, 3), value, np.uint8)
+    material.textures['Kd'] = FakeTexture(name + '.png', image)
+    return material
+
+
+def make_mesh(materials, texture_coords=True):
+    # Two triangles sharing an edge, one per material
+    mesh = Mesh('quad', 2, materials)
+    mesh.vertices = np.array(
+        [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], np.float32)
+    mesh.normals = None
+    mesh.texture_coords = np.array(
+        [[0, 0], [1, 0], [1, 1], [0, 1]], np.float32) if texture_coords else None
+    mesh.faces[:] = [[0, 1, 2], [0, 2, 3]]
+    mesh.sort_by_material([0, len(materials) - 1])
+    return mesh
+
+
+def test_pack_rectangles_do_not_overlap():
+    sizes = [(30, 20), (64, 64), (10, 50), (64, 8), (33, 33)] * 4
+    regions, pages = pack_rectangles(sizes, max_size=128, padding=2)
+    occupied = [np.zeros((h, w), bool) for w, h in pages]
+    for (w, h), region in zip(sizes, regions):
+        assert (region.width, region.height) == (w, h)
+        cells = occupied[region.page][
+            region.y - 2:region.y + h + 2, region.x - 2:region.x + w + 2]
+        assert cells.shape == (h + 4, w + 4)
+        assert not cells.any()
+        cells[...] = True
+    assert len(pages) > 1
+
+
+def test_pack_rectangles_rejects_oversized():
+    with pytest.raises(ValueError):
+        pack_rectangles([(100, 10)], max_size=64)
+
+
+def test_build_atlas_copies_and_pads_textures():
+    red, blue = textured('red', 8, 4, 200), textured('blue', 4, 8, 50)
+    atlas = build_atlas([red, blue, Material('plain')], padding=1)
+    assert set(atlas.regions) == {red, blue}
+    for material, value in ((red, 200), (blue, 50)):
+        region = atlas.regions[material]
+        page = atlas.pages[region.page]
+        block = page[region.y - 1:region.y + region.height + 1,
+                     region.x - 1:region.x + region.width + 1]
+        assert (block[..., :3] == value).all()
+        assert (block[..., 3] == 255).all()
+
+
+def test_remap_texture_coords_per_material():
+    red, blue = textured('red', 8, 4, 200), textured('blue', 4, 8, 50)
+    atlas = build_atlas([red, blue])
+    mesh = make_mesh([red, blue])
+    pages = remap_texture_coords(mesh, atlas)
+    assert set(pages) == {'red', 'blue'}
+    # The shared edge is duplicated, one copy per material
+    assert len(mesh.vertices) == 6
+    for draw_range, material in zip(mesh.draw_ranges, (red, blue)):
+        _, scale_u, scale_v, offset_u, offset_v = atlas.uv_transform(material)
+        faces = mesh.faces.ravel()[
+            draw_range.start:draw_range.start + draw_range.count]
+        coords = mesh.texture_coords[faces]
+        assert (coords[:, 0] >= offset_u - 1e-6).all()
+        assert (coords[:, 0] <= offset_u + scale_u + 1e-6).all()
+        assert (coords[:, 1] >= offset_v - 1e-6).all()
+        assert (coords[:, 1] <= offset_v + scale_v + 1e-6).all()
+    # The geometry itself is unchanged
+    assert len(np.unique(mesh.vertices[mesh.faces.ravel()], axis=0)) == 4
+
+
+def test_remap_texture_coords_without_atlas_materials():
+    atlas = build_atlas([textured('red', 8, 4, 200)])
+    mesh = make_mesh([Material('plain')], texture_coords=False)
+    assert remap_texture_coords(mesh, atlas) == {}
+    assert mesh.texture_coords is None
+
+
+def test_remap_texture_coords_requires_texture_coords():
+    red = textured('red', 8, 4, 200)
+    mesh = make_mesh([red], texture_coords=False)
+    with pytest.raises(ValueError):
+        remap_texture_coords(mesh, build_atlas([red]))
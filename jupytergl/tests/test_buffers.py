@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+
+from ..buffers import TrackedBuffer, _merge_ranges
+from .frontend import connect
+
+
+def test_merge_ranges():
+    assert _merge_ranges([], 0) == []
+    assert _merge_ranges([(5, 6), (0, 2), (1, 3)], 0) == [[0, 3], [5, 6]]
+    assert _merge_ranges([(5, 6), (0, 2)], 3) == [[0, 6]]
+    assert _merge_ranges([(0, 10), (2, 4)], 0) == [[0, 10]]
+
+
+def make_buffer(**kwargs):
+    """A TrackedBuffer of 100 vec3 rows, with its GL and frontend"""
+    gl, comm = connect()
+    data = np.zeros((100, 3), np.float32)
+    tracked = TrackedBuffer(gl, 'key1', data, upload=False, **kwargs)
+    comm.variables['key1'] = 'createBuffer'
+    return tracked, comm
+
+
+def sub_uploads(comm):
+    return [(args[1], args[2]) for op, args in comm.executed
+            if op == 'bufferSubData']
+
+
+def test_tracked_buffer_marks_indexed_rows():
+    async def run():
+        tracked, _ = make_buffer(merge_gap=0)
+        tracked[10:12] = 1
+        tracked[-1] = 2
+        tracked[[3, 4, 5, 8]] = 3
+        tracked[5:2:-1, 0] = 4
+        mask = np.zeros(100, bool)
+        mask[50] = True
+        tracked[mask] = 5
+        assert tracked.dirty_ranges() == [
+            [3, 6], [8, 9], [10, 12], [50, 51], [99, 100]]
+        tracked[...] = 0
+        assert tracked.dirty_ranges() == [[0, 100]]
+    asyncio.run(run())
+
+
+def test_tracked_buffer_merges_close_ranges():
+    async def run():
+        # Rows are 12 bytes, so ranges up to 2 rows apart are merged
+        tracked, _ = make_buffer(merge_gap=24)
+        tracked[0] = 1
+        tracked[3] = 1
+        tracked[7] = 1
+        assert tracked.dirty_ranges() == [[0, 4], [7, 8]]
+    asyncio.run(run())
+
+
+def test_tracked_buffer_flush_sends_modified_bytes():
+    async def run():
+        tracked, comm = make_buffer(merge_gap=0)
+        assert tracked.flush() == 0
+        tracked[10:12] = [[1, 2, 3], [4, 5, 6]]
+        tracked[90] = 7
+        assert tracked.dirty
+        assert tracked.flush() == 2
+        assert not tracked.dirty
+        # Later modifications are not sent with the earlier flush
+        tracked[10] = 0
+        await tracked.gl._prev_sent
+        uploads = sub_uploads(comm)
+        assert [offset for offset, _ in uploads] == [10 * 12, 90 * 12]
+        np.testing.assert_array_equal(uploads[0][1], [1, 2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(uploads[1][1], [7, 7, 7])
+    asyncio.run(run())
+
+
+def test_tracked_buffer_uploads_initial_data():
+    async def run():
+        gl, comm = connect()
+        buffer = await gl.createBuffer()
+        tracked = TrackedBuffer(gl, buffer, np.arange(6, dtype=np.uint16))
+        tracked.mark_dirty(2, 4)
+        tracked.flush()
+        await gl._prev_sent
+        ops = [op for op, _ in comm.executed]
+        assert ops == ['createBuffer', 'bindBuffer', 'bufferData',
+                       'bindBuffer', 'bufferSubData']
+        _, args = comm.executed[2]
+        assert args[2] == gl.DYNAMIC_DRAW
+        np.testing.assert_array_equal(args[1], np.arange(6))
+        assert sub_uploads(comm)[0][0] == 4
+    asyncio.run(run())
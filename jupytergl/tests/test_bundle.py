@@ -0,0 +1,88 @@
+import asyncio
+import base64
+
+import numpy as np
+import pytest
+
+from ..bundle import MIME_TYPE, BundleRecorder, decode_bundle, encode_bundle
+from .frontend import connect
+
+
+def test_bundle_round_trip():
+    messages = [
+        (dict(type='exec', instructions=[]), []),
+        (dict(type='exec', instructions=[dict(op='bufferData', args=[])]),
+         [np.arange(3, dtype=np.uint8), np.arange(5, dtype=np.float64)]),
+        (dict(type='release', keys=['key1']), [b'abcde']),
+    ]
+    bundle = encode_bundle(messages)
+    decoded = decode_bundle(bundle)
+    assert [data for data, _ in decoded] == [data for data, _ in messages]
+    start = np.frombuffer(bundle, np.uint8).ctypes.data
+    for (_, buffers), (_, expected) in zip(decoded, messages):
+        assert [bytes(b) for b in buffers] == [
+            bytes(memoryview(b).cast('B')) for b in expected]
+        for buffer in buffers:
+            # Aligned, so that typed arrays can view them in place
+            offset = np.frombuffer(buffer, np.uint8).ctypes.data - start
+            assert offset % 8 == 0
+
+
+def test_decode_bundle_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_bundle(b'NOPE' + bytes(8))
+
+
+def record_session(gl, recorder):
+    """Record a buffer upload, and return the buffer handle"""
+    async def run():
+        gl.record(recorder)
+        buffer = await gl.createBuffer()
+        with gl.chunk():
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            gl.bufferData(gl.ARRAY_BUFFER, np.ones(4, np.float32),
+                          gl.STATIC_DRAW)
+        await gl._prev_sent
+        gl.stop_recording(recorder)
+        return buffer
+    return run()
+
+
+def test_recorder_renumbers_handles():
+    async def run():
+        gl, comm = connect()
+        # Objects created before the recording shift the handles
+        await gl.createBuffer()
+        await gl.createBuffer()
+        recorder = BundleRecorder()
+        buffer = await record_session(gl, recorder)
+        assert buffer == 'key3'
+        messages = decode_bundle(recorder.encode())
+        assert [data['type'] for data, _ in messages] == ['query', 'exec']
+        bind = messages[1][0]['instructions'][0]
+        assert bind['args'][1] == 'key1'
+        assert bytes(messages[1][1][0]) == np.ones(4, np.float32).tobytes()
+    asyncio.run(run())
+
+
+def test_recorder_rejects_objects_created_before():
+    async def run():
+        gl, comm = connect()
+        buffer = await gl.createBuffer()
+        recorder = gl.record()
+        with gl.chunk():
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+        await gl._prev_sent
+        with pytest.raises(ValueError, match='key1'):
+            recorder.encode()
+    asyncio.run(run())
+
+
+def test_recorder_mimebundle():
+    async def run():
+        gl, comm = connect()
+        recorder = BundleRecorder()
+        await record_session(gl, recorder)
+        data = recorder._repr_mimebundle_()[MIME_TYPE]
+        assert base64.b64decode(data) == recorder.encode()
+    asyncio.run(run())
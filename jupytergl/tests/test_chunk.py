@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+
+from .. import glu
+from .frontend import connect
+
+
+VERTEX_SHADER = 'void main() {}'
+FRAGMENT_SHADER = 'void main() { gl_FragColor = vec4(1.0); }'
+
+
+def test_chunk_parts_are_executed_together():
+    async def run():
+        gl, comm = connect()
+        data = np.zeros(16, dtype=np.float32)
+        with gl.chunk(max_instructions=2):
+            for _ in range(5):
+                gl.bufferData(gl.ARRAY_BUFFER, data, gl.STATIC_DRAW)
+        await gl._prev_sent
+        parts = [m for m in comm.messages if m['type'] == 'exec']
+        assert len(parts) > 1
+        assert len({m['chunk'] for m in parts}) == 1
+        assert [bool(m.get('more')) for m in parts] == (
+            [True] * (len(parts) - 1) + [False])
+        assert [op for op, _ in comm.executed] == ['bufferData'] * 5
+    asyncio.run(run())
+
+
+def test_chunk_is_atomic():
+    async def run():
+        gl, comm = connect()
+        with gl.chunk(max_instructions=1):
+            gl.clear(0)
+            gl.clear(1)
+            # Sent while the chunk is pending, so executed after it
+            gl.branch().exec_('clear', [2])
+            gl.clear(3)
+        await gl._prev_sent
+        assert comm.executed == [('clear', [0]), ('clear', [1]),
+                                 ('clear', [3]), ('clear', [2])]
+    asyncio.run(run())
+
+
+def test_chunk_part_uses_program_queried_after_first_part():
+    # The program is queried by a coroutine, after the first part of the
+    # chunk has gone out. The frontend must answer the query before the
+    # chunk is complete, or the last part waits for the handle forever.
+    async def run():
+        gl, comm = connect()
+        program = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        with gl.chunk(max_instructions=1):
+            gl.clear(0)
+            gl.clear(1)
+            gl.useProgram(program)
+        await asyncio.wait_for(gl._prev_sent, 1)
+        assert program.done()
+        key = program.result()
+        assert ('useProgram', [key]) in comm.executed
+        assert comm.executed[-1] == ('useProgram', [key])
+    asyncio.run(run())
+
+
+def test_failed_chunk_is_discarded():
+    async def run():
+        gl, comm = connect()
+        try:
+            with gl.chunk(max_instructions=1):
+                gl.clear(0)
+                gl.clear(1)
+                raise RuntimeError('Failed to build the chunk')
+        except RuntimeError:
+            pass
+        with gl.chunk():
+            gl.clear(5)
+        await gl._prev_sent
+        # The parts sent before the error are dropped, not executed
+        assert comm.executed == [('clear', [5])]
+        assert comm._pending_chunk is None and not comm._queued
+        assert comm.messages[-2]['abort']
+    asyncio.run(run())
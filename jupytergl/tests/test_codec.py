@@ -0,0 +1,86 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ..codec import (
+    decode_varints, encode_delta, encode_octahedral, encode_quantized,
+    encode_varints, quantize_positions)
+from .frontend import connect
+
+
+rng = np.random.default_rng(0)
+
+
+@pytest.mark.parametrize('bits', [8, 12, 16])
+def test_quantized_round_trip(bits):
+    values = rng.uniform(-5, 20, size=(1000, 3)).astype(np.float32)
+    encoded = encode_quantized(values, bits)
+    assert encoded.data.dtype == (np.uint8 if bits <= 8 else np.uint16)
+    decoded = encoded.decoded()
+    assert decoded.shape == values.shape
+    step = np.array(encoded.params['step'])
+    assert (np.abs(decoded - values) <= step / 2 + 1e-5).all()
+
+
+def test_quantize_flat_axis():
+    positions = np.zeros((4, 3))
+    positions[:, 0] = [0, 1, 2, 3]
+    quantized, offset, scale = quantize_positions(positions, 8)
+    assert quantized[:, 1:].max() == 0
+    np.testing.assert_array_equal(quantized[:, 0], [0, 85, 170, 255])
+    with pytest.raises(ValueError):
+        quantize_positions(positions, 17)
+
+
+def test_octahedral_round_trip():
+    normals = rng.normal(size=(1000, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    # Including the axes and the lower hemisphere folds
+    normals = np.concatenate([normals, np.eye(3), -np.eye(3)])
+    decoded = encode_octahedral(normals, bits=12).decoded()
+    cos = np.einsum('ij,ij->i', decoded, normals)
+    assert np.degrees(np.arccos(np.clip(cos, -1, 1))).max() < 0.1
+    np.testing.assert_allclose(np.linalg.norm(decoded, axis=1), 1, rtol=1e-6)
+
+
+@pytest.mark.parametrize('values', [
+    [], [0], [127, 128, 16383, 16384], [2 ** 63, 2 ** 64 - 1, 1, 0]])
+def test_varints_round_trip(values):
+    encoded = encode_varints(np.array(values, np.uint64))
+    assert encoded.dtype == np.uint8
+    decoded = decode_varints(encoded, len(values))
+    assert decoded.tolist() == values
+
+
+def test_varints_sizes():
+    assert len(encode_varints([0, 127])) == 2
+    assert len(encode_varints([128])) == 2
+    assert len(encode_varints([2 ** 63])) == 10
+
+
+@pytest.mark.parametrize('dtype', [np.uint16, np.uint32])
+def test_delta_round_trip(dtype):
+    faces = rng.integers(0, np.iinfo(dtype).max, size=(500, 3)).astype(dtype)
+    encoded = encode_delta(faces)
+    decoded = encoded.decoded()
+    assert decoded.dtype == dtype
+    np.testing.assert_array_equal(decoded, faces.ravel())
+
+
+def test_delta_is_compact_for_local_indices():
+    faces = np.arange(3000, dtype=np.uint32).reshape(-1, 3)
+    assert encode_delta(faces).nbytes == 3000
+
+
+def test_encoded_argument_is_sent_as_buffer():
+    async def run():
+        gl, comm = connect()
+        encoded = encode_delta(np.arange(6, dtype=np.uint16))
+        with gl.chunk():
+            gl.bufferData(gl.ELEMENT_ARRAY_BUFFER, encoded, gl.STATIC_DRAW)
+        await gl._prev_sent
+        [instruction] = comm.messages[-1]['instructions']
+        assert instruction['args'][1] == dict(
+            decode='delta', data='bufferuint8', count=6, type='uint16')
+    asyncio.run(run())
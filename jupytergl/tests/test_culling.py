@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from .. import glu
+from ..culling import BVH, CulledScene, _classify, frustum_planes
+from .frontend import connect
+from .meshes import grid_mesh
+
+
+def camera(eye, target=(0, 0, 0)):
+    projection = glu.make_perspective(60, 1, 0.1, 50)
+    modelview = glu.make_look_at(*eye, *target, 0, 1, 0)
+    return projection, modelview
+
+
+def random_boxes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lower = rng.uniform(-20, 20, size=(n, 3))
+    return np.stack([lower, lower + rng.uniform(0.1, 3, size=(n, 3))], axis=1)
+
+
+def test_frustum_planes_contain_points_in_view():
+    planes = frustum_planes(*camera((0, 0, 10)))
+    np.testing.assert_allclose(np.linalg.norm(planes[:, :3], axis=1), 1)
+
+    def inside(point):
+        return (planes[:, :3].dot(point) + planes[:, 3] >= 0).all()
+
+    assert inside([0, 0, 0])
+    assert inside([1, 1, -20])
+    assert not inside([0, 0, 20])  # Behind the camera
+    assert not inside([0, 0, -45])  # Beyond the far plane
+    assert not inside([30, 0, 0])
+
+
+@pytest.mark.parametrize('leaf_size', [1, 4, 8])
+def test_cull_matches_brute_force(leaf_size):
+    boxes = random_boxes(500)
+    bvh = BVH(boxes, leaf_size=leaf_size)
+    for eye in [(0, 0, 30), (25, 5, 0), (-10, -10, -10), (0, 100, 1)]:
+        planes = frustum_planes(*camera(eye))
+        outside, _ = _classify(planes, boxes[:, 0], boxes[:, 1])
+        np.testing.assert_array_equal(
+            bvh.cull(planes), np.flatnonzero(~outside))
+
+
+def test_cull_empty():
+    bvh = BVH(np.empty((0, 2, 3)))
+    assert len(bvh.cull(frustum_planes(*camera((0, 0, 10))))) == 0
+
+
+def test_culled_scene_uploads_visible_meshes_once():
+    async def run():
+        gl, comm = connect()
+        meshes = []
+        for x in (-30, 0, 30):
+            mesh = grid_mesh(3)
+            mesh.vertices = mesh.vertices + np.float32([x, 0, 0])
+            meshes.append(mesh)
+        uploads = []
+
+        def upload(gl, mesh):
+            uploads.append(mesh)
+            return len(uploads)
+
+        def draw(gl, mesh, uploaded):
+            gl.drawArrays(gl.TRIANGLES, uploaded, len(mesh.faces))
+
+        scene = CulledScene(gl, meshes, upload, draw)
+        assert list(scene.render(*camera((0, 0, 5)))) == [1]
+        assert list(scene.render(*camera((30, 0, 5), (30, 0, 0)))) == [2]
+        assert list(scene.render(*camera((0, 0, 5)))) == [1]
+        assert uploads == [meshes[1], meshes[2]]
+        await gl._prev_sent
+        draws = [m['instructions'][0]['args'][1] for m in comm.messages
+                 if m['type'] == 'exec']
+        assert draws == [1, 2, 1]
+    asyncio.run(run())
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from ..geometry import (
+    cache_miss_ratio, face_normals, optimize_vertex_cache, reorder_vertices,
+    vertex_normals, vertex_tangents)
+from .meshes import grid_mesh
+
+
+def grid_faces(n, shuffle=True):
+    """The two triangles of each cell of an n x n vertex grid"""
+    i, j = np.meshgrid(np.arange(n - 1), np.arange(n - 1))
+    v = (i * n + j).ravel()
+    faces = np.concatenate([np.stack([v, v + 1, v + n], 1),
+                            np.stack([v + 1, v + n + 1, v + n], 1)])
+    if shuffle:
+        faces = faces[np.random.default_rng(0).permutation(len(faces))]
+    return faces
+
+
+def test_optimize_vertex_cache_is_permutation():
+    faces = grid_faces(20)
+    order = optimize_vertex_cache(faces, 400)
+    assert sorted(order) == list(range(len(faces)))
+
+
+def test_optimize_vertex_cache_reduces_misses():
+    faces = grid_faces(40)
+    order = optimize_vertex_cache(faces, 1600, cache_size=16)
+    assert cache_miss_ratio(faces) > 2.5
+    assert cache_miss_ratio(faces[order]) < 1
+
+
+def test_optimize_vertex_cache_in_chunks():
+    faces = grid_faces(30)
+    order = optimize_vertex_cache(faces, 900, chunk_size=500)
+    assert sorted(order) == list(range(len(faces)))
+    # Each chunk keeps its own faces
+    for start in range(0, len(faces), 500):
+        chunk = order[start:start + 500]
+        assert chunk.min() >= start and chunk.max() < start + 500
+
+
+def test_optimize_vertex_cache_empty():
+    faces = np.empty((0, 3), np.uint16)
+    assert len(optimize_vertex_cache(faces, 0)) == 0
+
+
+def test_reorder_vertices_in_order_of_use():
+    faces = np.array([[3, 1, 4], [1, 5, 3]], np.uint16)
+    new_faces, order = reorder_vertices(faces, 7)
+    np.testing.assert_array_equal(new_faces, [[0, 1, 2], [1, 3, 0]])
+    assert new_faces.dtype == faces.dtype
+    # Unused vertices are moved to the end
+    np.testing.assert_array_equal(order, [3, 1, 4, 5, 0, 2, 6])
+    np.testing.assert_array_equal(order[new_faces], faces)
+
+
+def sphere(n=16):
+    """A UV sphere of unit radius, as (vertices, faces)"""
+    theta, phi = np.meshgrid(np.linspace(0.1, np.pi - 0.1, n),
+                             np.linspace(0, 2 * np.pi, n, endpoint=False),
+                             indexing='ij')
+    vertices = np.stack([np.sin(theta) * np.cos(phi),
+                         np.sin(theta) * np.sin(phi),
+                         np.cos(theta)], axis=-1).reshape(-1, 3)
+    i, j = np.meshgrid(np.arange(n - 1), np.arange(n), indexing='ij')
+    a = (i * n + j).ravel()
+    b = (i * n + (j + 1) % n).ravel()
+    faces = np.concatenate([np.stack([a, a + n, b], 1),
+                            np.stack([b, a + n, b + n], 1)])
+    return vertices.astype(np.float32), faces
+
+
+def test_face_normals():
+    vertices = np.array([[0, 0, 0], [2, 0, 0], [0, 2, 0]], np.float32)
+    faces = np.array([[0, 1, 2], [0, 2, 1]])
+    np.testing.assert_allclose(face_normals(vertices, faces),
+                               [[0, 0, 1], [0, 0, -1]])
+    np.testing.assert_allclose(
+        face_normals(vertices, faces, normalized=False)[0], [0, 0, 4])
+
+
+@pytest.mark.parametrize('weighting', ['area', 'angle'])
+def test_vertex_normals_of_sphere(weighting):
+    vertices, faces = sphere()
+    normals = vertex_normals(vertices, faces, weighting)
+    assert normals.dtype == np.float32
+    # Outward, close to the radial direction
+    assert (np.einsum('ij,ij->i', normals, vertices) > 0.98).all()
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1, rtol=1e-5)
+
+
+def test_vertex_normals_shared_vertices_in_chunks():
+    vertices, faces = sphere()
+    np.testing.assert_allclose(
+        vertex_normals(vertices, faces, chunk_size=7),
+        vertex_normals(vertices, faces), atol=1e-6)
+
+
+def test_vertex_normals_angle_weighting():
+    # A vertex with one large and two small faces around it
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1],
+                         [-1, -1, 0]], np.float32)
+    faces = np.array([[0, 1, 2], [0, 3, 1], [0, 4, 3]])
+    area = vertex_normals(vertices, faces, 'area')[0]
+    angle = vertex_normals(vertices, faces, 'angle')[0]
+    assert not np.allclose(area, angle)
+    with pytest.raises(ValueError):
+        vertex_normals(vertices, faces, 'volume')
+
+
+def test_vertex_tangents_follow_u():
+    mesh = grid_mesh(5)
+    tangents = vertex_tangents(mesh.vertices, mesh.normals,
+                               mesh.texture_coords, mesh.faces)
+    np.testing.assert_allclose(tangents, [[1, 0, 0]] * len(tangents),
+                               atol=1e-6)
+
+
+def test_vertex_tangents_orthogonal_to_normals():
+    vertices, faces = sphere()
+    normals = vertex_normals(vertices, faces)
+    theta_phi = np.stack([np.arctan2(vertices[:, 1], vertices[:, 0]),
+                          np.arccos(vertices[:, 2])], axis=1)
+    tangents = vertex_tangents(vertices, normals, theta_phi, faces,
+                               chunk_size=11)
+    assert np.abs(np.einsum('ij,ij->i', tangents, normals)).max() < 1e-5
+    lengths = np.linalg.norm(tangents, axis=1)
+    np.testing.assert_allclose(lengths[lengths > 0], 1, rtol=1e-5)
+
+
+def test_vertex_tangents_skip_degenerate_texture_coords():
+    mesh = grid_mesh(3)
+    coords = np.zeros_like(mesh.texture_coords)
+    tangents = vertex_tangents(mesh.vertices, mesh.normals, coords, mesh.faces)
+    assert np.isfinite(tangents).all()
@@ -0,0 +1,34 @@
+import asyncio
+import subprocess
+import sys
+
+from ..gl import JupyterGL
+from .frontend import FrontendComm
+
+
+def test_drawing_buffer_is_not_preserved_by_default():
+    async def run():
+        comm = FrontendComm()
+        JupyterGL(comm=comm)
+        assert [m['type'] for m in comm.messages] == [
+            'getConstants', 'getMethods']
+    asyncio.run(run())
+
+
+def test_preserve_drawing_buffer_is_sent_before_context_is_used():
+    async def run():
+        comm = FrontendComm()
+        gl = JupyterGL(comm=comm, preserve_drawing_buffer=True)
+        assert comm.messages[0] == dict(
+            type='contextAttributes',
+            attributes=dict(preserveDrawingBuffer=True))
+        view = gl.branch().add_view(FrontendComm())
+        assert view.messages[0]['type'] == 'contextAttributes'
+    asyncio.run(run())
+
+
+def test_import_defers_codec():
+    code = ('import sys, jupytergl.gl, jupytergl.glu; '
+            'print("jupytergl.codec" in sys.modules)')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'False'
@@ -0,0 +1,145 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from .. import glu
+from .frontend import connect
+
+
+VERTEX_SHADER = 'void main() {}'
+FRAGMENT_SHADER = 'void main() { gl_FragColor = vec4(1.0); }'
+
+
+def test_make_program_in_one_round_trip():
+    async def run():
+        gl, comm = connect()
+        program = await glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        assert program in comm.variables
+        assert [m['type'] for m in comm.messages[2:]] == ['queryAll']
+        ops = [op for op, _ in comm.executed]
+        assert ops[:3] == ['createShader', 'createShader', 'createProgram']
+        assert ops[-1] == 'getProgramParameter'
+        # The shaders are attached by their results in the same message
+        attached = [args for op, args in comm.executed if op == 'attachShader']
+        assert attached == [[program, 'key1'], [program, 'key2']]
+    asyncio.run(run())
+
+
+def test_make_program_is_cached():
+    async def run():
+        gl, comm = connect()
+        first = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        assert glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER) is first
+        uncached = glu.make_program(
+            gl, VERTEX_SHADER, FRAGMENT_SHADER, cache=False)
+        assert uncached is not first
+        assert await first != await uncached
+        n_messages = len(comm.messages)
+        assert glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER) is first
+        assert len(comm.messages) == n_messages
+    asyncio.run(run())
+
+
+def test_released_program_is_uncached():
+    async def run():
+        gl, comm = connect()
+        program = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        handle = await program
+        with gl.chunk():
+            gl.deleteProgram(program)
+        gl.release(handle)
+        again = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        assert again is not program
+        assert await again != handle
+    asyncio.run(run())
+
+
+def test_failed_program_is_not_cached():
+    async def run():
+        gl, comm = connect()
+        comm.returns['getProgramParameter'] = False
+        comm.returns['getProgramInfoLog'] = 'link error'
+        program = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        with pytest.raises(ValueError, match='link error'):
+            await program
+        await gl._prev_sent
+        # The shaders and program were deleted and released
+        assert comm.variables == {}
+        del comm.returns['getProgramParameter']
+        retry = glu.make_program(gl, VERTEX_SHADER, FRAGMENT_SHADER)
+        assert retry is not program
+        assert await retry in comm.variables
+    asyncio.run(run())
+
+
+def test_pad_to_power_of_two():
+    image = np.arange(3 * 5 * 3, dtype=np.uint8).reshape(3, 5, 3)
+    padded = glu.pad_to_power_of_two(image)
+    assert padded.shape == (4, 8, 3)
+    np.testing.assert_array_equal(padded[:3, :5], image)
+    np.testing.assert_array_equal(padded[3, :5], image[2])
+    np.testing.assert_array_equal(padded[:3, 7], image[:, 4])
+    assert glu.power_of_two_scale(image.shape) == (5 / 8, 3 / 4)
+    square = np.zeros((8, 8, 3))
+    assert glu.pad_to_power_of_two(square) is square
+
+
+@pytest.mark.parametrize('method', ['box', 'lanczos'])
+def test_make_mipmaps(method):
+    image = np.full((16, 8, 3), 200, np.uint8)
+    levels = glu.make_mipmaps(image, method)
+    assert [level.shape[:2] for level in levels] == [
+        (16, 8), (8, 4), (4, 2), (2, 1), (1, 1)]
+    for level in levels:
+        assert level.dtype == np.uint8
+        # A flat image stays flat
+        assert (level == 200).all()
+
+
+def test_box_downsample_averages():
+    image = np.array([[0, 2], [4, 6]], np.float32)[:, :, None]
+    np.testing.assert_array_equal(glu.downsample(image)[..., 0], [[3]])
+    with pytest.raises(ValueError):
+        glu.downsample(image, 'nearest')
+
+
+def test_mipmapped_texture_sharpens_progressively():
+    async def run():
+        gl, comm = connect()
+        image = np.zeros((32, 32, 4), np.uint8)
+        texture = await glu.make_mipmapped_texture(
+            gl, image, gl.UNSIGNED_BYTE, preview_size=8)
+        assert texture in comm.variables
+        uploads = [(args[1], args[3]) for op, args in comm.executed
+                   if op == 'texImage2D']
+        assert uploads == [
+            # Level 0 from the preview, getting sharper
+            (0, 8), (0, 16),
+            # The mip levels, coarse to fine
+            (5, 1), (4, 2), (3, 4), (2, 8), (1, 16),
+            # And finally the full resolution
+            (0, 32)]
+        filters = [args[2] for op, args in comm.executed
+                   if op == 'texParameteri' and args[1] == gl.TEXTURE_MIN_FILTER]
+        assert filters == [gl.LINEAR, gl.LINEAR_MIPMAP_LINEAR]
+        # The unpack alignment is restored after each upload
+        alignments = [args[1] for op, args in comm.executed
+                      if op == 'pixelStorei']
+        assert alignments == [1, 4] * len(uploads)
+    asyncio.run(run())
+
+
+def test_normal_map_of_flat_bump_map_points_up():
+    normals = glu.bump_map_to_normal_map(np.full((10, 12), 100, np.uint8))
+    assert normals.shape == (10, 12, 3) and normals.dtype == np.uint8
+    assert (normals == [127, 127, 254]).all()
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_normal_map_tiles_match_whole_image(workers):
+    bump_map = np.random.default_rng(0).integers(
+        0, 256, size=(70, 45), dtype=np.uint8)
+    whole = glu.bump_map_to_normal_map(bump_map, tile_size=100)
+    tiled = glu.bump_map_to_normal_map(bump_map, tile_size=16, workers=workers)
+    np.testing.assert_array_equal(tiled, whole)
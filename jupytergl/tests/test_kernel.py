@@ -0,0 +1,61 @@
+import asyncio
+import types
+
+import pytest
+
+from .. import kernel
+from ..kernel import LoopMonitor, ZMQPolicy, make_loop_policy
+
+
+def test_make_loop_policy_by_name():
+    assert isinstance(make_loop_policy('zmq'), ZMQPolicy)
+    policy = make_loop_policy('asyncio')
+    assert type(policy) is asyncio.DefaultEventLoopPolicy
+
+
+def test_make_loop_policy_from_import_path():
+    policy = make_loop_policy('jupytergl.kernel.ZMQPolicy')
+    assert isinstance(policy, ZMQPolicy)
+
+
+def test_make_loop_policy_auto(monkeypatch):
+    class Policy(asyncio.DefaultEventLoopPolicy):
+        pass
+
+    uvloop = types.SimpleNamespace(EventLoopPolicy=Policy)
+    modules = {}
+
+    def import_module(name):
+        if name not in modules:
+            raise ImportError(name)
+        return modules[name]
+
+    monkeypatch.setattr(kernel, 'import_module', import_module)
+    # Falls back to zmq without uvloop
+    assert isinstance(make_loop_policy('auto'), ZMQPolicy)
+    modules['uvloop'] = uvloop
+    assert isinstance(make_loop_policy('auto'), Policy)
+    assert isinstance(make_loop_policy('uvloop'), Policy)
+
+
+def test_make_loop_policy_unknown():
+    with pytest.raises(ValueError):
+        make_loop_policy('tornado')
+
+
+def test_loop_monitor_samples_lag():
+    async def run():
+        loop = asyncio.get_running_loop()
+        monitor = LoopMonitor(loop, interval=0.01)
+        assert monitor.stats() == dict(samples=0, mean=0., max=0.)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        stats = monitor.stats()
+        assert stats['samples'] > 0
+        assert 0 <= stats['mean'] <= stats['max']
+        handle = monitor._handle
+        monitor.stop()
+        assert handle.cancelled()
+        await asyncio.sleep(0.05)
+        assert len(monitor.samples) == stats['samples']
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ..layout import VertexAttribute, interleave_attributes
+from .frontend import connect
+from .meshes import grid_mesh
+
+
+def test_interleave_round_trip():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-1, 1, (10, 3)).astype(np.float32)
+    normals = positions / np.linalg.norm(positions, axis=1, keepdims=True)
+    coords = rng.uniform(0, 1, (10, 2))
+    data, layout = interleave_attributes(
+        [('position', positions), ('normal', normals), ('uv', coords)],
+        {'normal': 'int8', 'uv': 'uint16'})
+    assert layout.attributes == [
+        VertexAttribute('position', 3, 'FLOAT', False, 0),
+        # 3 bytes, padded to 4
+        VertexAttribute('normal', 3, 'BYTE', True, 12),
+        VertexAttribute('uv', 2, 'UNSIGNED_SHORT', True, 16),
+    ]
+    assert layout.stride == 20
+    assert data.shape == (10, 20) and data.dtype == np.uint8
+
+    def read(name, dtype):
+        attribute = layout[name]
+        size = attribute.size * np.dtype(dtype).itemsize
+        raw = np.ascontiguousarray(
+            data[:, attribute.offset:attribute.offset + size])
+        return raw.view(dtype)
+
+    np.testing.assert_array_equal(read('position', np.float32), positions)
+    np.testing.assert_allclose(read('normal', np.int8) / 127, normals,
+                               atol=1 / 127)
+    np.testing.assert_allclose(read('uv', np.uint16) / 65535, coords,
+                               atol=1 / 65535)
+
+
+def test_interleave_skips_absent_attributes():
+    data, layout = interleave_attributes(
+        [('position', np.zeros((4, 3))), ('normal', None), ('id', np.arange(4))],
+        {'id': 'float32'})
+    assert 'normal' not in layout and 'id' in layout
+    assert layout['id'].size == 1
+    assert layout.stride == 16
+    with pytest.raises(KeyError):
+        layout['normal']
+
+
+def test_interleave_errors():
+    with pytest.raises(ValueError):
+        interleave_attributes([('normal', np.full((2, 3), 2.))],
+                              {'normal': 'int8'})
+    with pytest.raises(ValueError):
+        interleave_attributes([('uv', np.full((2, 2), -0.5))], {'uv': 'uint8'})
+    with pytest.raises(ValueError):
+        interleave_attributes([('a', np.zeros((2, 3)))], {'a': 'float64'})
+    with pytest.raises(ValueError):
+        interleave_attributes([('a', np.zeros((2, 3))), ('b', np.zeros((3, 3)))])
+    with pytest.raises(ValueError):
+        interleave_attributes([('a', None)])
+
+
+def test_layout_bind():
+    async def run():
+        gl, comm = connect()
+        mesh = grid_mesh(3)
+        _, layout = mesh.interleave({'normals': 'int8'})
+        layout.bind(gl, {'vertices': 0, 'normals': 1})
+        await gl._prev_sent
+        assert comm.executed == [
+            ('vertexAttribPointer', [0, 3, gl.FLOAT, False, 24, 0]),
+            ('enableVertexAttribArray', [0]),
+            ('vertexAttribPointer', [1, 3, gl.BYTE, True, 24, 12]),
+            ('enableVertexAttribArray', [1]),
+        ]
+    asyncio.run(run())
@@ -0,0 +1,84 @@
+import asyncio
+
+import numpy as np
+
+from ..fileio.wavefront import Material, Mesh
+from ..lod import cluster_vertices, make_lods, stream_lods
+from .frontend import connect
+from .meshes import grid_mesh
+
+
+def test_cluster_vertices_simplifies():
+    mesh = grid_mesh(33, [Material('a'), Material('b')])
+    simplified = cluster_vertices(mesh, 8)
+    assert 0 < len(simplified.faces) < len(mesh.faces) / 4
+    assert simplified.faces.max() < len(simplified.vertices)
+    # Every vertex is used, and within the bounds of the original
+    assert len(np.unique(simplified.faces)) == len(simplified.vertices)
+    assert (simplified.vertices >= mesh.vertices.min(axis=0) - 1e-6).all()
+    assert (simplified.vertices <= mesh.vertices.max(axis=0) + 1e-6).all()
+    np.testing.assert_allclose(simplified.normals, [[0, 0, 1]] * len(
+        simplified.normals))
+    assert simplified.texture_coords.shape == (len(simplified.vertices), 2)
+    # The draw ranges cover all faces, in order
+    assert set(r.material for r in simplified.draw_ranges) <= {'a', 'b'}
+    starts = [r.start for r in simplified.draw_ranges]
+    ends = [r.start + r.count for r in simplified.draw_ranges]
+    assert starts == [0] + ends[:-1]
+    assert ends[-1] == 3 * len(simplified.faces)
+
+
+def test_cluster_vertices_keeps_opposite_winding():
+    mesh = grid_mesh(5)
+    # Make the mesh two-sided, with a twin of opposite winding per face
+    faces = np.concatenate([mesh.faces, mesh.faces[:, ::-1]])
+    two_sided = Mesh('two sided', len(faces), mesh.materials.values())
+    two_sided.vertices = mesh.vertices
+    two_sided.normals = None
+    two_sided.texture_coords = None
+    two_sided.faces[:] = faces
+    two_sided.sort_by_material(np.zeros(len(faces)))
+    simplified = cluster_vertices(two_sided, 2)
+    rotated = {tuple(np.roll(f, -np.argmin(f))) for f in simplified.faces}
+    assert len(rotated) == len(simplified.faces)
+    assert {tuple(np.roll(f[::-1], -np.argmin(f[::-1])))
+            for f in simplified.faces} == rotated
+
+
+def test_cluster_vertices_empty_mesh():
+    mesh = Mesh('empty', 0, [Material('plain')])
+    mesh.vertices = np.empty((0, 3), np.float32)
+    assert cluster_vertices(mesh, 4) is mesh
+
+
+def test_make_lods_decreasing():
+    mesh = grid_mesh(65)
+    lods = make_lods(mesh, levels=4)
+    assert lods[0] is mesh
+    assert len(lods) > 2
+    counts = [len(lod.faces) for lod in lods]
+    assert counts == sorted(counts, reverse=True)
+    assert len(set(counts)) == len(counts)
+
+
+def test_stream_lods_coarse_to_fine():
+    async def run():
+        gl, comm = connect()
+        lods = make_lods(grid_mesh(33), levels=3)
+        buffer = await gl.createBuffer()
+
+        def upload(gl, mesh):
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            gl.bufferData(gl.ARRAY_BUFFER, mesh.vertices, gl.STATIC_DRAW)
+
+        def draw(gl, mesh):
+            gl.drawArrays(gl.TRIANGLES, 0, len(mesh.vertices))
+
+        await stream_lods(gl, lods, upload, draw)
+        commands = [m['command'] for m in comm.messages
+                    if m['type'] == 'command']
+        assert [c['op'] for c in commands] == (
+            ['orbitView'] + ['updateView'] * (len(lods) - 1))
+        drawn = [c['instructions'][0]['args'][2] for c in commands]
+        assert drawn == [len(lod.vertices) for lod in reversed(lods)]
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import numpy as np
+
+from .frontend import connect
+
+
+def upload(gl, buffer, n):
+    with gl.chunk():
+        gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+        for i in range(n):
+            gl.bufferSubData(gl.ARRAY_BUFFER, 16 * i,
+                             np.full(4, i, dtype=np.float32))
+
+
+def session(offload_threshold):
+    """The messages and instructions of a session, with its packed payloads"""
+    async def run():
+        gl, comm = connect()
+        gl.offload_threshold = offload_threshold
+        # Not resolved yet when the chunk is serialized
+        buffer = gl.createBuffer()
+        upload(gl, buffer, 5)
+        await gl._prev_sent
+        return comm
+    return asyncio.run(run())
+
+
+def test_offloaded_messages_match_inline():
+    inline = session(offload_threshold=10000)
+    offloaded = session(offload_threshold=2)
+    assert offloaded.messages == inline.messages
+    assert [op for op, _ in offloaded.executed] == [
+        op for op, _ in inline.executed]
+    for (_, args), (_, expected) in zip(offloaded.executed, inline.executed):
+        for arg, expected_arg in zip(args, expected):
+            np.testing.assert_array_equal(arg, expected_arg)
+    # Only the large message is packed on the worker thread
+    assert inline.packed == []
+    [packed] = offloaded.packed
+    assert json.loads(packed.decode('utf8')) == offloaded.messages[-1]
+
+
+def test_offloaded_chunk_stays_in_order():
+    async def run():
+        gl, comm = connect()
+        gl.offload_threshold = 50
+        buffer = await gl.createBuffer()
+        upload(gl, buffer, 200)
+        with gl.chunk():
+            gl.clear(1)
+        await gl._prev_sent
+        ops = [op for op, _ in comm.executed]
+        assert ops == ['createBuffer', 'bindBuffer'] + ['bufferSubData'] * 200 + [
+            'clear']
+        assert len(comm.packed) == 1
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ..pointcloud import PointCloud, morton_codes, quantize_colors, stream_points
+from .frontend import connect
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-10, 10, size=(n, 3)).astype(np.float32)
+    colors = rng.uniform(0, 1, size=(n, 3))
+    return positions, colors
+
+
+def test_morton_codes_interleave_bits():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1],
+                          [1, 1, 1]], np.float32)
+    codes = morton_codes(positions)
+    top = np.uint64(2 ** 21 - 1)
+    # The x, y and z cells take the bits 0, 1 and 2 of each triple
+    x = int(morton_codes(np.array([[0, 0, 0], [1, 0, 0]]))[1])
+    assert codes[0] == 0
+    assert (int(codes[2]), int(codes[3])) == (x << 1, x << 2)
+    assert int(codes[4]) == x | x << 1 | x << 2
+    assert x == int(morton_codes(np.array([[0, 0, 0], [top, 0, 0]]))[1])
+    # Blocks do not change the result
+    positions, _ = random_points(100)
+    np.testing.assert_array_equal(morton_codes(positions, block_size=7),
+                                  morton_codes(positions))
+
+
+def test_quantize_colors():
+    np.testing.assert_array_equal(
+        quantize_colors([[0., 0.5, 1.], [2., -1., 0.]]),
+        [[0, 128, 255], [255, 0, 0]])
+    np.testing.assert_array_equal(
+        quantize_colors(np.array([[0, 256, 65535]], np.uint16)), [[0, 1, 255]])
+    rgba = np.arange(8, dtype=np.uint8).reshape(2, 4)
+    np.testing.assert_array_equal(quantize_colors(rgba), rgba[:, :3])
+
+
+@pytest.mark.parametrize('bits', [8, 16])
+def test_chunks_round_trip(bits):
+    positions, colors = random_points(1000)
+    cloud = PointCloud(positions, colors, max_points=300, bits=bits)
+    assert len(cloud) == 4
+    assert sorted(cloud.order) == list(range(1000))
+    decoded = []
+    for i in range(len(cloud)):
+        chunk = cloud.chunk(i)
+        assert len(chunk) <= 300
+        assert chunk.positions.dtype == (np.uint8 if bits == 8 else np.uint16)
+        assert chunk.nbytes == chunk.positions.nbytes + chunk.colors.nbytes
+        max_value = 2 ** bits - 1
+        decoded.append(chunk.offset + chunk.positions / max_value * chunk.scale)
+    decoded = np.concatenate(decoded)
+    expected = positions[cloud.order]
+    step = 20 / (2 ** bits - 1)
+    assert np.abs(decoded - expected).max() <= step
+    # Chunks cover compact regions, roughly the octants of a uniform cloud,
+    # where chunks of points in input order would each span all of it
+    octants = PointCloud(positions, max_points=125)
+    volumes = (octants.upper - octants.lower).prod(axis=1)
+    assert volumes.mean() < 20 ** 3 / 3
+
+
+def test_invalid_bits():
+    positions, _ = random_points(10)
+    with pytest.raises(ValueError):
+        PointCloud(positions, bits=12)
+
+
+def test_priority_nearest_chunk_first():
+    positions, _ = random_points(1000)
+    cloud = PointCloud(positions, max_points=100)
+    priority = cloud.priority(positions[0])
+    assert sorted(priority) == list(range(len(cloud)))
+    first = cloud.order[cloud.bounds[priority[0]]:cloud.bounds[priority[0] + 1]]
+    assert 0 in first
+
+
+def test_stream_points_in_frames():
+    async def run():
+        gl, comm = connect()
+        positions, colors = random_points(1000)
+        cloud = PointCloud(positions, colors, max_points=250)
+        chunk_bytes = cloud.chunk(0).nbytes
+        scene = await stream_points(gl, cloud, bytes_per_frame=2 * chunk_bytes)
+        updates = [m for m in comm.messages if m['type'] == 'sceneUpdate']
+        # Two chunks per frame
+        assert len(updates) == 2
+        uploads = [args[1] for op, args in comm.executed if op == 'bufferData']
+        assert len(uploads) == 2 * len(cloud)
+        assert sum(u.nbytes for u in uploads) == 1000 * (3 * 2 + 3)
+        assert len(scene.root.children[0].children) == len(cloud)
+    asyncio.run(run())
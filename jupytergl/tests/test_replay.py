@@ -0,0 +1,55 @@
+import asyncio
+
+import numpy as np
+
+from ..comm import QueryableComm
+from ..replay import SessionRecorder, read_session, replay_session
+from .frontend import connect
+
+
+def record(filename):
+    async def run():
+        gl, comm = connect()
+        recorder = gl.record(SessionRecorder(filename))
+        buffer = await gl.createBuffer()
+        with gl.chunk():
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            gl.bufferData(gl.ARRAY_BUFFER, np.arange(6, dtype=np.float32),
+                          gl.STATIC_DRAW)
+        await gl.getAttribLocation(buffer, 'position_æøå')
+        gl.stop_recording(recorder).close()
+    asyncio.run(run())
+
+
+def test_session_round_trip(tmp_path):
+    filename = str(tmp_path / 'session.jgls')
+    record(filename)
+    session = read_session(filename)
+    sent = [m for m in session if m['direction'] == 'sent']
+    received = [m for m in session if m['direction'] == 'received']
+    assert [m['data']['type'] for m in sent] == ['query', 'exec', 'query']
+    assert [m['data']['type'] for m in received] == ['queryReply'] * 2
+    assert sent[2]['data']['instructions'][0]['args'][1] == (
+        'position_æøå')
+    [buffer] = sent[1]['buffers']
+    np.testing.assert_array_equal(
+        np.frombuffer(buffer, np.float32), np.arange(6))
+    times = [m['time'] for m in session]
+    assert times == sorted(times)
+
+
+def test_replay_counts_bytes_sent(tmp_path):
+    filename = str(tmp_path / 'session.jgls')
+    record(filename)
+    session = read_session(filename)
+    stats = asyncio.run(replay_session(session))
+    assert stats['queries'] == 2
+    assert stats['missing_replies'] == 0
+    # The replaying JupyterGL also sends its own binding requests
+    assert stats['messages'] == 5
+    sent = [m for m in session if m['direction'] == 'sent']
+    expected = sum(len(QueryableComm.pack(m['data'])) +
+                   sum(len(b) for b in m['buffers']) for m in sent)
+    expected += sum(len(QueryableComm.pack(dict(type=t, target='context')))
+                    for t in ('getConstants', 'getMethods'))
+    assert stats['bytes'] == expected
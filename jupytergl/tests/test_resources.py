@@ -0,0 +1,100 @@
+import asyncio
+import gc
+
+import numpy as np
+import pytest
+
+from ..resources import ResourceManager
+from .frontend import connect
+
+
+class Owner:
+    pass
+
+
+async def settle(gl):
+    """Let finalizers and pending sends run"""
+    gc.collect()
+    await asyncio.sleep(0)
+    await gl._prev_sent
+    await asyncio.sleep(0)
+
+
+def deleted(comm):
+    return [args[0] for op, args in comm.executed if op.startswith('delete')]
+
+
+def test_resource_deleted_with_owner():
+    async def run():
+        gl, comm = connect()
+        manager = ResourceManager(gl)
+        buffer = manager.create_buffer(np.zeros(10, np.float32))
+        handle = await buffer.handle
+        assert buffer.resident and buffer.nbytes == 40
+        owner = Owner()
+        other = manager.create_buffer(np.zeros(10, np.float32), owner=owner)
+        del buffer
+        await settle(gl)
+        assert deleted(comm) == [handle]
+        assert handle not in comm.variables
+        assert len(manager) == 1
+        del owner
+        await settle(gl)
+        assert len(manager) == 0
+        assert other.handle is None
+    asyncio.run(run())
+
+
+def test_budget_evicts_least_recently_used():
+    async def run():
+        gl, comm = connect()
+        manager = ResourceManager(gl, budget=1000)
+        buffers = [manager.create_buffer(np.zeros(100, np.float32))
+                   for _ in range(3)]
+        # The first was evicted to make room for the third
+        assert [b.resident for b in buffers] == [False, True, True]
+        assert manager.total_bytes == 800
+        manager.use(buffers[0])
+        assert [b.resident for b in buffers] == [True, False, True]
+        await settle(gl)
+        uploads = [op for op, _ in comm.executed if op == 'bufferData']
+        assert len(uploads) == 4
+        assert len(deleted(comm)) == 2
+    asyncio.run(run())
+
+
+def test_programs_are_not_evicted():
+    async def run():
+        gl, comm = connect()
+        manager = ResourceManager(gl)
+        program = manager.create_program('void main() {}', 'void main() {}')
+        assert program.kind == 'program'
+        with pytest.raises(ValueError):
+            manager.evict(program)
+        await settle(gl)
+    asyncio.run(run())
+
+
+def test_pinned_resources_outlive_owners():
+    async def run():
+        gl, comm = connect()
+        manager = ResourceManager(gl, budget=0)
+        buffer = manager.create_buffer(np.zeros(10, np.float32))
+        handle = await manager.use(buffer)
+        with gl.orbitView():
+            gl.bindBuffer(gl.ARRAY_BUFFER, manager.use(buffer))
+            gl.drawArrays(gl.TRIANGLES, 0, 3)
+        with pytest.raises(ValueError):
+            manager.evict(buffer)
+        with pytest.raises(ValueError):
+            gl.release(handle)
+        del buffer
+        await settle(gl)
+        assert deleted(comm) == []
+        # Once the view no longer uses it, the orphan is deleted
+        with gl.updateView():
+            gl.drawArrays(gl.TRIANGLES, 0, 3)
+        await settle(gl)
+        assert deleted(comm) == [handle]
+        assert len(manager) == 0
+    asyncio.run(run())
@@ -0,0 +1,130 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ..scene import Material, Mesh, Scene, Transform, Uniform
+from .frontend import connect
+
+
+def updates(comm):
+    return [m for m in comm.messages if m['type'] == 'sceneUpdate']
+
+
+def draw_arrays(count):
+    def draw(gl):
+        gl.drawArrays(gl.TRIANGLES, 0, count)
+    return draw
+
+
+def make_scene(gl, comm):
+    # Stand-ins for the handles of a program and its uniform locations
+    for key in ('key100', 'key101', 'key102', 'key103', 'key104'):
+        comm.variables[key] = 'getUniformLocation'
+    scene = Scene(gl, model_location='key100')
+    material = scene.add(Material('key101', {'key102': ('uniform1f', (0.5,))}))
+    group = material.add(Transform())
+    meshes = [group.add(Mesh(draw_arrays(3))), group.add(Mesh(draw_arrays(6)))]
+    return scene, material, group, meshes
+
+
+def test_first_update_sends_all_slots():
+    async def run():
+        gl, comm = connect()
+        scene, material, group, meshes = make_scene(gl, comm)
+        await scene.update()
+        [update] = updates(comm)
+        keys = ['%s.material' % material.key] + [
+            '%s.%s' % (mesh.key, name) for mesh in meshes
+            for name in ('model', 'draw')]
+        assert update['order'] == keys
+        assert sorted(key for key, _ in update['slots']) == sorted(keys)
+        assert update['removed'] == []
+    asyncio.run(run())
+
+
+def test_update_sends_only_changed_slots():
+    async def run():
+        gl, comm = connect()
+        scene, material, group, meshes = make_scene(gl, comm)
+        await scene.update()
+        # Nothing changed
+        await scene.update()
+        assert len(updates(comm)) == 1
+        # Setting the same values does not send anything either
+        material.set_uniform('key102', 'uniform1f', 0.5)
+        group.matrix = np.eye(4)
+        await scene.update()
+        assert len(updates(comm)) == 1
+
+        meshes[1].matrix = np.diag([2, 2, 2, 1])
+        await scene.update()
+        update = updates(comm)[-1]
+        assert update['order'] is None
+        [(key, [instruction])] = update['slots']
+        assert key == '%s.model' % meshes[1].key
+        assert instruction['op'] == 'uniformMatrix4fv'
+        # The matrix is sent as a binary buffer
+        [(op, args)] = comm.scene_slots[key]
+        np.testing.assert_array_equal(
+            args[2].reshape(4, 4), np.diag([2, 2, 2, 1]))
+
+        group.matrix = np.diag([1, 1, 1, 1]) + np.eye(4, k=3)
+        await scene.update()
+        keys = sorted(key for key, _ in updates(comm)[-1]['slots'])
+        assert keys == sorted('%s.model' % mesh.key for mesh in meshes)
+    asyncio.run(run())
+
+
+def test_remove_and_append_nodes():
+    async def run():
+        gl, comm = connect()
+        scene, material, group, meshes = make_scene(gl, comm)
+        await scene.update()
+        # Added at the end of the order, only appended
+        mesh = group.add(Mesh(draw_arrays(9)))
+        await scene.update()
+        update = updates(comm)[-1]
+        assert update['order'] is None
+        assert update['append'] == ['%s.model' % mesh.key, '%s.draw' % mesh.key]
+        # Removed, so the order is resent
+        group.remove(meshes[0])
+        await scene.update()
+        update = updates(comm)[-1]
+        assert update['removed'] == ['%s.model' % meshes[0].key,
+                                     '%s.draw' % meshes[0].key]
+        assert '%s.draw' % meshes[0].key not in update['order']
+        assert update['slots'] == []
+        # Inserted before existing nodes, so the order is resent
+        last = scene.add(Uniform('key103', 'uniform1f', 1.0))
+        await scene.update()
+        assert updates(comm)[-1]['append'] == ['%s.uniform' % last.key]
+        uniform = group.add(Uniform('key104', 'uniform1f', 2.0))
+        await scene.update()
+        update = updates(comm)[-1]
+        assert update['order'][-2:] == ['%s.uniform' % uniform.key,
+                                        '%s.uniform' % last.key]
+        assert sorted(comm.scene_slots) == sorted(update['order'])
+    asyncio.run(run())
+
+
+def test_scene_pins_its_handles():
+    async def run():
+        gl, comm = connect()
+        buffer = await gl.createBuffer()
+
+        def draw(gl):
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            gl.drawArrays(gl.TRIANGLES, 0, 3)
+
+        scene = Scene(gl)
+        mesh = scene.add(Mesh(draw))
+        await scene.update()
+        with pytest.raises(ValueError):
+            gl.release(buffer)
+        scene.remove(mesh)
+        await scene.update()
+        gl.release(buffer)
+        await gl._prev_sent
+        assert buffer not in comm.variables
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+
+from ..scene import Mesh, Scene
+from .frontend import connect
+
+
+def clears(comm):
+    return [args[0] for op, args in comm.executed if op == 'clear']
+
+
+def test_worker_chunks_in_submission_order():
+    async def run():
+        gl, comm = connect()
+
+        def work(first):
+            for i in range(first, first + 3):
+                with gl.chunk():
+                    gl.clear(i)
+
+        gl.clear(0)
+        await asyncio.to_thread(work, 1)
+        with gl.chunk():
+            gl.clear(4)
+        await asyncio.to_thread(work, 5)
+        gl.clear(8)
+        await gl._prev_sent
+        assert clears(comm) == list(range(9))
+    asyncio.run(run())
+
+
+def test_worker_query_returns_concurrent_future():
+    async def run():
+        gl, comm = connect()
+
+        def work():
+            buffer = gl.createBuffer()
+            assert isinstance(buffer, concurrent.futures.Future)
+            # The future can be used as an argument before it resolves
+            with gl.chunk():
+                gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            [program, shader] = gl.query_all(
+                [('createProgram', ()), ('createShader', (gl.VERTEX_SHADER,))]
+            ).result(timeout=1)
+            return buffer.result(timeout=1), program, shader
+
+        buffer, program, shader = await asyncio.to_thread(work)
+        await gl._prev_sent
+        assert comm.variables[buffer] == 'createBuffer'
+        assert comm.variables[program] == 'createProgram'
+        assert comm.variables[shader] == 'createShader'
+        assert ('bindBuffer', [gl.ARRAY_BUFFER, buffer]) in comm.executed
+    asyncio.run(run())
+
+
+def test_worker_chunk_parts_are_atomic():
+    async def run():
+        gl, comm = connect()
+        loop = asyncio.get_running_loop()
+
+        async def interrupt():
+            gl.branch().exec_('clear', [9])
+            await gl._prev_sent
+
+        def work():
+            with gl.chunk(max_instructions=1):
+                gl.clear(1)
+                # A part is sent when the next call is made, which returns
+                # once it has been sent
+                gl.clear(2)
+                parts = [m for m in comm.messages if m.get('more')]
+                assert len(parts) == 1
+                asyncio.run_coroutine_threadsafe(interrupt(), loop).result(1)
+                gl.clear(3)
+                assert clears(comm) == []
+
+        await asyncio.to_thread(work)
+        await gl._prev_sent
+        assert clears(comm) == [1, 2, 3, 9]
+    asyncio.run(run())
+
+
+def test_scene_update_from_worker():
+    async def run():
+        gl, comm = connect()
+
+        def draw(gl):
+            gl.clear(7)
+
+        def work():
+            scene = Scene(gl)
+            scene.add(Mesh(draw))
+            update = scene.update()
+            assert isinstance(update, concurrent.futures.Future)
+            update.result(timeout=1)
+            # Nothing changed
+            scene.update().result(timeout=1)
+            return scene
+
+        scene = await asyncio.to_thread(work)
+        assert len([m for m in comm.messages
+                    if m['type'] == 'sceneUpdate']) == 1
+        [mesh] = scene.root.children
+        assert comm.scene_slots['%s.draw' % mesh.key] == [('clear', [7])]
+    asyncio.run(run())
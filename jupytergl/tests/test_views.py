@@ -0,0 +1,79 @@
+import asyncio
+
+from ..comm import QueryableComm
+from .frontend import FrontendComm, connect
+
+
+def connect_views(n_views):
+    gl, comm = connect()
+    views = [gl.add_view(FrontendComm()) for _ in range(n_views)]
+    return gl, [comm] + views
+
+
+def test_messages_are_packed_once(monkeypatch):
+    calls = []
+    pack = QueryableComm.pack
+
+    def counting_pack(data):
+        calls.append(data)
+        return pack(data)
+
+    monkeypatch.setattr(QueryableComm, 'pack', staticmethod(counting_pack))
+
+    async def run():
+        gl, comms = connect_views(2)
+        with gl.chunk():
+            gl.clear(1)
+        gl.clear(2)
+        await gl._prev_sent
+        assert len(calls) == 2
+        for comm in comms:
+            assert [args for _, args in comm.executed] == [[1], [2]]
+            # The same payload, not an equal copy
+            assert all(a is b for a, b in zip(comm.packed, comms[0].packed))
+    asyncio.run(run())
+
+
+def test_views_allocate_the_same_handles():
+    async def run():
+        gl, comms = connect_views(2)
+        buffer = await gl.createBuffer()
+        program = gl.createProgram()
+        with gl.chunk():
+            gl.bindBuffer(gl.ARRAY_BUFFER, buffer)
+            gl.useProgram(program)
+        await gl._prev_sent
+        for comm in comms:
+            assert comm.variables == comms[0].variables
+            assert comm.executed == comms[0].executed
+        assert ('useProgram', [program.result()]) in comms[1].executed
+    asyncio.run(run())
+
+
+def test_view_state_reaches_one_view():
+    async def run():
+        gl, (comm, view) = connect_views(1)
+        camera = dict(position=[0, 0, 5], fov=30)
+        gl.set_view_state(view, camera=camera)
+        gl.set_view_state(comm, viewport=[0, 0, 100, 100])
+        await gl._prev_sent
+        assert view.commands == [('viewState', [camera, None], [])]
+        assert comm.commands == [
+            ('viewState', [None, [0, 0, 100, 100]], [])]
+    asyncio.run(run())
+
+
+def test_remove_view():
+    async def run():
+        gl, (comm, view) = connect_views(1)
+        gl.clear(1)
+        await gl._prev_sent
+        gl.remove_view(view)
+        assert view.closed
+        gl.clear(2)
+        await gl._prev_sent
+        assert [args for _, args in comm.executed] == [[1], [2]]
+        assert [args for _, args in view.executed] == [[1]]
+        # Sent directly, as there is a single comm left
+        assert len(comm.packed) == 1
+    asyncio.run(run())
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from ..fileio.wavefront import DrawRange, load_obj
+
+
+MTL = """
+newmtl red
+Kd 1 0 0
+newmtl blue
+Kd 0 0 1
+"""
+
+# A strip of four quads, alternating between two materials
+OBJ = """
+mtllib materials.mtl
+o strip
+v 0 0 0
+v 0 1 0
+v 1 0 0
+v 1 1 0
+v 2 0 0
+v 2 1 0
+v 3 0 0
+v 3 1 0
+v 4 0 0
+v 4 1 0
+usemtl red
+f 1 3 4 2
+usemtl blue
+f 3 5 6 4
+usemtl red
+f 5 7 8 6
+usemtl blue
+f 7 9 10 8
+"""
+
+
+@pytest.fixture
+def obj_file(tmp_path):
+    (tmp_path / 'materials.mtl').write_text(MTL)
+    path = tmp_path / 'strip.obj'
+    path.write_text(OBJ)
+    return str(path)
+
+
+def test_faces_sorted_into_draw_ranges(obj_file):
+    [mesh] = load_obj(obj_file)
+    assert mesh.name == 'strip'
+    assert list(mesh.materials) == ['red', 'blue']
+    assert mesh.draw_ranges == [DrawRange('red', 0, 12),
+                                DrawRange('blue', 12, 12)]
+    np.testing.assert_array_equal(mesh.face_materials(), [0] * 4 + [1] * 4)
+    # The faces of each material keep their order
+    x = mesh.vertices[mesh.faces, 0].min(axis=1)
+    np.testing.assert_array_equal(x, [0, 0, 2, 2, 1, 1, 3, 3])
+
+
+def test_missing_attributes(obj_file):
+    [mesh] = load_obj(obj_file)
+    assert mesh.texture_coords is None
+    # Normals are computed from the geometry
+    np.testing.assert_allclose(np.abs(mesh.normals[:, 2]), 1)
+
+
+def test_optimize_keeps_draw_ranges(obj_file):
+    [mesh] = load_obj(obj_file)
+    triangles = {tuple(sorted(map(tuple, t)))
+                 for t in mesh.vertices[mesh.faces].tolist()}
+    ids = mesh.face_materials()
+    [optimized] = load_obj(obj_file, optimize=True)
+    assert optimized.draw_ranges == mesh.draw_ranges
+    np.testing.assert_array_equal(optimized.face_materials(), ids)
+    assert {tuple(sorted(map(tuple, t)))
+            for t in optimized.vertices[optimized.faces].tolist()} == triangles
+    # Vertices are numbered in order of first use
+    first_use = np.unique(optimized.faces.ravel(), return_index=True)[1]
+    assert (np.diff(first_use) > 0).all()
+
+
+def test_load_interleaved(obj_file):
+    [mesh] = load_obj(obj_file, interleave={'normals': 'int8'})
+    # No texture coordinates in the file
+    assert [a.name for a in mesh.layout.attributes] == ['vertices', 'normals']
+    assert mesh.vertex_data.shape == (len(mesh.vertices), 16)
+    np.testing.assert_array_equal(
+        np.ascontiguousarray(mesh.vertex_data[:, :12]).view(np.float32),
+        mesh.vertices)
+
+
+def test_computed_normals_smooth_across_texture_seams(tmp_path):
+    # A ridge of two faces at right angles, and a third face beyond it.
+    # The texture coordinates split the ridge vertices into two copies.
+    path = tmp_path / 'seam.obj'
+    path.write_text("""
+v 0 0 0
+v 1 0 0
+v 0 1 0
+v 1 1 0
+v 2 0 -1
+vt 0 0
+vt 1 0
+vt 0 1
+vt 1 1
+vt 0.5 0.5
+f 1/1 2/2 4/4
+f 1/1 4/4 3/3
+f 2/5 5/5 4/5
+""")
+    [mesh] = load_obj(str(path))
+    ridge = np.flatnonzero((mesh.vertices == [1, 0, 0]).all(axis=1))
+    assert len(ridge) == 2
+    np.testing.assert_allclose(mesh.normals[ridge[0]], mesh.normals[ridge[1]])
+    # Between the normals of the faces on both sides
+    assert mesh.normals[ridge[0]][0] > 0 and mesh.normals[ridge[0]][2] > 0
@@ -0,0 +1,204 @@
+
+/**
+ * The keyframes of a value (see `jupytergl.animation`).
+ */
+export
+interface ITrack {
+  times: Float32Array;
+  values: Float32Array;
+  size: number;
+  interpolation: 'step' | 'linear' | 'cubic';
+}
+
+
+/**
+ * A track of a uniform of a program.
+ */
+export
+interface IUniformTrack extends ITrack {
+  kind: 'uniform';
+  program: WebGLProgram;
+  location: WebGLUniformLocation;
+  method: string;
+}
+
+
+/**
+ * A track of a camera parameter of the orbit view.
+ */
+export
+interface ICameraTrack extends ITrack {
+  kind: 'camera';
+  parameter: 'position' | 'target' | 'fov';
+}
+
+
+export
+type AnimationTrack = IUniformTrack | ICameraTrack;
+
+
+/**
+ * Build a track from the expanded arguments of a track instruction.
+ */
+export
+function makeTrack(op: string, args: any[]): AnimationTrack {
+  if (op === 'uniform') {
+    let [program, location, method, times, values, size, interpolation] = args;
+    return {kind: 'uniform', program, location, method, times, values, size, interpolation};
+  } else if (op === 'camera') {
+    let [parameter, times, values, size, interpolation] = args;
+    return {kind: 'camera', parameter, times, values, size, interpolation};
+  }
+  throw new TypeError('Unknown animation track: ' + op);
+}
+
+
+/**
+ * Finite difference tangent of component i at keyframe k.
+ */
+function tangent(track: ITrack, k: number, i: number): number {
+  let {times, values, size} = track;
+  let before = Math.max(k - 1, 0);
+  let after = Math.min(k + 1, times.length - 1);
+  let dt = times[after] - times[before];
+  if (dt <= 0) {
+    return 0;
+  }
+  return (values[after * size + i] - values[before * size + i]) / dt;
+}
+
+
+/**
+ * Interpolate the value of a track at a time, into `out`.
+ */
+export
+function sampleTrack(track: ITrack, time: number, out: Float32Array): Float32Array {
+  let {times, values, size} = track;
+  let last = times.length - 1;
+  if (time <= times[0] || time >= times[last]) {
+    let k = time <= times[0] ? 0 : last;
+    out.set(values.subarray(k * size, (k + 1) * size));
+    return out;
+  }
+  // Binary search for the keyframe before the time
+  let lo = 0;
+  let hi = last;
+  while (hi - lo > 1) {
+    let mid = (lo + hi) >> 1;
+    if (times[mid] <= time) {
+      lo = mid;
+    } else {
+      hi = mid;
+    }
+  }
+  let k = lo;
+  if (track.interpolation === 'step') {
+    out.set(values.subarray(k * size, (k + 1) * size));
+    return out;
+  }
+  let h = times[k + 1] - times[k];
+  let s = h > 0 ? (time - times[k]) / h : 0;
+  for (let i = 0; i < size; ++i) {
+    let p0 = values[k * size + i];
+    let p1 = values[(k + 1) * size + i];
+    if (track.interpolation === 'linear') {
+      out[i] = p0 + s * (p1 - p0);
+    } else {
+      let s2 = s * s;
+      let s3 = s2 * s;
+      out[i] = (2 * s3 - 3 * s2 + 1) * p0 +
+        (s3 - 2 * s2 + s) * h * tangent(track, k, i) +
+        (-2 * s3 + 3 * s2) * p1 +
+        (s3 - s2) * h * tangent(track, k + 1, i);
+    }
+  }
+  return out;
+}
+
+
+/**
+ * A set of tracks played together, on the clock of the frontend.
+ *
+ * Times are in seconds of animation time, and `now` in milliseconds as
+ * given to `requestAnimationFrame` callbacks.
+ */
+export
+class KeyframeAnimation {
+  constructor(tracks: AnimationTrack[], loop: boolean) {
+    this.tracks = tracks;
+    this.loop = loop;
+    this.duration = 0;
+    for (let track of tracks) {
+      this.duration = Math.max(this.duration, track.times[track.times.length - 1]);
+    }
+    this.samples = tracks.map(track => new Float32Array(track.size));
+  }
+
+  get playing(): boolean {
+    return this._playing;
+  }
+
+  /**
+   * The animation time at a given clock time.
+   */
+  time(now: number): number {
+    let time = this._offset;
+    if (this._playing) {
+      time += this._speed * (now - this._origin) / 1000;
+    }
+    if (this.loop && this.duration > 0) {
+      time = time % this.duration;
+      return time < 0 ? time + this.duration : time;
+    }
+    return Math.min(Math.max(time, 0), this.duration);
+  }
+
+  /**
+   * Whether a non-looping animation has played to its end.
+   */
+  finished(now: number): boolean {
+    return !this.loop && this._playing && (
+      this._speed >= 0 ? this.time(now) >= this.duration : this.time(now) <= 0);
+  }
+
+  play(now: number, speed: number) {
+    this._offset = this.time(now);
+    if (!this.loop && this._offset >= this.duration && speed >= 0) {
+      // Play a finished animation again from the start
+      this._offset = 0;
+    }
+    this._origin = now;
+    this._speed = speed;
+    this._playing = true;
+  }
+
+  pause(now: number) {
+    this._offset = this.time(now);
+    this._playing = false;
+  }
+
+  seek(now: number, time: number) {
+    this._offset = time;
+    this._origin = now;
+  }
+
+  /**
+   * Sample all tracks at a clock time, into `samples`.
+   */
+  sample(now: number): void {
+    let time = this.time(now);
+    for (let i = 0; i < this.tracks.length; ++i) {
+      sampleTrack(this.tracks[i], time, this.samples[i]);
+    }
+  }
+
+  readonly tracks: AnimationTrack[];
+  readonly loop: boolean;
+  readonly duration: number;
+  readonly samples: Float32Array[];
+
+  private _playing = false;
+  private _speed = 1;
+  private _origin = 0;
+  private _offset = 0;
+}
@@ -0,0 +1,76 @@
+
+import {
+  IMessage
+} from './comm';
+
+
+/**
+ * A message of a bundle, with its binary buffers.
+ */
+export
+interface IBundleMessage {
+  data: IMessage;
+  buffers: ArrayBufferView[];
+}
+
+
+const MAGIC = 'JGLB';
+const VERSION = 1;
+const PREFIX_SIZE = 12;
+
+
+function decodeUTF8(bytes: Uint8Array): string {
+  let chars: string[] = [];
+  // Convert in chunks, to avoid overflowing the argument stack
+  for (let i = 0; i < bytes.length; i += 8192) {
+    chars.push(String.fromCharCode.apply(
+      null, bytes.subarray(i, i + 8192) as any));
+  }
+  return decodeURIComponent(escape(chars.join('')));
+}
+
+
+/**
+ * Decode a bundle exported by the kernel (see `jupytergl.bundle`).
+ *
+ * The buffers of the messages are views into `bundle`.
+ */
+export
+function decodeBundle(bundle: ArrayBuffer): IBundleMessage[] {
+  let view = new DataView(bundle);
+  let magic = String.fromCharCode(
+    view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+  if (magic !== MAGIC) {
+    throw new Error('Not a JupyterGL bundle');
+  }
+  let version = view.getUint32(4, true);
+  if (version !== VERSION) {
+    throw new Error('Unsupported JupyterGL bundle version: ' + version);
+  }
+  let headerLength = view.getUint32(8, true);
+  let header = JSON.parse(decodeUTF8(
+    new Uint8Array(bundle, PREFIX_SIZE, headerLength)));
+  let messages: IBundleMessage[] = [];
+  for (let entry of header.messages) {
+    let buffers: ArrayBufferView[] = [];
+    for (let [offset, length] of entry.buffers) {
+      buffers.push(new Uint8Array(bundle, offset, length));
+    }
+    messages.push({data: entry.data, buffers});
+  }
+  return messages;
+}
+
+
+/**
+ * Decode a base64 encoded bundle, as embedded in notebook outputs.
+ */
+export
+function decodeBase64Bundle(encoded: string): IBundleMessage[] {
+  let raw = atob(encoded);
+  let bytes = new Uint8Array(raw.length);
+  for (let i = 0; i < raw.length; ++i) {
+    bytes[i] = raw.charCodeAt(i);
+  }
+  return decodeBundle(bytes.buffer);
+}
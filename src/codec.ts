@@ -0,0 +1,95 @@
+
+import {
+  JSONObject
+} from './json';
+
+
+/**
+ * The description of an encoded argument (see `jupytergl.codec`).
+ */
+export
+interface IEncodedArg extends JSONObject {
+  decode: 'quantized' | 'octahedral' | 'delta';
+  data: string;
+}
+
+
+/**
+ * Dequantize values within a bounding box: offset + q * step.
+ */
+function decodeQuantized(spec: JSONObject, data: ArrayLike<number>): Float32Array {
+  let size = spec.size as number;
+  let offset = spec.offset as number[];
+  let step = spec.step as number[];
+  let out = new Float32Array(data.length);
+  for (let i = 0; i < data.length; ++i) {
+    let axis = i % size;
+    out[i] = offset[axis] + data[i] * step[axis];
+  }
+  return out;
+}
+
+
+/**
+ * Decode octahedral encoded normals into unit vectors.
+ */
+function decodeOctahedral(spec: JSONObject, data: ArrayLike<number>): Float32Array {
+  let maxValue = Math.pow(2, (spec.bits as number) - 1) - 1;
+  let n = data.length / 2;
+  let out = new Float32Array(3 * n);
+  for (let i = 0; i < n; ++i) {
+    let x = data[2 * i] / maxValue;
+    let y = data[2 * i + 1] / maxValue;
+    let z = 1 - Math.abs(x) - Math.abs(y);
+    let t = Math.max(-z, 0);
+    x += x >= 0 ? -t : t;
+    y += y >= 0 ? -t : t;
+    let length = Math.sqrt(x * x + y * y + z * z);
+    out[3 * i] = x / length;
+    out[3 * i + 1] = y / length;
+    out[3 * i + 2] = z / length;
+  }
+  return out;
+}
+
+
+/**
+ * Decode varint, zigzag and delta encoded indices.
+ */
+function decodeDelta(spec: JSONObject, data: ArrayLike<number>): Uint16Array | Uint32Array {
+  let count = spec.count as number;
+  let out = spec.type === 'uint16' ? new Uint16Array(count) : new Uint32Array(count);
+  let previous = 0;
+  let pos = 0;
+  for (let i = 0; i < count; ++i) {
+    // Arithmetic instead of bitwise operators, to stay exact above 32 bits
+    let value = 0;
+    let scale = 1;
+    let byte: number;
+    do {
+      byte = data[pos++];
+      value += (byte & 0x7f) * scale;
+      scale *= 128;
+    } while (byte & 0x80);
+    let delta = value % 2 ? -(value + 1) / 2 : value / 2;
+    previous += delta;
+    out[i] = previous;
+  }
+  return out;
+}
+
+
+/**
+ * Decode an encoded argument, given the typed array of its data.
+ */
+export
+function decodeArg(spec: IEncodedArg, data: ArrayLike<number>): ArrayBufferView {
+  if (spec.decode === 'quantized') {
+    return decodeQuantized(spec, data);
+  } else if (spec.decode === 'octahedral') {
+    return decodeOctahedral(spec, data);
+  } else if (spec.decode === 'delta') {
+    return decodeDelta(spec, data);
+  }
+  throw new TypeError('Unknown encoding: ' + spec.decode);
+}
@@ -67,8 +67,11 @@ function startCommListen(kernel: Kernel.IKernel,
 
 export
 interface IInstructionMessage extends JSONObject {
-  type: 'exec' | 'query';
+  type: 'exec' | 'query' | 'queryAll';
   instructions: IInstruction[];
+  chunk?: number;
+  more?: boolean;
+  abort?: boolean;
 }
 
 export
@@ -109,7 +112,7 @@ interface IQueryError extends JSONObject {
 
 export
 interface ICommand extends JSONObject {
-  op: 'orbitView';
+  op: 'orbitView' | 'updateView' | 'viewState' | 'animation' | 'animationControl';
   args: JSONValue[];
   instructions: IInstruction[];
 }
@@ -120,6 +123,29 @@ interface ICommandMessage extends JSONObject {
   command: ICommand;
 }
 
+export
+interface IContextAttributesMessage extends JSONObject {
+  type: 'contextAttributes';
+  attributes: {
+    preserveDrawingBuffer?: boolean;
+  };
+}
+
+export
+interface IReleaseMessage extends JSONObject {
+  type: 'release';
+  keys: string[];
+}
+
+export
+interface ISceneUpdateMessage extends JSONObject {
+  type: 'sceneUpdate';
+  slots: [string, IInstruction[]][];
+  removed: string[];
+  order: string[] | null;
+  append?: string[] | null;
+}
+
 export
 type IInspectReply = IConstantsReply | IMethodsReply;
 
@@ -127,5 +153,5 @@ export
 type IReply = IInspectReply;
 
 export
-type IMessage = IInstructionMessage | IInspectMessage | ICommandMessage;
+type IMessage = IInstructionMessage | IInspectMessage | ICommandMessage | IContextAttributesMessage | IReleaseMessage | ISceneUpdateMessage;
 
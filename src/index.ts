@@ -10,19 +10,35 @@ import {
 
 import {
   IMessage, IReply, IConstantsReply, IMethodsReply, IQueryReply, IQueryError,
-  ICommand
+  ICommand, ISceneUpdateMessage
 } from './comm';
 
 import {
-  threeOrbit, ThreeOrbitView
+  threeOrbit, ThreeOrbitView, ICameraState, IViewState
 } from './views';
 
+import {
+  IBundleMessage, decodeBundle
+} from './bundle';
+
+import {
+  IEncodedArg, decodeArg
+} from './codec';
+
+import {
+  AnimationTrack, KeyframeAnimation, makeTrack
+} from './animation';
+
 
 // Re-export:
 export {
   startCommListen
 } from './comm';
 
+export {
+  IBundleMessage, decodeBundle, decodeBase64Bundle
+} from './bundle';
+
 
 function availableMethods(gl: WebGLRenderingContext): string[] {
   let ret: string[] = [];
@@ -58,10 +74,30 @@ interface IInstruction extends JSONObject {
 }
 
 
+/**
+ * An instruction whose arguments have been expanded (see `expandArgs`).
+ */
+export
+interface IExpandedInstruction {
+  op: string;
+  args: any[];
+}
+
+
 export
 type Buffer = ArrayBuffer | ArrayBufferView;
 
 
+/**
+ * A message held back until the chunk being received is complete.
+ */
+interface IQueuedMessage {
+  data: IMessage;
+  buffers: Buffer[];
+  send: (reply: JSONObject, buffers?: ArrayBuffer[]) => void;
+}
+
+
 type BufferTypeKey =   'uint8' | 'int8' | 'uint8C' | 'int16' | 'uint16' | 'int32' | 'uint32' | 'float32' | 'float64';
 const bufferViewMap = {
   'uint8': Uint8Array,
@@ -90,7 +126,9 @@ class Context {
     if (this._context === null) {
       let canvas = document.createElement('canvas');
       this.parentNode.appendChild(canvas);
-      let context = canvas.getContext('webgl') || canvas.getContext('experimental-webgl');
+      let attributes = this._contextAttributes;
+      let context = canvas.getContext('webgl', attributes) ||
+        canvas.getContext('experimental-webgl', attributes);
       if (context === null) {
         throw TypeError('Could not get WebGL context for canvas!');
       }
@@ -111,19 +149,81 @@ class Context {
 
 
   handleMessage(comm: Kernel.IComm, message: KernelMessage.ICommMsgMsg): void {
-    let data = message.content.data as IMessage;
+    this.handleData(message.content.data as IMessage, message.buffers, (reply, buffers) => {
+      comm.send(reply, message.metadata, buffers);
+    });
+  }
+
+
+  /**
+   * Replay a bundle recorded by the kernel, without any kernel.
+   */
+  replayBundle(bundle: ArrayBuffer | IBundleMessage[]): void {
+    let messages = bundle instanceof ArrayBuffer ? decodeBundle(bundle) : bundle;
+    for (let message of messages) {
+      // Queries are still run, as they create the referenced objects
+      this.handleData(message.data, message.buffers, () => {});
+    }
+  }
+
+
+  protected handleData(data: IMessage, buffers: Buffer[], send: (reply: JSONObject, buffers?: ArrayBuffer[]) => void): void {
+    if (this._pendingChunk !== null &&
+        !(data.type === 'exec' && data.chunk === this._pendingChunk) &&
+        (data.type === 'exec' || data.type === 'command' ||
+         data.type === 'sceneUpdate')) {
+      // Other executions (e.g. from coroutines or other threads) wait until
+      // the chunk being received is complete, so that it stays atomic.
+      // Queries and releases are handled right away, as the rest of the
+      // chunk may be waiting for the handles they resolve.
+      this._queuedMessages.push({data, buffers, send});
+      return;
+    }
     if (data.type === 'exec') {
       let instructions = data.instructions;
-      this.messageBufferContext(message.buffers, () => {
-        this.execMessage(this.context, instructions);
-      });
-    } else if (data.type === 'query') {
+      if (data.chunk !== undefined) {
+        // A part of a chunk that was sent in parts. Keep the parts (with
+        // their buffers), and execute them all with the last one.
+        if (data.abort) {
+          // The kernel failed to build the rest of the chunk
+          this._pendingParts = [];
+          this._pendingChunk = null;
+          this.handleQueuedMessages();
+          return;
+        }
+        this._pendingChunk = data.chunk;
+        this.messageBufferContext(buffers, () => {
+          for (let instruction of instructions) {
+            this._pendingParts.push(this.expandInstruction(instruction));
+          }
+        });
+        if (!data.more) {
+          let parts = this._pendingParts;
+          this._pendingParts = [];
+          this._pendingChunk = null;
+          this.execExpanded(this.context, parts);
+          this.handleQueuedMessages();
+        }
+      } else {
+        this.messageBufferContext(buffers, () => {
+          this.execMessage(this.context, instructions);
+        });
+      }
+    } else if (data.type === 'query' || data.type === 'queryAll') {
       let instructions = data.instructions;
-      this.messageBufferContext(message.buffers, () => {
+      let all = data.type === 'queryAll';
+      this.messageBufferContext(buffers, () => {
         let result : any;
         let reply: IQueryReply | IQueryError;
+        // Arrays allocated for the query, sent back as binary buffers
+        let outputs: ArrayBufferView[] = [];
+        this._currentOutputs = outputs;
         try {
-          result = this.queryMessage(this.context, instructions);
+          if (all) {
+            result = this.queryAllMessage(this.context, instructions);
+          } else {
+            result = this.queryMessage(this.context, instructions);
+          }
           reply = {
             type: 'queryReply',
             data: result
@@ -139,8 +239,10 @@ class Context {
           } else {
             throw e;
           }
+        } finally {
+          this._currentOutputs = null;
         }
-        comm.send(reply, message.metadata)
+        send(reply, outputs.map(output => output.buffer));
       });
     } else if (data.type === 'getConstants' || data.type === 'getMethods') {
       if (data.target === 'context') {
@@ -160,22 +262,231 @@ class Context {
             data: methods
           } as IMethodsReply;
         }
-        comm.send(reply, message.metadata)
+        send(reply);
       }
     } else if (data.type === 'command') {
-      this.handleCommand(data.command)
+      this.handleCommand(data.command, buffers);
+    } else if (data.type === 'contextAttributes') {
+      // Only takes effect if sent before the context is created
+      if (this._context === null) {
+        this._contextAttributes = data.attributes;
+      }
+    } else if (data.type === 'release') {
+      for (let key of data.keys) {
+        delete this.variables[key];
+      }
+    } else if (data.type === 'sceneUpdate') {
+      this.messageBufferContext(buffers, () => {
+        this.sceneUpdateMessage(data as ISceneUpdateMessage);
+      });
+      if (this._view) {
+        this._view.render();
+      } else {
+        this.renderScene(this.context);
+      }
+      send({type: 'queryReply', data: null});
+    }
+  }
+
+
+  /**
+   * Handle the messages that arrived while a chunk was being received.
+   */
+  protected handleQueuedMessages(): void {
+    let queued = this._queuedMessages;
+    this._queuedMessages = [];
+    for (let {data, buffers, send} of queued) {
+      // Queued again if one of them starts another chunk
+      this.handleData(data, buffers, send);
+    }
+  }
+
+
+  /**
+   * Apply changes to the retained scene.
+   *
+   * The arguments of the stored instructions are expanded once, so that
+   * their buffers can be reused every frame.
+   */
+  protected sceneUpdateMessage(data: ISceneUpdateMessage): void {
+    for (let [key, instructions] of data.slots) {
+      this._sceneSlots[key] = instructions.map(
+        instruction => this.expandInstruction(instruction));
+    }
+    for (let key of data.removed) {
+      delete this._sceneSlots[key];
+    }
+    if (data.order) {
+      this._sceneOrder = data.order;
+    }
+    if (data.append) {
+      for (let key of data.append) {
+        this._sceneOrder.push(key);
+      }
+    }
+  }
+
+
+  /**
+   * Render the slots of the retained scene in order.
+   */
+  renderScene(gl: WebGLRenderingContext): void {
+    for (let key of this._sceneOrder) {
+      let slot = this._sceneSlots[key];
+      if (slot !== undefined) {
+        this.execExpanded(gl, slot);
+      }
+    }
+  }
+
+
+  /**
+   * Expand the arguments of an instruction, for later execution.
+   */
+  protected expandInstruction(instruction: IInstruction): IExpandedInstruction {
+    return {op: instruction.op, args: this.expandArgs(instruction.args)};
+  }
+
+
+  /**
+   * Execute instructions with already expanded arguments.
+   */
+  protected execExpanded(gl: WebGLRenderingContext, instructions: IExpandedInstruction[]): void {
+    for (let instruction of instructions) {
+      (gl as any)[instruction.op](...instruction.args);
     }
   }
 
 
-  handleCommand(data: ICommand) {
+  handleCommand(data: ICommand, buffers: Buffer[] = []) {
     if (data.op === 'orbitView') {
       if (this._view) {
         this._view.remove();
       }
+      this._viewInstructions = data.instructions;
       this._view = threeOrbit(this, data.args, () => {
-        this.execMessage(this.context, data.instructions);
+        this.execMessage(this.context, this._viewInstructions);
+        this.renderScene(this.context);
+      });
+      if (this._viewState) {
+        this._view.setState(this._viewState);
+      }
+    } else if (data.op === 'viewState') {
+      // Per-view override of camera and viewport, kept across views
+      this._viewState = {
+        camera: data.args[0] as ICameraState | null,
+        viewport: data.args[1] as number[] | null
+      };
+      if (this._view) {
+        this._view.setState(this._viewState);
+      }
+    } else if (data.op === 'updateView') {
+      // Keep the current view (and camera), only swap what it renders
+      this._viewInstructions = data.instructions;
+      if (this._view) {
+        this._view.render();
+      }
+    } else if (data.op === 'animation') {
+      let [id, loop, autoplay] = data.args as [string, boolean, boolean];
+      let tracks: AnimationTrack[] = [];
+      this.messageBufferContext(buffers, () => {
+        for (let instruction of data.instructions) {
+          tracks.push(makeTrack(instruction.op, this.expandArgs(instruction.args)));
+        }
       });
+      let animation = new KeyframeAnimation(tracks, loop);
+      this._animations[id] = animation;
+      if (autoplay) {
+        animation.play(performance.now(), 1);
+      }
+      this.scheduleAnimationFrame();
+    } else if (data.op === 'animationControl') {
+      let [id, action, value] = data.args as [string, string, number];
+      let animation = this._animations[id];
+      if (animation === undefined) {
+        return;
+      }
+      let now = performance.now();
+      if (action === 'play') {
+        animation.play(now, value);
+      } else if (action === 'pause') {
+        animation.pause(now);
+      } else if (action === 'seek') {
+        animation.seek(now, value);
+      } else if (action === 'remove') {
+        delete this._animations[id];
+        return;
+      }
+      this.scheduleAnimationFrame();
+    }
+  }
+
+
+  /**
+   * Request an animation frame, unless one is already pending.
+   */
+  protected scheduleAnimationFrame(): void {
+    if (this._animationFrame === null) {
+      this._animationFrame = requestAnimationFrame(
+        now => this.animationFrame(now));
+    }
+  }
+
+
+  /**
+   * Apply the current values of all animations, and render.
+   *
+   * Frames are requested for as long as some animation is playing, so
+   * that playback does not depend on messages from the kernel.
+   */
+  protected animationFrame(now: number): void {
+    this._animationFrame = null;
+    let gl = this.context;
+    let camera: ICameraState = {};
+    let hasCamera = false;
+    let playing = false;
+    let program = gl.getParameter(gl.CURRENT_PROGRAM) as WebGLProgram | null;
+    for (let id in this._animations) {
+      let animation = this._animations[id];
+      animation.sample(now);
+      for (let i = 0; i < animation.tracks.length; ++i) {
+        let track = animation.tracks[i];
+        let value = animation.samples[i];
+        if (track.kind === 'uniform') {
+          gl.useProgram(track.program);
+          let method = (gl as any)[track.method];
+          if (track.method.slice(0, 13) === 'uniformMatrix') {
+            method.call(gl, track.location, false, value);
+          } else if (track.method.slice(-1) === 'v') {
+            method.call(gl, track.location, value);
+          } else {
+            method.apply(gl, [track.location].concat(
+              Array.prototype.slice.call(value)));
+          }
+        } else if (track.parameter === 'fov') {
+          camera.fov = value[0];
+          hasCamera = true;
+        } else {
+          camera[track.parameter] = Array.prototype.slice.call(value);
+          hasCamera = true;
+        }
+      }
+      if (animation.finished(now)) {
+        animation.pause(now);
+      }
+      playing = playing || animation.playing;
+    }
+    gl.useProgram(program);
+    if (this._view) {
+      if (hasCamera) {
+        this._view.setCamera(camera);
+      }
+      this._view.render();
+    } else {
+      this.renderScene(gl);
+    }
+    if (playing) {
+      this.scheduleAnimationFrame();
     }
   }
 
@@ -195,23 +506,66 @@ class Context {
   }
 
 
+  /**
+   * Process all instructions, returning the return value of each.
+   */
+  queryAllMessage(gl: WebGLRenderingContext, message: IInstruction[]): JSONArray {
+    let results: JSONArray = [];
+    // Return values, for arguments referring to earlier calls
+    this._currentResults = [];
+    try {
+      for (let instruction of message) {
+        results.push(this.queryInstruction(gl, instruction));
+      }
+    } finally {
+      this._currentResults = null;
+    }
+    return results;
+  }
+
+
+  /**
+   * Take the next binary buffer of the message, as a typed array.
+   */
+  protected takeBuffer(bufType: BufferTypeKey): ArrayBufferView {
+    let raw = this._currentBuffers!.shift()!;
+    if (ArrayBuffer.isView(raw)) {
+      // Respect the extent of views, e.g. into a bundle
+      let viewType = bufferViewMap[bufType];
+      return new viewType(raw.buffer, raw.byteOffset,
+        raw.byteLength / viewType.BYTES_PER_ELEMENT);
+    }
+    return new bufferViewMap[bufType](raw);
+  }
+
+
   protected expandArgs(args: JSONArray): any[] {
     let ret: any[] = [];
     for (let arg of args) {
       if (typeof arg === 'string') {
         if (arg.slice(0, 6) === 'buffer') {
-          let bufType = arg.slice(6) as BufferTypeKey;
-          let raw = this._currentBuffers!.shift()!;
-          if (ArrayBuffer.isView(raw)) {
-            raw = raw.buffer;
-          }
-          let view = new bufferViewMap[bufType](raw);
-          ret.push(view);
+          ret.push(this.takeBuffer(arg.slice(6) as BufferTypeKey));
         } else if (arg.slice(0, 3) === 'key') {
           ret.push(this.variables[arg]);
         } else {
           ret.push(arg);
         }
+      } else if (arg !== null && typeof arg === 'object' && 'alloc' in arg) {
+        // An output array, e.g. {"alloc": "uint8", "length": 1024}
+        let spec = arg as JSONObject;
+        let view = new bufferViewMap[spec.alloc as BufferTypeKey](spec.length as number);
+        if (this._currentOutputs) {
+          this._currentOutputs.push(view);
+        }
+        ret.push(view);
+      } else if (arg !== null && typeof arg === 'object' && 'result' in arg) {
+        // The return value of an earlier call of the same queryAll
+        ret.push(this._currentResults![(arg as JSONObject).result as number]);
+      } else if (arg !== null && typeof arg === 'object' && 'decode' in arg) {
+        // Encoded data, e.g. quantized positions
+        let spec = arg as IEncodedArg;
+        let data = this.takeBuffer(spec.data.slice(6) as BufferTypeKey);
+        ret.push(decodeArg(spec, data as any));
       } else {
         ret.push(arg);
       }
@@ -240,6 +594,9 @@ class Context {
     if (result === undefined) {
       result = null;
     }
+    if (this._currentResults) {
+      this._currentResults.push(result);
+    }
     if (result === null || typeof result === 'string' || typeof result === 'number' || typeof result === 'boolean') {
       return result as JSONPrimitive;
     }
@@ -257,9 +614,33 @@ class Context {
 
   private _currentBuffers: Buffer[] | null = null;
 
+  private _currentOutputs: ArrayBufferView[] | null = null;
+
+  private _currentResults: any[] | null = null;
+
   private _context: WebGLRenderingContext | null = null;
 
+  private _contextAttributes: WebGLContextAttributes = {};
+
   private _view: ThreeOrbitView | null = null;
+
+  private _viewInstructions: IInstruction[] = [];
+
+  private _viewState: IViewState | null = null;
+
+  private _sceneSlots: {[key: string]: IExpandedInstruction[]} = {};
+
+  private _pendingParts: IExpandedInstruction[] = [];
+
+  private _pendingChunk: number | null = null;
+
+  private _queuedMessages: IQueuedMessage[] = [];
+
+  private _sceneOrder: string[] = [];
+
+  private _animations: {[id: string]: KeyframeAnimation} = {};
+
+  private _animationFrame: number | null = null;
 }
 
 
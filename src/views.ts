@@ -21,6 +21,27 @@ function threeOrbit(context: Context, args: JSONValue[], renderCallback?: () =>
 }
 
 
+/**
+ * Camera parameters that can be overridden per view.
+ */
+export
+interface ICameraState {
+  position?: number[];
+  target?: number[];
+  fov?: number;
+}
+
+
+/**
+ * Camera and viewport state that can be overridden per view.
+ */
+export
+interface IViewState {
+  camera: ICameraState | null;
+  viewport: number[] | null;
+}
+
+
 export
 class ThreeOrbitView {
   constructor(context: Context, fov: number, near: number, far: number, renderCallback?: () => void) {
@@ -67,10 +88,44 @@ class ThreeOrbitView {
     }
   }
 
+  setState(state: IViewState) {
+    this.viewport = state.viewport;
+    if (state.camera) {
+      this.setCamera(state.camera);
+    }
+    // Triggers a render through the change event
+    this.control.update();
+  }
+
+  /**
+   * Set camera parameters, without rendering.
+   */
+  setCamera(camera: ICameraState) {
+    if (camera.position) {
+      this.camera.position.fromArray(camera.position);
+    }
+    if (camera.target) {
+      this.control.target.fromArray(camera.target);
+    }
+    if (camera.fov) {
+      let gl = this.context.context;
+      this.camera.fov = camera.fov;
+      this.camera.updateProjectionMatrix();
+      gl.uniformMatrix4fv(this.addrProjectionMatrix, false,
+        this.camera.projectionMatrix.toArray());
+    }
+    this.camera.lookAt(this.control.target);
+  }
+
   render() {
     let gl = this.context.context;
     this.resize();
-    gl.viewport(0, 0, gl.canvas.width, gl.canvas.height);
+    if (this.viewport) {
+      let [x, y, width, height] = this.viewport;
+      gl.viewport(x, y, width, height);
+    } else {
+      gl.viewport(0, 0, gl.canvas.width, gl.canvas.height);
+    }
     this.camera.updateMatrixWorld(false);
     this.camera.matrixWorldInverse.getInverse( this.camera.matrixWorld );
     gl.uniformMatrix4fv(this.addrModelViewMatrix, false,
@@ -88,11 +143,13 @@ class ThreeOrbitView {
   protected context: Context;
   protected renderer: THREE.WebGLRenderer;
   protected scene: THREE.Scene;
-  protected camera: THREE.Camera;
+  protected camera: THREE.PerspectiveCamera;
   protected control: OrbitControls;
 
   protected addrProjectionMatrix: WebGLUniformLocation;
   protected addrModelViewMatrix: WebGLUniformLocation;
 
   protected renderCallback?: () => void;
+
+  protected viewport: number[] | null = null;
 }